@@ -1,13 +1,22 @@
 import asyncio
+import json
 import re
+import time
 from typing import Optional, Dict, Any
 
-from app.bot.client import bot_client
+from app.agent.change import ChangeDetector
+from app.agent.decision_cache import decision_cache
+from app.agent.pipeline import Speculation, project_observation
+from app.agent.reflex import ReflexEngine, evaluate_condition
+from app.agent.summary import summarize_result
+from app.bot.client import BotClient, bot_client
 from app.llm.client import llm_client
-from app.llm.prompts import get_agent_system_prompt, format_observation
+from app.llm.prompts import get_agent_system_prompt, get_prompt_stats, format_observation, format_tick_context
+from app.llm.tokens import tokenizer_name
 from app.script.executor import script_executor, BotAPI
 from app.skills.manager import skill_manager
-from app.task.manager import task_manager, TaskStatus
+from app.task.manager import TaskManager, task_manager, TaskStatus
+from app.tracing import tracer
 from app.config import settings
 
 
@@ -17,46 +26,93 @@ class Agent:
     Coordinates perception, decision-making, and action execution
     
     支持后台任务执行，LLM 决策循环不被阻塞
+    每个 Bot 会话一个 Agent，各自持有 BotClient 和 TaskManager
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        bot_id: str = "default",
+        client: Optional[BotClient] = None,
+        tasks: Optional[TaskManager] = None
+    ):
+        self.bot_id = bot_id
+        self.bot_client = client or bot_client
+        self.tag = "[Agent]" if bot_id == "default" else f"[Agent:{bot_id}]"
         self.is_running = False
         self.last_action: Optional[Dict[str, Any]] = None
         self.last_action_result: Optional[Dict[str, Any]] = None
         self._tick_task: Optional[asyncio.Task] = None
         self._pending_chat: list = []
+        # 状态镜像模式下由 WebSocket 事件收集的游戏事件（格式同 observation.events）
+        self._pending_events: list = []
         
         # 任务管理器引用
-        self.task_manager = task_manager
+        self.task_manager = tasks or task_manager
         
-        # 任务运行时的轮询计时
-        self._task_tick_counter: int = 0
+        # 事件驱动唤醒：聊天、游戏事件、任务结束、紧急状态或定时器触发下一次决策
+        self._wakeup = asyncio.Event()
+        self._wake_reasons: list = []
+        self._wake_stats: Dict[str, int] = {}
+        
+        # 观察变化检测：世界没有明显变化时不再为另一个 wait 调用 LLM
+        self.change_detector = ChangeDetector()
+        
+        # 流水线模式：耗时动作执行期间进行中的预测决策
+        self._speculation: Optional[Speculation] = None
+        self._pipeline_stats: Dict[str, int] = {"started": 0, "used": 0, "discarded": 0}
+        
+        # 反射层：紧急情况在本地立即执行动作，结果作为事件报告给下一次 LLM 决策
+        self.reflexes = ReflexEngine()
+        self._reflex_task: Optional[asyncio.Task] = None
+        self._reflex_reports: list = []
+        self._last_observation: Dict[str, Any] = {}
+        
+        # 多步计划：LLM 返回 plan 时在本地依次执行剩余步骤
+        self._plan: list = []
+        self._plan_log: list = []
+        # 上一次检查计划时是否处于紧急状态（只有新进入紧急状态才打断计划）
+        self._plan_urgent = False
+        self._plan_stats: Dict[str, int] = {"plans": 0, "steps": 0, "completed": 0, "aborted": 0}
+    
+    def wake(self, reason: str):
+        """唤醒决策循环"""
+        if reason not in self._wake_reasons:
+            self._wake_reasons.append(reason)
+        self._wakeup.set()
     
     async def start(self):
         """Start the agent's decision loop"""
         if self.is_running:
-            print("[Agent] Already running")
+            print(f"{self.tag} Already running")
             return
         
-        print("[Agent] Starting agent loop...")
+        print(f"{self.tag} Starting agent loop...")
         self.is_running = True
         
         # Register event handler for chat messages
-        bot_client.add_event_handler(self._handle_bot_event)
+        self.bot_client.add_event_handler(self._handle_bot_event)
+        self.bot_client.add_state_listener(self._on_state_change)
+        self.task_manager.add_done_callback(self._on_task_done)
+        
+        # 启动后立即做一次决策
+        self.wake("start")
         
         # Start tick loop
-        self._tick_task = asyncio.create_task(self._tick_loop())
+        self._tick_task = asyncio.create_task(self._tick_loop(), name=f"agent:{self.bot_id}")
     
     async def stop(self):
         """Stop the agent's decision loop"""
         if not self.is_running:
             return
         
-        print("[Agent] Stopping agent loop...")
+        print(f"{self.tag} Stopping agent loop...")
         self.is_running = False
         
         # 取消所有后台任务
         await self.task_manager.cancel_all_tasks()
+        self._discard_speculation()
+        self._plan = []
+        decision_cache.save()
         
         if self._tick_task:
             self._tick_task.cancel()
@@ -65,40 +121,161 @@ class Agent:
             except asyncio.CancelledError:
                 pass
         
-        bot_client.remove_event_handler(self._handle_bot_event)
+        self.bot_client.remove_event_handler(self._handle_bot_event)
+        self.bot_client.remove_state_listener(self._on_state_change)
+        self.task_manager.remove_done_callback(self._on_task_done)
     
     async def _tick_loop(self):
-        """Main decision loop"""
+        """Main decision loop - 等待唤醒事件或定时器，不做固定间隔轮询"""
         error_count = 0
         while self.is_running:
+            reasons = await self._wait_for_wakeup()
+            
             try:
-                await self.tick()
+                await self.tick(reasons)
                 error_count = 0  # 重置错误计数
             except Exception as e:
                 error_count += 1
                 if error_count <= 3:  # 只打印前3次错误
-                    print(f"[Agent] 错误: {e}")
+                    print(f"{self.tag} 错误: {e}")
                 elif error_count == 4:
-                    print("[Agent] 后续相同错误将不再显示...")
-            
-            await asyncio.sleep(settings.agent_tick_rate)
+                    print(f"{self.tag} 后续相同错误将不再显示...")
+    
+    def _idle_timeout(self) -> Optional[float]:
+        """
+        下一次定时决策前的最长等待时间（None 表示只由事件唤醒）
+        
+        - 有后台任务：agent_task_tick_rate（0 表示不定时）
+        - 上次执行了非 wait 动作：agent_tick_rate 后继续决策
+        - 空闲：agent_max_idle（0 表示不定时）
+        """
+        if self.task_manager.running_tasks or self.task_manager.pending_tasks:
+            return settings.agent_task_tick_rate or None
+        if self.last_action and self.last_action.get("action") != "wait":
+            return settings.agent_tick_rate
+        return settings.agent_max_idle or None
+    
+    async def _wait_for_wakeup(self) -> list:
+        """等待唤醒，返回唤醒原因列表"""
+        if not self._wakeup.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._idle_timeout())
+            except asyncio.TimeoutError:
+                self.wake("timer")
+            else:
+                # 短暂等待，合并同时到达的多个事件
+                if settings.agent_wake_debounce > 0:
+                    await asyncio.sleep(settings.agent_wake_debounce)
+        
+        reasons = self._wake_reasons
+        self._wake_reasons = []
+        self._wakeup.clear()
+        for reason in reasons:
+            self._wake_stats[reason] = self._wake_stats.get(reason, 0) + 1
+        return reasons
+    
+    def _on_state_change(self, event: Dict[str, Any]):
+        """状态镜像更新后检查反射规则（只关心会触发规则的字段）"""
+        if not {"health", "nearbyEntities", "fluids"} & set(event.get("state") or {}):
+            return
+        self._check_reflexes(
+            self.bot_client.state.to_observation(self.bot_client.inventory.items())
+        )
     
-    async def tick(self):
-        """Single decision-action cycle - 事件驱动模式"""
+    def _check_reflexes(self, observation: Dict[str, Any]) -> bool:
+        """
+        检查反射规则，满足时在后台执行对应动作
+        
+        Returns:
+            是否有反射动作正在执行
+        """
+        self._last_observation = observation
+        if not settings.agent_reflexes or not self.is_running:
+            return False
+        if self._reflex_task and not self._reflex_task.done():
+            return True
+        
+        fired = self.reflexes.match(observation)
+        if not fired:
+            return False
+        self._reflex_task = asyncio.create_task(
+            self._run_reflex(*fired), name=f"agent:{self.bot_id}:reflex"
+        )
+        return True
+    
+    async def _run_reflex(self, rule: Dict[str, Any], action: str, parameters: Dict[str, Any]):
+        """执行反射动作，完成后唤醒 Agent 让 LLM 看到结果"""
+        print(f"{self.tag} Reflex: {rule.get('name')} -> {action} {parameters}")
+        try:
+            result = await self.bot_client.execute_action(action, parameters)
+        except Exception as e:
+            result = {"success": False, "message": str(e)}
+        
+        self._reflex_reports.append(
+            f"reflex: {rule.get('name')} ({rule.get('description', '')}) -> "
+            f"{action} {parameters}: {result.get('message', '')}"
+        )
+        self._reflex_reports = self._reflex_reports[-5:]
+        self.wake("reflex")
+    
+    def _on_task_done(self, task):
+        """后台任务结束时唤醒，让 LLM 看到结果"""
+        self.wake("task_done")
+    
+    async def tick(self, reasons: Optional[list] = None):
+        """
+        Single decision-action cycle - 事件驱动模式
+        
+        Args:
+            reasons: 唤醒原因（chat / event / urgent / task_done / timer / start / force / plan / pipeline）
+        """
         if not self.is_running:
             return
+        reasons = reasons or []
+        with tracer.span("agent.tick", "agent", bot=self.bot_id, reasons=",".join(reasons)):
+            await self._tick(reasons)
+    
+    async def _tick(self, reasons: list):
+        """tick 的实际流程（各阶段记录为 span，见 /api/debug/traces）"""
+        # 定时器、任务结束等原因本身就要求做一次决策
+        # （pipeline：预测的动作刚完成，有后台任务时也要立即校验预测决策，否则观察变化后只能丢弃）
+        forced = any(r in reasons for r in ("timer", "task_done", "start", "force", "plan", "pipeline"))
+        
+        # 状态镜像已同步时直接读取本地状态，空闲 tick 不产生网络请求
+        mirror = self.bot_client.state
+        use_mirror = mirror.synced and self.bot_client.inventory.synced
         
         # 先检查Bot是否已连接
-        try:
-            status = await bot_client.get_status()
-            if not status.get("connected"):
+        if use_mirror:
+            if not mirror.connected:
                 return  # Bot未连接，静默跳过
-        except Exception:
-            return  # 无法获取状态，静默跳过
+        else:
+            try:
+                with tracer.span("agent.status", "agent"):
+                    status = await self.bot_client.get_status()
+                if not status.get("connected"):
+                    return  # Bot未连接，静默跳过
+            except Exception:
+                return  # 无法获取状态，静默跳过
         
         try:
-            # 1. Get observation from bot
-            observation = await bot_client.get_observation()
+            # 1. Get observation（镜像或主动请求）
+            with tracer.span("agent.observation", "agent", mirror=use_mirror):
+                if use_mirror:
+                    observation = mirror.to_observation(self.bot_client.inventory.items())
+                    observation["events"] = self._pending_events
+                else:
+                    observation = await self.bot_client.get_observation()
+            
+            # 反射规则先于 LLM：正在执行反射动作时本次不决策（完成后会唤醒），未取走的聊天/事件留到下次
+            if self._check_reflexes(observation):
+                return
+            self._pending_events = []
+            
+            # 上次决策后执行的反射动作作为事件报告给 LLM
+            if self._reflex_reports:
+                observation["events"] = list(observation.get("events") or []) + self._reflex_reports
+                self._reflex_reports = []
             
             # Add any pending chat messages
             if self._pending_chat:
@@ -122,10 +299,23 @@ class Agent:
             is_food_critical = health_info.get("food", 20) < 4      # 饥饿值低于 4
             has_urgent_situation = is_health_critical or is_food_critical
             
-            # LLM 触发策略：
-            # - 空闲状态（无后台任务）：每 agent_tick_rate 秒调用一次，让 bot 可以主动行动
+            # 执行中的多步计划：直到失败、守卫条件不满足、出现新聊天、新进入紧急状态或计划完成才询问 LLM
+            # （为应对紧急情况制定的计划，如“吃东西再撤退”，不会因为仍处于同一紧急状态而中止）
+            if self._plan:
+                became_urgent = has_urgent_situation and not self._plan_urgent
+                self._plan_urgent = has_urgent_situation
+                step = self._next_plan_step(observation, has_chat or became_urgent)
+                if step:
+                    await self._execute_decision(step, observation, task_status)
+                    self._after_plan_step()
+                    return
+                forced = True
+            
+            # LLM 触发策略（唤醒时机见 _wait_for_wakeup / _idle_timeout）：
+            # - 空闲状态（无后台任务）：执行动作后每 agent_tick_rate 秒继续决策；
+            #   上次是 wait 时只在有事件或 agent_max_idle 到期时调用
             # - 有后台任务运行时：
-            #   - 有事件/聊天/紧急情况时立即调用
+            #   - 有事件/聊天/紧急情况/任务结束时立即调用
             #   - 否则每 agent_task_tick_rate 秒调用一次（如果配置 > 0）
             
             if has_active_tasks:
@@ -136,102 +326,378 @@ class Agent:
                     has_urgent_situation      # 紧急情况
                 )
                 
-                if not should_call_llm:
-                    # 检查是否到了定时轮询时间
-                    task_tick_rate = settings.agent_task_tick_rate
-                    if task_tick_rate > 0:
-                        # 计算需要多少个 tick 才等于 task_tick_rate
-                        ticks_needed = int(task_tick_rate / settings.agent_tick_rate)
-                        self._task_tick_counter += 1
-                        
-                        if self._task_tick_counter >= ticks_needed:
-                            # 到达定时轮询时间，触发 LLM
-                            self._task_tick_counter = 0
-                            should_call_llm = True
-                    
-                    if not should_call_llm:
-                        # 任务运行中且未到轮询时间，跳过本次 tick
-                        return
-                else:
-                    # 有事件触发，重置计数器
-                    self._task_tick_counter = 0
+                if not should_call_llm and not forced:
+                    # 任务运行中且未到轮询时间（定时器由 _idle_timeout 控制），跳过本次 tick
+                    return
             else:
-                # 空闲状态：重置任务计数器
-                self._task_tick_counter = 0
-                
-                # 保持每 tick_rate 秒调用一次
-                # 但如果上次是 wait 且没有新事件，可以跳过
-                if (not has_chat and not has_events and
+                # 空闲状态：上次是 wait 且没有新事件、也不是定时器到期时跳过
+                if (not has_chat and not has_events and not forced and
                     self.last_action and self.last_action.get("action") == "wait"):
                     return
             
-            # 3. Format observation for LLM
-            user_message = format_observation(observation)
-            
-            # 添加任务状态信息
-            if has_active_tasks:
-                user_message += f"\n\n=== 当前后台任务 ===\n{task_status['summary']}"
-            
-            if self.last_action_result:
-                user_message += f"\n\nLast action result: {self.last_action_result}"
-            
-            # 4. Get decision from LLM
-            print("[Agent] Thinking...")
-            
-            system_prompt = get_agent_system_prompt({
-                "position": observation.get("position"),
-                "health": observation.get("health"),
-                "time": observation.get("time"),
-                "has_active_tasks": has_active_tasks
-            })
+            # 上次决策是 wait、没有聊天/事件/紧急情况且观察指纹未变：结果多半还是 wait，跳过
+            if (settings.agent_skip_unchanged and "force" not in reasons and
+                not has_chat and not has_events and not has_urgent_situation and
+                (not self.last_action or self.last_action.get("action") == "wait") and
+                self.change_detector.is_unchanged(observation)):
+                return
+            self.change_detector.record(observation)
             
-            response = await llm_client.chat_json(system_prompt, user_message)
+            # 3-4. 优先使用与实际结果一致的预测决策，否则请求 LLM
+            response = await self._take_speculation(observation, has_chat or has_events)
+            if response is None:
+                response = await self._decide(observation, task_status, self.last_action_result)
             
             if settings.debug:
-                print(f"[Agent] LLM Response: {response}")
+                print(f"{self.tag} LLM Response: {response}")
             
-            # 5. Execute action
-            if response and response.get("action"):
-                print(f"[Agent] Thought: {response.get('thought', 'N/A')}")
-                print(f"[Agent] Action: {response['action']} {response.get('parameters', {})}")
-                
-                self.last_action = response
-                
-                # 特殊处理：启动后台技能任务
-                if response["action"] == "startSkill":
-                    self.last_action_result = await self._start_skill_task(
-                        response.get("parameters", {})
-                    )
-                # 特殊处理：取消任务
-                elif response["action"] == "cancelTask":
-                    self.last_action_result = await self._cancel_task(
-                        response.get("parameters", {})
-                    )
-                # 特殊处理：查询任务状态
-                elif response["action"] == "getTaskStatus":
-                    self.last_action_result = self._get_task_status()
-                # 特殊处理脚本执行动作（同步阻塞，用于简单脚本）
-                elif response["action"] == "executeScript":
-                    self.last_action_result = await self._execute_script(
-                        response.get("parameters", {})
-                    )
+            # 多步计划：取出第一步执行，其余步骤留到之后的 tick
+            if response and isinstance(response.get("plan"), list) and response["plan"]:
+                step = self._start_plan(response, observation, has_urgent_situation)
+                if step:
+                    await self._execute_decision(step, observation, task_status)
+                    self._after_plan_step()
                 else:
-                    self.last_action_result = await bot_client.execute_action(
-                        response["action"],
-                        response.get("parameters", {})
-                    )
-                
-                print(f"[Agent] Result: {self.last_action_result.get('message', 'N/A')}")
+                    self.wake("plan")
             else:
-                print("[Agent] No valid action in response")
+                await self._execute_decision(response, observation, task_status)
                 
         except Exception as e:
-            print(f"[Agent] Error: {e}")
+            print(f"{self.tag} Error: {e}")
             self.last_action_result = {"success": False, "message": str(e)}
+            if self._plan:
+                self._abort_plan(f"error: {e}")
+    
+    def _start_plan(
+        self,
+        response: Dict[str, Any],
+        observation: Dict[str, Any],
+        urgent: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        开始执行 LLM 返回的多步计划
+        
+        Args:
+            urgent: 制定计划时是否已处于紧急状态
+        
+        Returns:
+            第一步（带上计划的 thought），计划为空或第一步守卫不满足时返回 None
+        """
+        self._plan = [s for s in response["plan"] if isinstance(s, dict) and s.get("action")]
+        self._plan_log = []
+        self._plan_urgent = urgent
+        self._plan_stats["plans"] += 1
+        print(f"{self.tag} Plan: {' -> '.join(s['action'] for s in self._plan)}")
+        
+        step = self._next_plan_step(observation, interrupted=False)
+        if step:
+            step = {**step, "thought": response.get("thought", "")}
+        return step
+    
+    def _next_plan_step(self, observation: Dict[str, Any], interrupted: bool) -> Optional[Dict[str, Any]]:
+        """
+        取出计划的下一步
+        
+        Returns:
+            下一步；被新聊天/新的紧急情况打断、或守卫条件不满足时中止计划并返回 None
+        """
+        if interrupted:
+            self._abort_plan("interrupted by new chat or urgent situation")
+            return None
+        if not self._plan:
+            return None
+        
+        step = self._plan.pop(0)
+        guard = step.get("guard")
+        if guard and not evaluate_condition(guard, observation):
+            self._abort_plan(f"guard {guard} not met before {step['action']}")
+            return None
+        
+        self._plan_stats["steps"] += 1
+        return step
+    
+    def _after_plan_step(self):
+        """记录计划步骤结果：失败则中止，全部完成则汇总，然后立即唤醒继续"""
+        result = self.last_action_result or {}
+        action = (self.last_action or {}).get("action", "unknown")
+        status = "✓" if result.get("success", False) else "✗"
+        self._plan_log.append(f"{status}{action}: {str(result.get('message', ''))[:50]}")
+        
+        if not result.get("success", False):
+            self._abort_plan(f"step {action} failed")
+        elif not self._plan:
+            self._plan_stats["completed"] += 1
+            self.last_action_result = {
+                "success": True,
+                "message": f"Plan completed ({len(self._plan_log)} steps): {'; '.join(self._plan_log)}"
+            }
+        self.wake("plan")
+    
+    def _abort_plan(self, reason: str):
+        """中止计划，把已完成的步骤和剩余步骤报告给下一次 LLM 决策"""
+        remaining = [s.get("action") for s in self._plan]
+        self._plan = []
+        self._plan_stats["aborted"] += 1
+        print(f"{self.tag} Plan aborted: {reason}")
+        self.last_action_result = {
+            "success": False,
+            "message": (
+                f"Plan aborted ({reason}). Done: {'; '.join(self._plan_log) or 'none'}. "
+                f"Skipped: {', '.join(remaining) or 'none'}"
+            )
+        }
+    
+    async def _execute_decision(
+        self,
+        response: Optional[Dict[str, Any]],
+        observation: Dict[str, Any],
+        task_status: Dict[str, Any]
+    ):
+        """执行一个决策（单个动作）"""
+        # 5. Execute action
+        if response and response.get("action"):
+            with tracer.span("agent.execute", "agent", action=response["action"]):
+                await self._execute_action(response, observation, task_status)
+        else:
+            print(f"{self.tag} No valid action in response")
+    
+    async def _execute_action(
+        self,
+        response: Dict[str, Any],
+        observation: Dict[str, Any],
+        task_status: Dict[str, Any]
+    ):
+        """执行决策中的动作并记录结果"""
+        if response.get("thought"):
+            print(f"{self.tag} Thought: {response['thought']}")
+        print(f"{self.tag} Action: {response['action']} {response.get('parameters', {})}")
+        
+        self.last_action = response
+        
+        # 特殊处理：启动后台技能任务
+        if response["action"] == "startSkill":
+            self.last_action_result = await self._start_skill_task(
+                response.get("parameters", {})
+            )
+        # 特殊处理：取消任务
+        elif response["action"] == "cancelTask":
+            self.last_action_result = await self._cancel_task(
+                response.get("parameters", {})
+            )
+        # 特殊处理：查询任务状态
+        elif response["action"] == "getTaskStatus":
+            self.last_action_result = self._get_task_status()
+        # 特殊处理脚本执行动作（同步阻塞，用于简单脚本）
+        elif response["action"] == "executeScript":
+            self.last_action_result = await self._execute_script(
+                response.get("parameters", {})
+            )
+        else:
+            self._start_speculation(response, observation, task_status)
+            self.last_action_result = await self.bot_client.execute_action(
+                response["action"],
+                response.get("parameters", {})
+            )
+            if self._speculation:
+                # 预测决策已在进行，动作一结束就校验并继续
+                self.wake("pipeline")
+        
+        print(f"{self.tag} Result: {self.last_action_result.get('message', 'N/A')}")
+    
+    async def _decide(
+        self,
+        observation: Dict[str, Any],
+        task_status: Dict[str, Any],
+        last_result: Optional[Dict[str, Any]],
+        commit: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        根据观察请求一次 LLM 决策（启用决策缓存时先查缓存）
+        
+        Args:
+            commit: 预测决策时传入：结果不写入对话历史和决策缓存，
+                    而是把用户消息和缓存键记在其中，采用时再写入（见 _commit_speculation）
+        """
+        with tracer.span("agent.decide", "agent", bot=self.bot_id, speculative=commit is not None) as span:
+            response = await self._request_decision(observation, task_status, last_result, span, commit)
+        return response
+    
+    async def _request_decision(
+        self,
+        observation: Dict[str, Any],
+        task_status: Dict[str, Any],
+        last_result: Optional[Dict[str, Any]],
+        span: Dict[str, Any],
+        commit: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """_decide 的实际流程，span 为 agent.decide 的参数（记录是否命中缓存）"""
+        has_active_tasks = task_status.get("has_active_tasks", False)
+        
+        cache_key = None
+        if settings.decision_cache_enabled:
+            with tracer.span("agent.decision_cache", "agent"):
+                cache_key = decision_cache.make_key(observation, last_result)
+                cached = decision_cache.get(cache_key)
+            span["cached"] = cached is not None
+            if cached is not None:
+                print(f"{self.tag} Using cached decision")
+                return cached
+        
+        # 3. Format observation for LLM
+        with tracer.span("agent.format_observation", "agent"):
+            user_message = format_observation(observation)
+        
+        # 添加任务状态信息
+        if has_active_tasks:
+            user_message += f"\n\n=== 当前后台任务 ===\n{task_status['summary']}"
+        
+        if last_result:
+            user_message += f"\n\nLast action result: {summarize_result(last_result)}"
+        
+        # 每次都变化的状态放在用户消息末尾，系统提示词保持不变以命中服务端前缀缓存
+        user_message += "\n\n" + format_tick_context({
+            "position": observation.get("position"),
+            "health": observation.get("health"),
+            "time": observation.get("time"),
+            "has_active_tasks": has_active_tasks
+        })
+        
+        # 4. Get decision from LLM
+        print(f"{self.tag} Thinking...")
+        
+        with tracer.span("agent.system_prompt", "agent"):
+            system_prompt = get_agent_system_prompt()
+        
+        # 模型路由提示：上次失败或聊天较复杂时使用大模型
+        route = {
+            "chat": [m.get("message", "") for m in observation.get("chatMessages") or []],
+            "failed": bool(last_result) and not last_result.get("success", False)
+        }
+        
+        if commit is not None:
+            # 预测决策可能被丢弃：不带/不写对话历史，也不写缓存
+            commit.update(user_message=user_message, cache_key=cache_key)
+            return await llm_client.chat_json(
+                system_prompt, user_message, conversation_id=self.bot_id, route=route, use_history=False
+            )
+        
+        if settings.llm_stream:
+            # 流式：action / parameters 完整后立即返回，thought 等剩余内容在后台接收
+            stream = llm_client.chat_json_stream(
+                system_prompt, user_message, conversation_id=self.bot_id, route=route
+            )
+            response = await stream.early_decision()
+            span["early"] = not stream.task.done()
+            stream.task.add_done_callback(lambda t: self._on_stream_done(t, response, cache_key))
+            return response
+        
+        response = await llm_client.chat_json(
+            system_prompt, user_message, conversation_id=self.bot_id, route=route
+        )
+        if cache_key:
+            decision_cache.put(cache_key, response)
+        return response
+    
+    def _on_stream_done(self, task: asyncio.Task, early: Dict[str, Any], cache_key: Optional[str]):
+        """流式决策接收完毕：补打印提前执行时还没有的 thought，并写入决策缓存"""
+        if task.cancelled() or task.exception():
+            return
+        full = task.result()
+        if full.get("thought") and "thought" not in early:
+            print(f"{self.tag} Thought ({full.get('action') or 'plan'}): {full['thought']}")
+        if cache_key:
+            decision_cache.put(cache_key, full)
+    
+    def _start_speculation(
+        self,
+        decision: Dict[str, Any],
+        observation: Dict[str, Any],
+        task_status: Dict[str, Any]
+    ):
+        """耗时动作开始前，按预测的完成状态提前请求下一次决策"""
+        if not settings.agent_pipeline or self._plan:
+            # 计划中还有下一步时不需要预测
+            return
+        self._discard_speculation()
+        
+        projected = project_observation(
+            decision["action"], decision.get("parameters", {}), observation
+        )
+        if projected is None:
+            return
+        
+        expected_result = {"success": True, "message": f"{decision['action']} completed"}
+        commit: Dict[str, Any] = {}
+        task = asyncio.create_task(
+            self._decide(projected, task_status, expected_result, commit),
+            name=f"agent:{self.bot_id}:pipeline"
+        )
+        # 被丢弃的预测可能以异常结束，取走异常避免 asyncio 警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._speculation = Speculation(
+            action=decision["action"],
+            projected=projected,
+            task=task,
+            commit=commit
+        )
+        self._pipeline_stats["started"] += 1
+    
+    async def _take_speculation(
+        self,
+        observation: Dict[str, Any],
+        has_new_input: bool
+    ) -> Optional[Dict[str, Any]]:
+        """
+        取出预测决策：动作成功、期间没有聊天/事件且实际观察与预测指纹一致时才使用
+        
+        Returns:
+            预测的决策，不可用时返回 None
+        """
+        speculation = self._speculation
+        if not speculation:
+            return None
+        self._speculation = None
+        
+        valid = (
+            not has_new_input and
+            (self.last_action_result or {}).get("success", False) and
+            self.change_detector.fingerprint(observation) ==
+            self.change_detector.fingerprint(speculation.projected)
+        )
+        if not valid:
+            speculation.task.cancel()
+            self._pipeline_stats["discarded"] += 1
+            return None
+        
+        try:
+            response = await speculation.task
+        except Exception:
+            self._pipeline_stats["discarded"] += 1
+            return None
+        
+        self._pipeline_stats["used"] += 1
+        print(f"{self.tag} Using pipelined decision (requested {time.time() - speculation.started_at:.1f}s ago)")
+        self._commit_speculation(speculation, response)
+        return response
+    
+    def _commit_speculation(self, speculation: Speculation, response: Dict[str, Any]):
+        """采用预测决策：补写对话历史和决策缓存（命中缓存得到的决策无需再写）"""
+        user_message = speculation.commit.get("user_message")
+        if not user_message:
+            return
+        llm_client.remember(self.bot_id, user_message, json.dumps(response, ensure_ascii=False))
+        if speculation.commit.get("cache_key"):
+            decision_cache.put(speculation.commit["cache_key"], response)
+    
+    def _discard_speculation(self):
+        if self._speculation:
+            self._speculation.task.cancel()
+            self._pipeline_stats["discarded"] += 1
+            self._speculation = None
     
     async def force_tick(self):
         """Force an immediate decision cycle"""
-        await self.tick()
+        await self.tick(["force"])
     
     async def _start_skill_task(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -258,7 +724,7 @@ class Agent:
         
         # 创建后台任务
         async def run_skill():
-            bot_api = BotAPI()
+            bot_api = BotAPI(self.bot_client)
             return await bot_api.useSkill(skill_name, **skill_kwargs)
         
         task = self.task_manager.create_task(
@@ -282,7 +748,7 @@ class Agent:
             await self.task_manager.cancel_all_tasks()
             # 同时停止bot移动
             try:
-                await bot_client.execute_action("stopMoving", {})
+                await self.bot_client.execute_action("stopMoving", {})
             except:
                 pass
             return {"success": True, "message": "已取消所有任务"}
@@ -299,7 +765,7 @@ class Agent:
         if success:
             # 停止移动
             try:
-                await bot_client.execute_action("stopMoving", {})
+                await self.bot_client.execute_action("stopMoving", {})
             except:
                 pass
             return {"success": True, "message": f"已取消任务 {task_id}"}
@@ -327,13 +793,17 @@ class Agent:
         if not script:
             return {"success": False, "message": "No script provided"}
         
-        print(f"[Agent] Executing script: {description}")
+        print(f"{self.tag} Executing script: {description}")
         
         try:
+            started_at = time.time()
             result = await script_executor.execute(
                 script=script,
-                timeout=timeout
+                timeout=timeout,
+                client=self.bot_client
             )
+            # 完整结果单独保存（只保留最近一次，见 TaskManager.record_result），提示词中只放摘要（见 summarize_result）
+            history = self.task_manager.record_result("executeScript", description, result, started_at)
             
             if result["success"]:
                 # 构建有意义的结果摘要
@@ -371,28 +841,49 @@ class Agent:
                     "logs": result.get("logs", []),
                     "actions": actions,
                     "action_count": action_count,
-                    "execution_time": result.get("execution_time", 0)
+                    "execution_time": result.get("execution_time", 0),
+                    "task_id": history.id
                 }
             else:
                 error_msg = result.get('error', 'Unknown error')
                 # 如果有traceback，打印到控制台方便调试
                 if result.get('traceback'):
-                    print(f"[Agent] Script traceback:\n{result['traceback']}")
+                    print(f"{self.tag} Script traceback:\n{result['traceback']}")
                 return {
                     "success": False,
                     "message": f"Script failed: {error_msg}",
                     "logs": result.get("logs", []),
-                    "actions": result.get("actions", [])
+                    "actions": result.get("actions", []),
+                    "task_id": history.id
                 }
         except Exception as e:
             import traceback
-            print(f"[Agent] Script execution error:\n{traceback.format_exc()}")
+            print(f"{self.tag} Script execution error:\n{traceback.format_exc()}")
             return {"success": False, "message": f"Script execution error: {str(e)}"}
     
     async def _handle_bot_event(self, event: Dict[str, Any]):
         """Handle events from the bot WebSocket"""
         event_type = event.get("type")
         
+        if event_type == "health":
+            self._add_pending_event(
+                f"health_change: Health: {event.get('health')}, Food: {event.get('food')}"
+            )
+            # 未使用状态镜像时由 health 事件驱动反射（镜像模式下由状态监听器处理）
+            if not self.bot_client.state.synced and self._last_observation:
+                self._check_reflexes({
+                    **self._last_observation,
+                    "health": {"health": event.get("health"), "food": event.get("food")}
+                })
+            # 只有进入危险区间才立即唤醒（与 tick 中的紧急判断一致）
+            if event.get("health", 20) < 6 or event.get("food", 20) < 4:
+                self.wake("urgent")
+        elif event_type == "hurt":
+            self._add_pending_event("took_damage: Bot took damage")
+            self.wake("event")
+        elif event_type == "death":
+            self.wake("event")
+        
         if event_type == "chat":
             message = event.get("message", "")
             username = event.get("username", "")
@@ -427,6 +918,13 @@ class Agent:
                 "username": username,
                 "message": message
             })
+            self.wake("chat")
+    
+    def _add_pending_event(self, description: str):
+        """记录一个游戏事件，只保留最近 10 条（与 Bot 端 observer 一致）"""
+        self._pending_events.append(description)
+        if len(self._pending_events) > 10:
+            self._pending_events = self._pending_events[-10:]
     
     async def _handle_test_command(self, message: str, username: str):
         """
@@ -442,7 +940,7 @@ class Agent:
             # 解析技能名和参数
             match = re.match(r'^([^(]+)(?:\(([^)]*)\))?$', command)
             if not match:
-                await bot_client.execute_action("chat", {
+                await self.bot_client.execute_action("chat", {
                     "message": f"@{username} 格式错误喵~ 用法: %test 技能名 或 %test 技能名(参数=值)"
                 })
                 return
@@ -475,7 +973,7 @@ class Agent:
             if not skill:
                 skills = skill_manager.list_skills()
                 skill_names = [s['name'] for s in skills]
-                await bot_client.execute_action("chat", {
+                await self.bot_client.execute_action("chat", {
                     "message": f"@{username} 技能'{skill_name}'不存在喵~ 可用技能: {', '.join(skill_names) or '无'}"
                 })
                 return
@@ -483,7 +981,7 @@ class Agent:
             # 使用后台任务管理器启动技能
             async def run_skill_with_notification():
                 try:
-                    bot_api = BotAPI()
+                    bot_api = BotAPI(self.bot_client)
                     result = await asyncio.wait_for(
                         bot_api.useSkill(skill_name, **kwargs),
                         timeout=300.0
@@ -498,23 +996,23 @@ class Agent:
                         status_text = "完成"
                         msg = str(result) if result else "无返回值"
                     
-                    await bot_client.execute_action("chat", {
+                    await self.bot_client.execute_action("chat", {
                         "message": f"@{username} 技能'{skill_name}'{status_text}: {msg[:80]}"
                     })
                     
                     return result
                     
                 except asyncio.TimeoutError:
-                    await bot_client.execute_action("chat", {
+                    await self.bot_client.execute_action("chat", {
                         "message": f"@{username} 技能'{skill_name}'超时(5分钟)喵~"
                     })
-                    await bot_client.execute_action("stopMoving", {})
+                    await self.bot_client.execute_action("stopMoving", {})
                     raise
                 except asyncio.CancelledError:
-                    await bot_client.execute_action("chat", {
+                    await self.bot_client.execute_action("chat", {
                         "message": f"@{username} 技能'{skill_name}'已停止喵~"
                     })
-                    await bot_client.execute_action("stopMoving", {})
+                    await self.bot_client.execute_action("stopMoving", {})
                     raise
             
             task = self.task_manager.create_task(
@@ -523,16 +1021,16 @@ class Agent:
                 coroutine_func=run_skill_with_notification
             )
             
-            await bot_client.execute_action("chat", {
+            await self.bot_client.execute_action("chat", {
                 "message": f"@{username} 已启动技能'{skill_name}' (ID:{task.id})，LLM保持运行喵~"
             })
             
-            print(f"[Agent] 后台启动技能: {skill_name}, 任务ID: {task.id}, 参数: {kwargs}")
+            print(f"{self.tag} 后台启动技能: {skill_name}, 任务ID: {task.id}, 参数: {kwargs}")
             
         except Exception as e:
             import traceback
-            print(f"[Agent] 技能测试错误: {traceback.format_exc()}")
-            await bot_client.execute_action("chat", {
+            print(f"{self.tag} 技能测试错误: {traceback.format_exc()}")
+            await self.bot_client.execute_action("chat", {
                 "message": f"@{username} 测试出错喵: {str(e)[:50]}"
             })
     
@@ -541,7 +1039,7 @@ class Agent:
         current_task = self.task_manager.current_task
         
         if not current_task:
-            await bot_client.execute_action("chat", {
+            await self.bot_client.execute_action("chat", {
                 "message": f"@{username} 没有正在运行的任务喵~"
             })
             return
@@ -553,17 +1051,17 @@ class Agent:
         
         # 停止移动
         try:
-            await bot_client.execute_action("stopMoving", {})
+            await self.bot_client.execute_action("stopMoving", {})
         except:
             pass
         
         if success:
-            print(f"[Agent] 停止任务: {task_name} (ID: {task_id})")
-            await bot_client.execute_action("chat", {
+            print(f"{self.tag} 停止任务: {task_name} (ID: {task_id})")
+            await self.bot_client.execute_action("chat", {
                 "message": f"@{username} 已停止任务'{task_name}'喵~"
             })
         else:
-            await bot_client.execute_action("chat", {
+            await self.bot_client.execute_action("chat", {
                 "message": f"@{username} 停止任务失败喵~"
             })
     
@@ -572,7 +1070,7 @@ class Agent:
         status = self.task_manager.get_status_summary()
         
         if not status.get("has_active_tasks"):
-            await bot_client.execute_action("chat", {
+            await self.bot_client.execute_action("chat", {
                 "message": f"@{username} 当前没有运行中的任务喵~"
             })
         else:
@@ -583,11 +1081,11 @@ class Agent:
             current = self.task_manager.current_task
             if current:
                 duration = current._get_duration() or 0
-                await bot_client.execute_action("chat", {
+                await self.bot_client.execute_action("chat", {
                     "message": f"@{username} 运行:{running} 等待:{pending} | {current.name}: {current.progress} ({duration:.1f}s)"
                 })
             else:
-                await bot_client.execute_action("chat", {
+                await self.bot_client.execute_action("chat", {
                     "message": f"@{username} 运行中:{running} 等待中:{pending}"
                 })
     
@@ -597,7 +1095,7 @@ class Agent:
             "指令: %skills-列出技能 | %test 技能名-测试 | "
             "%test 技能(参数=值)-带参测试 | %stop-停止 | %status-状态"
         )
-        await bot_client.execute_action("chat", {
+        await self.bot_client.execute_action("chat", {
             "message": f"@{username} {help_text}"
         })
     
@@ -607,7 +1105,7 @@ class Agent:
             skills = skill_manager.list_skills()
             
             if not skills:
-                await bot_client.execute_action("chat", {
+                await self.bot_client.execute_action("chat", {
                     "message": f"@{username} 还没有保存任何技能喵~"
                 })
                 return
@@ -619,12 +1117,12 @@ class Agent:
                 param_str = f"({', '.join(params)})" if params else ""
                 skill_list.append(f"{s['name']}{param_str}")
             
-            await bot_client.execute_action("chat", {
+            await self.bot_client.execute_action("chat", {
                 "message": f"@{username} 可用技能: {', '.join(skill_list)}"
             })
             
         except Exception as e:
-            await bot_client.execute_action("chat", {
+            await self.bot_client.execute_action("chat", {
                 "message": f"@{username} 获取技能列表失败喵: {str(e)[:30]}"
             })
     
@@ -633,10 +1131,21 @@ class Agent:
         task_status = self.task_manager.get_status_summary()
         
         return {
+            "bot_id": self.bot_id,
             "is_running": self.is_running,
             "last_action": self.last_action,
             "last_action_result": self.last_action_result,
             "pending_chat_count": len(self._pending_chat),
+            "wakeups": dict(self._wake_stats),
+            "change_detector": self.change_detector.get_stats(),
+            "pipeline": dict(self._pipeline_stats),
+            "reflexes": self.reflexes.get_stats(),
+            "plan": {"remaining": [s.get("action") for s in self._plan], **self._plan_stats},
+            "decision_cache": decision_cache.get_stats(),
+            "prompt": {**get_prompt_stats(), "provider_cache": llm_client.get_usage_stats()},
+            "history": {**llm_client.get_history_stats(self.bot_id), "tokenizer": tokenizer_name()},
+            "models": llm_client.router.get_stats(),
+            "state_mirror": self.bot_client.state.get_stats(),
             "active_tasks": task_status
         }
 
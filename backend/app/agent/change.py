@@ -0,0 +1,98 @@
+"""
+Observation change detection
+Skips LLM calls when nothing salient has changed since the last decision
+"""
+import hashlib
+from typing import Dict, Any, Optional, Tuple
+
+from app.config import settings
+
+
+# 一天的游戏刻数
+TICKS_PER_DAY = 24000
+
+
+def _bucket(value: Any, size: float) -> Optional[int]:
+    """按 size 分桶，size <= 0 时不分桶（精确比较）"""
+    if value is None:
+        return None
+    if size <= 0:
+        return value
+    return int(value // size)
+
+
+class ChangeDetector:
+    """
+    观察指纹比较器
+
+    指纹只包含决策关心的字段，各字段容差由配置决定：
+    - 位置：按 agent_change_position 格分桶
+    - 生命值 / 饥饿值：按 agent_change_health / agent_change_food 分档
+    - 附近实体：名称集合
+    - 背包：物品及数量的摘要
+    - 时间：一天分为 agent_change_time_phases 段
+    - 天气、后台任务集合
+    """
+
+    def __init__(self):
+        self.last: Optional[Tuple] = None
+        self.checked = 0
+        self.skipped = 0
+
+    def fingerprint(self, observation: Dict[str, Any]) -> Tuple:
+        """计算观察指纹"""
+        position = observation.get("position") or {}
+        health = observation.get("health") or {}
+        time_info = observation.get("time") or {}
+        weather = observation.get("weather") or {}
+        tasks = (observation.get("currentTasks") or {}).get("tasks") or []
+
+        entities = tuple(sorted({e.get("name", "") for e in observation.get("nearbyEntities") or []}))
+        inventory = hashlib.md5(
+            ",".join(f"{i['name']}:{i['count']}" for i in sorted(
+                observation.get("inventory") or [], key=lambda i: (i["name"], i["count"])
+            )).encode("utf-8")
+        ).hexdigest()
+
+        phase = None
+        if time_info.get("timeOfDay") is not None and settings.agent_change_time_phases > 0:
+            phase = int(time_info["timeOfDay"] % TICKS_PER_DAY * settings.agent_change_time_phases // TICKS_PER_DAY)
+
+        return (
+            _bucket(position.get("x"), settings.agent_change_position),
+            _bucket(position.get("y"), settings.agent_change_position),
+            _bucket(position.get("z"), settings.agent_change_position),
+            _bucket(health.get("health"), settings.agent_change_health),
+            _bucket(health.get("food"), settings.agent_change_food),
+            entities,
+            inventory,
+            phase,
+            weather.get("isRaining"),
+            tuple(sorted(t.get("id", "") for t in tasks))
+        )
+
+    def is_unchanged(self, observation: Dict[str, Any]) -> bool:
+        """
+        与上次决策时的指纹比较
+
+        Returns:
+            True 表示没有需要重新决策的变化（调用方应跳过 LLM）
+        """
+        self.checked += 1
+        if self.last is not None and self.fingerprint(observation) == self.last:
+            self.skipped += 1
+            return True
+        return False
+
+    def record(self, observation: Dict[str, Any]):
+        """记录本次决策所基于的观察"""
+        self.last = self.fingerprint(observation)
+
+    def reset(self):
+        self.last = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "checked": self.checked,
+            "skipped": self.skipped
+        }
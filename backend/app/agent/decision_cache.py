@@ -0,0 +1,259 @@
+"""
+Persistent decision cache
+Reuses LLM decisions for recurring chat/observation patterns (LRU + TTL, saved to disk)
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from app.agent.change import TICKS_PER_DAY, _bucket
+from app.bot.metadata import get_action_metadata
+from app.config import settings
+from app.llm.prompts import get_prompt_version
+
+
+BACKEND_DIR = Path(__file__).parent.parent.parent
+
+# 缓存文件格式版本，结构变化时递增（旧文件会被忽略）
+CACHE_FORMAT = 1
+
+_SPACES = re.compile(r"\s+")
+_NUMBERS = re.compile(r"-?\d+(\.\d+)?")
+
+
+def normalize_text(text: Any, mask_numbers: bool = False) -> str:
+    """
+    归一化文本：小写、合并空白，可选把数字替换为 #
+
+    Example:
+        normalize_text("  Follow   ME ")                    # -> "follow me"
+        normalize_text("Health: 12, Food: 8", True)         # -> "health: #, food: #"
+    """
+    text = _SPACES.sub(" ", str(text)).strip().lower()
+    if mask_numbers:
+        text = _NUMBERS.sub("#", text)
+    return text
+
+
+def decision_features(observation: Dict[str, Any], last_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    提取决定缓存键的特征
+
+    - 聊天：最近 5 条（玩家名 + 归一化内容，数字保留）
+    - 事件：最近 3 条（数字替换为 #）
+    - 生命值 / 饥饿值 / 时段：与 ChangeDetector 相同的分档
+    - 附近实体（前 5 个）、背包物品名称、天气、后台任务
+    - 上次动作结果（成功与否 + 归一化消息）
+    不包含精确位置：依赖坐标的动作在 actions.json 中标记为 cacheable: false
+    """
+    health = observation.get("health") or {}
+    time_info = observation.get("time") or {}
+    tasks = (observation.get("currentTasks") or {}).get("tasks") or []
+
+    phase = None
+    if time_info.get("timeOfDay") is not None and settings.agent_change_time_phases > 0:
+        phase = int(time_info["timeOfDay"] % TICKS_PER_DAY * settings.agent_change_time_phases // TICKS_PER_DAY)
+
+    result = None
+    if last_result:
+        result = [
+            bool(last_result.get("success", False)),
+            normalize_text(last_result.get("message", ""), mask_numbers=True)[:100]
+        ]
+
+    return {
+        "chat": [
+            [m.get("username", ""), normalize_text(m.get("message", ""))]
+            for m in (observation.get("chatMessages") or [])[-5:]
+        ],
+        "events": [normalize_text(e, mask_numbers=True) for e in (observation.get("events") or [])[-3:]],
+        "health": _bucket(health.get("health"), settings.agent_change_health),
+        "food": _bucket(health.get("food"), settings.agent_change_food),
+        "phase": phase,
+        "raining": (observation.get("weather") or {}).get("isRaining"),
+        "entities": sorted(
+            f"{e.get('name', '')}:{e.get('type', '')}" for e in (observation.get("nearbyEntities") or [])[:5]
+        ),
+        "inventory": sorted({i["name"] for i in observation.get("inventory") or []}),
+        "tasks": sorted(f"{t.get('name', '')}:{t.get('status', '')}" for t in tasks),
+        "result": result
+    }
+
+
+def prompt_version() -> str:
+    """
+    提示词版本：系统提示词模板（含动作/技能列表）与模型名（含 fast 档位模型）的摘要
+
+    动作、技能、人格或模型变化后旧的缓存决策自动失效
+    """
+    text = f"{settings.llm_model}\n{settings.llm_fast_model}\n{get_prompt_version()}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def is_cacheable_decision(decision: Dict[str, Any]) -> bool:
+    """
+    决策是否可以缓存复用
+
+    actions.json 中 cacheable: false 的动作（依赖坐标或不可重复执行）、未在 actions.json 中配置的动作
+    （startSkill 等）以及 decision_cache_skip_actions 中的动作不缓存；计划中任一步不可缓存则整个计划不缓存
+    """
+    skip = {a.strip() for a in settings.decision_cache_skip_actions.split(",") if a.strip()}
+    steps = decision.get("plan") if isinstance(decision.get("plan"), list) else [decision]
+    actions = [s.get("action") for s in steps if isinstance(s, dict)]
+    if not actions or not all(actions):
+        return False
+    return all(a not in skip and get_action_metadata(a)["cacheable"] for a in actions)
+
+
+class DecisionCache:
+    """
+    LLM 决策缓存
+
+    键为聊天文本、观察特征和提示词版本的摘要；按最近使用顺序淘汰（LRU），
+    超过 TTL 的条目视为未命中。缓存定期写入磁盘，重启后继续使用
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = 500, ttl: float = 3600.0):
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (写入时间, 决策)
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._loaded = False
+        self._dirty = False
+        self._last_save = 0.0
+        self.stats: Dict[str, int] = {
+            "hits": 0, "misses": 0, "stores": 0, "uncacheable": 0, "expired": 0, "evicted": 0
+        }
+
+    def make_key(
+        self,
+        observation: Dict[str, Any],
+        last_result: Optional[Dict[str, Any]],
+        version: Optional[str] = None
+    ) -> str:
+        """计算缓存键"""
+        payload = {
+            "format": CACHE_FORMAT,
+            "prompt": version or prompt_version(),
+            "features": decision_features(observation, last_result)
+        }
+        text = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查找决策，命中时移到最近使用位置"""
+        self._ensure_loaded()
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        if self.ttl > 0 and time.time() - entry[0] > self.ttl:
+            del self.entries[key]
+            self._dirty = True
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return json.loads(json.dumps(entry[1]))
+
+    def put(self, key: str, decision: Dict[str, Any]) -> bool:
+        """
+        缓存决策（不可缓存的动作会被跳过）
+
+        Returns:
+            是否写入
+        """
+        self._ensure_loaded()
+        if not isinstance(decision, dict) or not is_cacheable_decision(decision):
+            self.stats["uncacheable"] += 1
+            return False
+        self.entries[key] = (time.time(), decision)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evicted"] += 1
+        self.stats["stores"] += 1
+        self._dirty = True
+        if time.monotonic() - self._last_save >= settings.decision_cache_save_interval:
+            self.save()
+        return True
+
+    def clear(self):
+        self.entries.clear()
+        self._loaded = True
+        self._dirty = True
+        self.save()
+
+    def load(self):
+        """从磁盘加载（丢弃已过期和格式不符的条目）"""
+        self._loaded = True
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[DecisionCache] 加载缓存失败: {e}")
+            return
+        if data.get("format") != CACHE_FORMAT:
+            return
+
+        now = time.time()
+        for key, created_at, decision in data.get("entries", []):
+            if self.ttl <= 0 or now - created_at <= self.ttl:
+                self.entries[key] = (created_at, decision)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        print(f"[DecisionCache] 已加载 {len(self.entries)} 条缓存决策")
+
+    def save(self):
+        """写入磁盘（先写临时文件再替换，避免中途退出留下损坏的文件）"""
+        self._last_save = time.monotonic()
+        if not self.path or not self._dirty:
+            return
+        data = {
+            "format": CACHE_FORMAT,
+            "entries": [[key, created_at, decision] for key, (created_at, decision) in self.entries.items()]
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except Exception as e:
+            print(f"[DecisionCache] 保存缓存失败: {e}")
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "enabled": settings.decision_cache_enabled,
+            "size": len(self.entries),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            **self.stats
+        }
+
+
+def _default_path() -> Path:
+    path = Path(settings.decision_cache_file)
+    return path if path.is_absolute() else BACKEND_DIR / path
+
+
+# 所有 Bot 共用同一个缓存（人格与提示词相同，决策可以复用）
+decision_cache = DecisionCache(
+    path=_default_path(),
+    max_entries=settings.decision_cache_size,
+    ttl=settings.decision_cache_ttl
+)
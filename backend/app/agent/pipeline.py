@@ -0,0 +1,61 @@
+"""
+Speculative decision pipelining
+While a long action runs, the next decision is requested from the observation
+the action is expected to produce; it is used only if the real outcome matches
+"""
+import asyncio
+import copy
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Callable
+
+
+@dataclass
+class Speculation:
+    """一次预测决策"""
+    action: str
+    projected: Dict[str, Any]        # 预测的动作完成后的观察
+    task: asyncio.Task               # 进行中的 LLM 请求
+    # 采用时才写入对话历史和决策缓存的内容：{"user_message": ..., "cache_key": ...}
+    commit: Dict[str, Any] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.time)
+
+
+def _project_go_to(parameters: Dict[str, Any], observation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """goTo 使用 GoalBlock，成功时站在目标方块中（位置与状态镜像一致，取整到方块坐标）"""
+    try:
+        observation["position"] = {
+            "x": math.floor(float(parameters["x"])),
+            "y": math.floor(float(parameters["y"])),
+            "z": math.floor(float(parameters["z"]))
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+    return observation
+
+
+# 可以预测结果的耗时动作：动作名 -> 投影函数（返回 None 表示无法预测）
+PROJECTIONS: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Optional[Dict[str, Any]]]] = {
+    "goTo": _project_go_to,
+}
+
+
+def project_observation(
+    action: str,
+    parameters: Dict[str, Any],
+    observation: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    预测动作成功完成后的观察
+
+    Returns:
+        预测的观察（聊天和事件为空），动作不支持预测时返回 None
+    """
+    projector = PROJECTIONS.get(action)
+    if not projector:
+        return None
+    projected = copy.deepcopy(observation)
+    projected["chatMessages"] = []
+    projected["events"] = []
+    return projector(parameters or {}, projected)
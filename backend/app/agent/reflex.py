@@ -0,0 +1,190 @@
+"""
+Local reflex layer
+A prioritized condition -> action table (reflexes.json) evaluated on every
+observation/state change, so urgent situations are handled without an LLM call
+"""
+import json
+import math
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple
+
+
+REFLEX_CONFIG_FILE = Path(__file__).parent.parent.parent / "reflexes.json"
+
+
+def evaluate_condition(condition: Dict[str, Any], observation: Dict[str, Any]) -> bool:
+    """
+    判断观察是否满足条件（多个键之间为“且”）
+
+    支持的条件：
+        healthBelow / foodBelow: 数值，生命值 / 饥饿值低于该值
+        entityWithin: {"name": 实体名, "type": 实体类型, "distance": 距离}，任一实体满足即可
+        inLava / inWater: 布尔值
+        hasItem: 物品名或 {"name": 物品名, "count": 最少数量}
+        nearPosition: {"x", "y", "z", "distance"}，当前位置在该点附近
+        all / any: 条件列表
+        not: 条件
+
+    Example:
+        evaluate_condition({"foodBelow": 4}, observation)
+        evaluate_condition({"any": [{"inLava": True}, {"healthBelow": 4}]}, observation)
+    """
+    for key, value in condition.items():
+        if not _CONDITIONS.get(key, _unknown)(value, observation):
+            return False
+    return True
+
+
+def _unknown(value: Any, observation: Dict[str, Any]) -> bool:
+    return False
+
+
+def _health_below(value: float, observation: Dict[str, Any]) -> bool:
+    health = (observation.get("health") or {}).get("health")
+    return health is not None and health < value
+
+
+def _food_below(value: float, observation: Dict[str, Any]) -> bool:
+    food = (observation.get("health") or {}).get("food")
+    return food is not None and food < value
+
+
+def _find_entity(spec: Dict[str, Any], observation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """返回满足条件的最近实体"""
+    matches = [
+        e for e in observation.get("nearbyEntities") or []
+        if (not spec.get("name") or e.get("name") == spec["name"])
+        and (not spec.get("type") or e.get("type") == spec["type"])
+        and e.get("distance", math.inf) <= spec.get("distance", math.inf)
+    ]
+    return min(matches, key=lambda e: e.get("distance", math.inf)) if matches else None
+
+
+def _entity_within(value: Dict[str, Any], observation: Dict[str, Any]) -> bool:
+    return _find_entity(value, observation) is not None
+
+
+def _in_lava(value: bool, observation: Dict[str, Any]) -> bool:
+    return bool((observation.get("fluids") or {}).get("inLava")) == value
+
+
+def _in_water(value: bool, observation: Dict[str, Any]) -> bool:
+    return bool((observation.get("fluids") or {}).get("inWater")) == value
+
+
+def _has_item(value: Any, observation: Dict[str, Any]) -> bool:
+    spec = value if isinstance(value, dict) else {"name": value}
+    count = sum(
+        i.get("count", 0) for i in observation.get("inventory") or []
+        if i.get("name") == spec.get("name")
+    )
+    return count >= spec.get("count", 1)
+
+
+def _near_position(value: Dict[str, Any], observation: Dict[str, Any]) -> bool:
+    position = observation.get("position")
+    if not position:
+        return False
+    distance = math.dist(
+        (position["x"], position["y"], position["z"]),
+        (value["x"], value["y"], value["z"])
+    )
+    return distance <= value.get("distance", 2)
+
+
+_CONDITIONS = {
+    "healthBelow": _health_below,
+    "foodBelow": _food_below,
+    "entityWithin": _entity_within,
+    "inLava": _in_lava,
+    "inWater": _in_water,
+    "hasItem": _has_item,
+    "nearPosition": _near_position,
+    "all": lambda value, obs: all(evaluate_condition(c, obs) for c in value),
+    "any": lambda value, obs: any(evaluate_condition(c, obs) for c in value),
+    "not": lambda value, obs: not evaluate_condition(value, obs),
+}
+
+
+def load_reflex_rules() -> List[Dict[str, Any]]:
+    """从 reflexes.json 加载规则，按优先级从高到低排序"""
+    if not REFLEX_CONFIG_FILE.exists():
+        return []
+    try:
+        with open(REFLEX_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+    except Exception as e:
+        print(f"[reflex] 加载反射规则失败: {e}")
+        return []
+    return sorted(rules, key=lambda r: r.get("priority", 0), reverse=True)
+
+
+class ReflexEngine:
+    """
+    反射规则引擎
+
+    每次只触发优先级最高的一条满足条件的规则；规则触发后在 cooldown 秒内不再触发
+    """
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None):
+        self.rules = rules if rules is not None else load_reflex_rules()
+        self._last_fired: Dict[str, float] = {}
+        self.fired: Dict[str, int] = {}
+
+    def match(self, observation: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], str, Dict[str, Any]]]:
+        """
+        找出应触发的规则
+
+        Returns:
+            (规则, 动作名, 参数)，没有规则触发时返回 None
+        """
+        now = time.monotonic()
+        for rule in self.rules:
+            name = rule.get("name", "")
+            if now - self._last_fired.get(name, -math.inf) < rule.get("cooldown", 5):
+                continue
+            if not evaluate_condition(rule.get("when", {}), observation):
+                continue
+
+            resolved = self._resolve_action(rule, observation)
+            if resolved is None:
+                continue
+            self._last_fired[name] = now
+            self.fired[name] = self.fired.get(name, 0) + 1
+            return (rule, *resolved)
+        return None
+
+    def _resolve_action(
+        self,
+        rule: Dict[str, Any],
+        observation: Dict[str, Any]
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """把规则中的动作转换为实际的 Bot 动作（retreat 转换为 goTo）"""
+        action = rule.get("action")
+        parameters = dict(rule.get("parameters") or {})
+        if action != "retreat":
+            return action, parameters
+
+        # 沿实体指向自己的方向撤退
+        position = observation.get("position")
+        spec = (rule.get("when") or {}).get("entityWithin") or {"name": parameters.get("from")}
+        entity = _find_entity({**spec, "distance": math.inf}, observation)
+        if not position or not entity or not entity.get("position"):
+            return None
+
+        dx = position["x"] - entity["position"]["x"]
+        dz = position["z"] - entity["position"]["z"]
+        length = math.hypot(dx, dz) or 1.0
+        distance = parameters.get("distance", 8)
+        return "goTo", {
+            "x": math.floor(position["x"] + dx / length * distance),
+            "y": math.floor(position["y"]),
+            "z": math.floor(position["z"] + dz / length * distance)
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "rules": len(self.rules),
+            "fired": dict(self.fired)
+        }
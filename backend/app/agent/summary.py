@@ -0,0 +1,111 @@
+"""
+Action result summarizer
+Turns (possibly huge) action/script results into a short line for the next
+prompt, within a token budget; the full result of the latest script is
+kept by the task manager for /api/tasks/{id}, not the prompt
+"""
+import json
+from typing import Dict, Any, Optional, List, Tuple
+
+from app.config import settings
+from app.llm.tokens import estimate_tokens, truncate_to_tokens
+
+
+# 不进入提示词的大字段（最近一次脚本的完整结果可通过 /api/tasks/{id} 查看）
+BULKY_FIELDS = {"logs", "actions", "output", "traceback", "result"}
+
+# 不进入提示词的内部字段：task_id 只供 API 查看，LLM 无法按 id 查询结果
+# （startSkill 的任务 ID 已经在 message 中）
+OMITTED_FIELDS = BULKY_FIELDS | {"task_id"}
+
+# 数值字段最多保留几个
+MAX_NUMBERS = 8
+
+# 单个失败调用消息的长度上限（token）
+FAILED_CALL_TOKENS = 20
+
+
+def _key_numbers(result: Dict[str, Any]) -> List[str]:
+    """顶层的数值/布尔字段，以及列表字段的长度"""
+    numbers = []
+    for key, value in result.items():
+        if key == "success" or key in OMITTED_FIELDS:
+            continue
+        if isinstance(value, (bool, int, float)):
+            numbers.append(f"{key}={round(value, 2) if type(value) is float else value}")
+        elif isinstance(value, list):
+            numbers.append(f"{key}=[{len(value)} items]")
+        if len(numbers) >= MAX_NUMBERS:
+            break
+    return numbers
+
+
+def _failed_calls(result: Dict[str, Any], limit: int) -> Tuple[List[str], int]:
+    """
+    脚本结果中最后几个失败的调用
+
+    Returns:
+        (最后 limit 个失败调用的描述, 失败总数)
+    """
+    actions = result.get("actions")
+    if not isinstance(actions, list):
+        return [], 0
+    failed = [
+        a for a in actions
+        if isinstance(a, dict) and not (a.get("result") or {}).get("success", False)
+    ]
+    calls = [
+        f"✗{a.get('action', 'unknown')}: "
+        f"{truncate_to_tokens(str((a.get('result') or {}).get('message', '')), FAILED_CALL_TOKENS)}"
+        for a in failed[-limit:]
+    ] if limit > 0 else []
+    return calls, len(failed)
+
+
+def summarize_result(result: Optional[Dict[str, Any]], budget: Optional[int] = None) -> str:
+    """
+    把动作结果压缩为不超过 budget 个 token 的一行文本
+
+    logs / actions 等大字段始终不进入提示词（失败的调用只保留最后几个）。
+    其余字段放得下时原样以 JSON 输出（如 findBlock 的坐标、scanEntities 的实体列表），
+    放不下时只保留成功标志、消息、关键数值和失败的调用
+
+    Args:
+        result: 动作结果（execute_action / executeScript 等的返回值）
+        budget: token 预算，默认 agent_result_token_budget
+
+    Example:
+        summarize_result({"success": True, "message": "Executed 40 actions", "action_count": 40, "logs": [...]})
+        # -> '{"success": true, "message": "Executed 40 actions", "action_count": 40}'
+    """
+    budget = budget or settings.agent_result_token_budget
+    if not result:
+        return "none"
+    if not isinstance(result, dict):
+        return truncate_to_tokens(str(result), budget)
+
+    failed, failed_total = _failed_calls(result, settings.agent_result_failed_calls)
+    compact = {k: v for k, v in result.items() if k not in OMITTED_FIELDS}
+    if failed:
+        compact["failed_calls"] = failed
+    text = json.dumps(compact, ensure_ascii=False, default=str)
+    if estimate_tokens(text) <= budget:
+        return text
+
+    message = str(result.get("message") or result.get("error") or "")
+    numbers = ", ".join(_key_numbers(result))
+
+    def build(text: str, calls: List[str]) -> str:
+        parts = [f"success={bool(result.get('success', False))}", f"message: {text}"]
+        if numbers:
+            parts.append(numbers)
+        if calls:
+            parts.append(f"failed ({failed_total}): " + "; ".join(calls))
+        return "; ".join(parts)
+
+    # 消息之外的部分最多占一半预算，放不下时从最早的失败调用开始丢弃
+    while failed and estimate_tokens(build("", failed)) > budget // 2:
+        failed = failed[1:]
+
+    message = truncate_to_tokens(message, max(budget - estimate_tokens(build("", failed)), 0))
+    return build(message, failed)
@@ -1,16 +1,26 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 
-from app.agent.agent import agent
-from app.bot.client import bot_client
 from app.script.executor import script_executor
+from app.session.manager import BotSession, session_manager, DEFAULT_BOT_ID
 from app.skills.manager import skill_manager
-from app.task.manager import task_manager
+from app.tracing import tracer
 
 
 router = APIRouter()
 
+# 单个 Bot 的接口：挂载在 /bots/{bot_id} 下，同时保留原路径（默认 Bot，也可用 ?bot_id= 指定）
+bot_router = APIRouter()
+
+
+def get_session(bot_id: str = DEFAULT_BOT_ID) -> BotSession:
+    """按 bot_id 取会话"""
+    session = session_manager.get(bot_id)
+    if not session:
+        raise HTTPException(status_code=404, detail=f"Bot '{bot_id}' not found")
+    return session
+
 
 class ActionRequest(BaseModel):
     """Request model for executing an action"""
@@ -26,76 +36,82 @@ class ActionResponse(BaseModel):
 
 # ========== Agent Endpoints ==========
 
-@router.get("/agent/status")
-async def get_agent_status():
+@bot_router.get("/agent/status")
+async def get_agent_status(session: BotSession = Depends(get_session)):
     """Get current agent status"""
-    return agent.get_status()
+    return session.agent.get_status()
 
 
-@router.post("/agent/start")
-async def start_agent():
+@bot_router.post("/agent/start")
+async def start_agent(session: BotSession = Depends(get_session)):
     """Start the agent decision loop"""
-    await agent.start()
+    await session.agent.start()
     return {"status": "started"}
 
 
-@router.post("/agent/stop")
-async def stop_agent():
+@bot_router.post("/agent/stop")
+async def stop_agent(session: BotSession = Depends(get_session)):
     """Stop the agent decision loop"""
-    await agent.stop()
+    await session.agent.stop()
     return {"status": "stopped"}
 
 
-@router.post("/agent/tick")
-async def force_tick():
+@bot_router.post("/agent/tick")
+async def force_tick(session: BotSession = Depends(get_session)):
     """Force an immediate agent decision cycle"""
-    await agent.force_tick()
+    await session.agent.force_tick()
     return {"status": "tick completed"}
 
 
 # ========== Bot Endpoints (Proxy to Node.js service) ==========
 
-@router.get("/bot/status")
-async def get_bot_status():
+@bot_router.get("/bot/status")
+async def get_bot_status(session: BotSession = Depends(get_session)):
     """Get bot connection status"""
     try:
-        return await bot_client.get_status()
+        return await session.client.get_status()
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Bot service error: {str(e)}")
 
 
-@router.get("/bot/observation")
-async def get_bot_observation():
+@bot_router.get("/bot/stats")
+async def get_bot_client_stats(session: BotSession = Depends(get_session)):
+    """Get bot client statistics (event dispatch queue, pending requests)"""
+    return session.client.get_stats()
+
+
+@bot_router.get("/bot/observation")
+async def get_bot_observation(session: BotSession = Depends(get_session)):
     """Get current game observation"""
     try:
-        return await bot_client.get_observation()
+        return await session.client.get_observation()
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Bot service error: {str(e)}")
 
 
-@router.post("/bot/connect")
-async def connect_bot():
+@bot_router.post("/bot/connect")
+async def connect_bot(session: BotSession = Depends(get_session)):
     """Connect bot to Minecraft server"""
     try:
-        return await bot_client.connect()
+        return await session.client.connect()
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Bot service error: {str(e)}")
 
 
-@router.post("/bot/disconnect")
-async def disconnect_bot():
+@bot_router.post("/bot/disconnect")
+async def disconnect_bot(session: BotSession = Depends(get_session)):
     """Disconnect bot from Minecraft server"""
     try:
-        return await bot_client.disconnect()
+        return await session.client.disconnect()
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Bot service error: {str(e)}")
 
 
-@router.post("/bot/action", response_model=ActionResponse)
-async def execute_bot_action(request: ActionRequest):
+@bot_router.post("/bot/action", response_model=ActionResponse)
+async def execute_bot_action(request: ActionRequest, session: BotSession = Depends(get_session)):
     """Execute an action on the bot"""
     try:
-        result = await bot_client.execute_action(
+        result = await session.client.execute_action(
             request.action,
             request.parameters
         )
@@ -123,8 +139,8 @@ class ScriptResponse(BaseModel):
     action_count: Optional[int] = None
 
 
-@router.post("/script/execute")
-async def execute_script(request: ScriptRequest):
+@bot_router.post("/script/execute")
+async def execute_script(request: ScriptRequest, session: BotSession = Depends(get_session)):
     """
     Execute a Python script to perform complex bot actions.
     
@@ -176,7 +192,8 @@ async def execute_script(request: ScriptRequest):
     try:
         result = await script_executor.execute(
             script=request.code,
-            timeout=request.timeout
+            timeout=request.timeout,
+            client=session.client
         )
         return result
     except Exception as e:
@@ -328,16 +345,16 @@ async def get_skills_description():
 
 # ========== Task Management Endpoints ==========
 
-@router.get("/tasks")
-async def list_tasks():
+@bot_router.get("/tasks")
+async def list_tasks(session: BotSession = Depends(get_session)):
     """
     获取当前所有任务状态
     
     Returns:
         包含运行中和等待中任务的列表
     """
-    status = task_manager.get_status_summary()
-    history = task_manager.get_recent_history(10)
+    status = session.tasks.get_status_summary()
+    history = session.tasks.get_recent_history(10)
     
     return {
         "success": True,
@@ -346,15 +363,15 @@ async def list_tasks():
     }
 
 
-@router.get("/tasks/current")
-async def get_current_task():
+@bot_router.get("/tasks/current")
+async def get_current_task(session: BotSession = Depends(get_session)):
     """
     获取当前正在运行的主要任务
     
     Returns:
         当前任务详情，或 null
     """
-    current = task_manager.current_task
+    current = session.tasks.current_task
     
     if current:
         return {
@@ -369,15 +386,15 @@ async def get_current_task():
         }
 
 
-@router.get("/tasks/{task_id}")
-async def get_task(task_id: str):
+@bot_router.get("/tasks/{task_id}")
+async def get_task(task_id: str, session: BotSession = Depends(get_session)):
     """
     获取指定任务的详情
     
     Args:
         task_id: 任务ID
     """
-    task = task_manager.get_task(task_id)
+    task = session.tasks.get_task(task_id)
     
     if not task:
         raise HTTPException(status_code=404, detail=f"Task '{task_id}' not found")
@@ -394,8 +411,8 @@ class StartSkillRequest(BaseModel):
     kwargs: Optional[Dict[str, Any]] = None
 
 
-@router.post("/tasks/start-skill")
-async def start_skill_task(request: StartSkillRequest):
+@bot_router.post("/tasks/start-skill")
+async def start_skill_task(request: StartSkillRequest, session: BotSession = Depends(get_session)):
     """
     启动一个后台技能任务
     
@@ -411,10 +428,10 @@ async def start_skill_task(request: StartSkillRequest):
     
     # 创建后台任务
     async def run_skill():
-        bot_api = BotAPI()
+        bot_api = BotAPI(session.client)
         return await bot_api.useSkill(request.skillName, **(request.kwargs or {}))
     
-    task = task_manager.create_task(
+    task = session.tasks.create_task(
         name=request.skillName,
         description=skill.get("description", ""),
         coroutine_func=run_skill
@@ -427,23 +444,23 @@ async def start_skill_task(request: StartSkillRequest):
     }
 
 
-@router.post("/tasks/{task_id}/cancel")
-async def cancel_task(task_id: str):
+@bot_router.post("/tasks/{task_id}/cancel")
+async def cancel_task(task_id: str, session: BotSession = Depends(get_session)):
     """
     取消指定任务
     
     Args:
         task_id: 任务ID
     """
-    task = task_manager.get_task(task_id)
+    task = session.tasks.get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail=f"Task '{task_id}' not found")
     
-    success = await task_manager.cancel_task(task_id)
+    success = await session.tasks.cancel_task(task_id)
     
     # 停止机器人移动
     try:
-        await bot_client.execute_action("stopMoving", {})
+        await session.client.execute_action("stopMoving", {})
     except:
         pass
     
@@ -453,17 +470,102 @@ async def cancel_task(task_id: str):
         return {"success": False, "message": f"无法取消任务 {task_id}（可能已完成）"}
 
 
-@router.post("/tasks/cancel-all")
-async def cancel_all_tasks():
+@bot_router.post("/tasks/cancel-all")
+async def cancel_all_tasks(session: BotSession = Depends(get_session)):
     """
     取消所有正在运行的任务
     """
-    await task_manager.cancel_all_tasks()
+    await session.tasks.cancel_all_tasks()
     
     # 停止机器人移动
     try:
-        await bot_client.execute_action("stopMoving", {})
+        await session.client.execute_action("stopMoving", {})
     except:
         pass
     
-    return {"success": True, "message": "已取消所有任务"}
\ No newline at end of file
+    return {"success": True, "message": "已取消所有任务"}
+
+# ========== Bot Session Endpoints ==========
+
+class CreateBotRequest(BaseModel):
+    """注册 Bot 会话请求"""
+    botId: str
+    serviceUrl: str
+    startAgent: Optional[bool] = False
+
+
+@router.get("/bots")
+async def list_bots():
+    """
+    列出所有 Bot 会话
+    """
+    sessions = session_manager.list_sessions()
+    return {
+        "success": True,
+        "count": len(sessions),
+        "bots": sessions
+    }
+
+
+@router.post("/bots")
+async def create_bot(request: CreateBotRequest):
+    """
+    注册一个 Bot 会话（每个 Bot 对应一个 Bot 服务）
+    
+    Args:
+        botId: 会话 ID，之后通过 /api/bots/{botId}/... 访问
+        serviceUrl: Bot 服务地址，如 http://localhost:3002 或 unix:///run/llm-mc/miner.sock
+        startAgent: 是否立即启动 Agent
+    """
+    try:
+        session = await session_manager.create(
+            request.botId, request.serviceUrl, start_agent=request.startAgent
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "success": True,
+        "bot": session.to_dict()
+    }
+
+
+@router.delete("/bots/{bot_id}")
+async def delete_bot(bot_id: str):
+    """
+    停止并移除 Bot 会话（默认会话不能移除）
+    """
+    if not await session_manager.remove(bot_id):
+        raise HTTPException(status_code=404, detail=f"Bot '{bot_id}' not found or cannot be removed")
+    
+    return {"success": True, "message": f"已移除 Bot '{bot_id}'"}
+
+
+# ========== Debug Endpoints ==========
+
+@router.get("/debug/traces")
+async def get_traces(format: str = "chrome", limit: Optional[int] = None, name: Optional[str] = None):
+    """
+    导出最近记录的 span
+    
+    Args:
+        format: chrome（trace-event 格式，可在 chrome://tracing 或 ui.perfetto.dev 打开）/ json（含按名称汇总的耗时）
+        limit: 只导出最近的 N 个 span
+        name: 只导出名称以此开头的 span，如 agent. / llm. / bot. / script.
+    """
+    if format == "chrome":
+        return tracer.to_chrome_trace(limit, name)
+    if format == "json":
+        return tracer.to_json(limit, name)
+    raise HTTPException(status_code=400, detail=f"Unknown trace format '{format}'")
+
+
+@router.delete("/debug/traces")
+async def clear_traces():
+    """清空 span 缓冲区"""
+    tracer.clear()
+    return {"success": True, **tracer.get_stats()}
+
+
+router.include_router(bot_router)
+router.include_router(bot_router, prefix="/bots/{bot_id}")
@@ -1,3 +1,4 @@
-from .client import BotClient, bot_client
+from .client import BotClient, BotRequestError, BotServiceUnavailable, bot_client
+from .state import BotStateMirror
 
-__all__ = ["BotClient", "bot_client"]
\ No newline at end of file
+__all__ = ["BotClient", "BotRequestError", "BotServiceUnavailable", "BotStateMirror", "bot_client"]
\ No newline at end of file
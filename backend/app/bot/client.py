@@ -1,61 +1,216 @@
 import httpx
 import asyncio
+import copy
+import itertools
 import json
-from typing import Dict, Any, Optional, Callable, List
+import math
+import random
+import time
+from typing import Dict, Any, Optional, Callable, List, Tuple
 import websockets
 
 from app.config import settings
+from app.bot.state import BotStateMirror
+from app.bot.world import WorldCache
+from app.bot.inventory import InventoryMirror
+from app.bot.metadata import get_action_metadata
+from app.tracing import tracer
+from app.bot.health import LatencyHistogram, CircuitBreaker
+from app.bot.transport import Transport, create_transport
+from app.bot.codec import (
+    JSON_CODEC, available_codecs, codec_for_subprotocol, codec_for_content_type, accept_header
+)
+
+
+# 单次批量请求的最大动作数（与 Bot 服务端保持一致）
+MAX_BATCH_SIZE = 256
+
+# 自适应超时至少需要的样本数
+MIN_TIMEOUT_SAMPLES = 20
+
+# 非动作请求在 actions.json 中对应的元数据名称
+REQUEST_METADATA_NAMES = {
+    "status": "getStatus",
+    "observation": "getObservation",
+    "state": "getState",
+    "inventory": "getInventory",
+    "actions": "batch"
+}
+
+
+class BotRequestError(Exception):
+    """Bot 服务返回的请求错误"""
+
+    def __init__(self, message: str, status: int = 500):
+        super().__init__(message)
+        self.status = status
+
+
+class BotServiceUnavailable(BotRequestError):
+    """Bot 服务不可用（熔断器打开），请求被直接拒绝"""
+
+    def __init__(self, message: str):
+        super().__init__(message, status=503)
+
+
+class _SocketUnavailable(Exception):
+    """WebSocket 未连接，需要回退到 HTTP"""
 
 
 class BotClient:
     """Client for communicating with the Node.js Mineflayer bot service"""
     
-    def __init__(self):
-        self.base_url = settings.bot_service_url
-        self.ws_url = settings.bot_ws_url
+    def __init__(self, transport: Optional[Transport] = None):
+        # 传输层：默认根据 bot_service_url 选择 TCP 或 Unix 套接字
+        self.transport = transport or create_transport(
+            settings.bot_service_url, settings.bot_ws_url
+        )
+        # 编解码器：HTTP 通过 Accept 协商，WebSocket 通过子协议协商
+        self._codecs = available_codecs(settings.bot_codec)
+        self._ws_codec = JSON_CODEC
         self.http_client: Optional[httpx.AsyncClient] = None
         self.ws_connection = None
         self.event_handlers: List[Callable] = []
         self._ws_task: Optional[asyncio.Task] = None
         
-        # 事件等待器：用于等待特定事件
-        self._event_waiters: List[Dict[str, Any]] = []
+        # 事件等待器：用于等待特定事件，按事件类型索引 {event_type: {waiter_id: waiter}}
+        self._event_waiters: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self._waiter_ids = itertools.count(1)
+        
+        # 事件分发队列：普通事件处理器在独立任务中执行，不阻塞 WebSocket 读取
+        self._event_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.bot_event_queue_size)
+        self._dispatch_task: Optional[asyncio.Task] = None
+        self._dispatch_stats: Dict[str, Any] = {
+            "enqueued": 0,
+            "dispatched": 0,
+            "dropped": 0,
+            "handler_errors": 0,
+            "max_queue_depth": 0,
+            "max_latency_ms": 0.0
+        }
+        
+        # WebSocket 请求通道：按关联 ID 等待响应
+        self._pending_requests: Dict[str, asyncio.Future] = {}
+        self._request_ids = itertools.count(1)
+        
+        # Bot 状态镜像：由推送的 state 增量维护，读取时无需网络请求
+        self.state = BotStateMirror()
+        self._state_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._resync_task: Optional[asyncio.Task] = None
+        
+        # 背包镜像：由推送的槽位增量维护；动作结果带回的版本号用于确认镜像已包含该动作的影响
+        self.inventory = InventoryMirror()
+        self._inventory_resync_task: Optional[asyncio.Task] = None
+        self._min_inventory_version = 0
+        self._inventory_stats: Dict[str, int] = {"local": 0, "remote": 0}
+        
+        # 事件续传：记录服务端 epoch 和最后收到的事件序号，重连时据此补发断线期间的事件
+        self._event_epoch: Optional[str] = None
+        self._event_seq = 0
+        self._reconnect_stats: Dict[str, int] = {
+            "connects": 0, "resumed": 0, "replayed": 0, "gaps": 0, "duplicates": 0
+        }
+        
+        # 方块缓存：由 blockUpdate / chunkUnload 事件失效
+        self.world = WorldCache(ttl=settings.world_cache_ttl)
+        
+        # 只读请求合并：相同请求共享进行中的调用，并在 freshness 时间内复用结果
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._recent_results: Dict[str, Tuple[float, Any]] = {}
+        # 动作（可能修改世界或背包）的开始/结束计数，以及正在执行的动作数：
+        # 动作执行期间不保存只读结果，动作开始前发出的读取结果也不再复用
+        self._mutation_gen = 0
+        self._mutations = 0
+        self._coalesce_stats: Dict[str, int] = {
+            "requests": 0,
+            "shared": 0,
+            "fresh_hits": 0
+        }
+        
+        # 每个动作的延迟直方图（用于推导超时）和 Bot 服务熔断器
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self.breaker = CircuitBreaker(
+            threshold=settings.bot_breaker_threshold,
+            cooldown=settings.bot_breaker_cooldown
+        )
     
     async def init(self):
         """Initialize the HTTP client"""
         # 设置较长的超时时间，因为某些动作（如goTo）可能需要很长时间
-        self.http_client = httpx.AsyncClient(
-            base_url=self.base_url,
-            timeout=httpx.Timeout(
+        self.http_client = self.transport.create_http_client(
+            httpx.Timeout(
                 connect=10.0,    # 连接超时
-                read=300.0,      # 读取超时（5分钟，足够走很远的路）
+                read=settings.bot_timeout_max,  # 读取超时上限，实际按动作由 _send 控制
                 write=10.0,      # 写入超时
                 pool=10.0        # 连接池超时
             )
         )
+        self.http_client.headers["Accept"] = accept_header(self._codecs)
     
     async def close(self):
         """Close connections"""
         if self._ws_task:
             self._ws_task.cancel()
+        if self._dispatch_task:
+            self._dispatch_task.cancel()
+        if self._resync_task:
+            self._resync_task.cancel()
+        if self._inventory_resync_task:
+            self._inventory_resync_task.cancel()
         if self.ws_connection:
             await self.ws_connection.close()
+        self._fail_pending_requests()
         if self.http_client:
             await self.http_client.aclose()
     
-    # ========== HTTP API Methods ==========
+    # ========== Request Methods ==========
+    # 优先通过已建立的 WebSocket 发送请求，未连接时回退到 HTTP
     
     async def get_status(self) -> Dict[str, Any]:
         """Get bot status"""
-        response = await self.http_client.get("/status")
-        response.raise_for_status()
-        return response.json()
+        return await self._request(
+            "status", {}, self._http_get_status, retry_over_http=True
+        )
     
     async def get_observation(self) -> Dict[str, Any]:
         """Get current observation from bot"""
-        response = await self.http_client.get("/observation")
-        response.raise_for_status()
-        return response.json()
+        return await self._request(
+            "observation", {}, self._http_get_observation, retry_over_http=True
+        )
+    
+    async def get_state_snapshot(self) -> Dict[str, Any]:
+        """Get a full state snapshot (used to resync the state mirror)"""
+        return await self._request(
+            "state", {}, self._http_get_state, retry_over_http=True
+        )
+    
+    async def get_inventory_snapshot(self) -> Dict[str, Any]:
+        """Get a full inventory snapshot (used to resync the inventory mirror)"""
+        return await self._request(
+            "inventory", {}, self._http_get_inventory, retry_over_http=True
+        )
+    
+    async def get_inventory(self, wait: float = 0.5) -> Dict[str, Any]:
+        """
+        获取背包（结构同 viewInventory 动作的结果）
+        
+        背包镜像已同步且包含最近一次动作的影响时直接读取本地数据；
+        镜像落后时最多等待 wait 秒，仍未追上则向 Bot 服务请求
+        """
+        if settings.inventory_mirror_enabled and self.inventory.synced:
+            target = self._min_inventory_version
+            if self.inventory.version < target:
+                await self.wait_for_event(
+                    "inventory",
+                    filter_func=lambda e: e.get("version", 0) >= target,
+                    timeout=wait
+                )
+            if self.inventory.synced and self.inventory.version >= target:
+                self._inventory_stats["local"] += 1
+                return self.inventory.to_view_result()
+        
+        self._inventory_stats["remote"] += 1
+        return await self.execute_action("viewInventory")
     
     async def execute_action(
         self, 
@@ -67,21 +222,359 @@ class BotClient:
             "action": action,
             "parameters": parameters or {}
         }
+        result = await self._request(
+            "action", payload, lambda: self._http_execute_action(payload)
+        )
+        self._note_inventory_version(result)
+        return result
+    
+    def _note_inventory_version(self, result: Any):
+        """记录动作完成时 Bot 端的背包版本"""
+        if isinstance(result, dict):
+            version = result.get("inventoryVersion")
+            if isinstance(version, int) and version > self._min_inventory_version:
+                self._min_inventory_version = version
+    
+    async def execute_actions(
+        self,
+        actions: List[Dict[str, Any]],
+        stop_on_error: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        批量执行动作，一次往返完成多个调用
+
+        Args:
+            actions: 有序动作列表，每项为 {"action": 名称, "parameters": 参数}
+            stop_on_error: 某个动作失败后跳过后续动作
+
+        Returns:
+            与 actions 一一对应的结果列表
+        """
+        results: List[Dict[str, Any]] = []
+
+        # 超过单批上限时分段发送，保持顺序
+        for start in range(0, len(actions), MAX_BATCH_SIZE):
+            chunk = actions[start:start + MAX_BATCH_SIZE]
+            payload = {
+                "actions": [
+                    {"action": a["action"], "parameters": a.get("parameters") or {}}
+                    for a in chunk
+                ],
+                "stopOnError": stop_on_error
+            }
+            response = await self._request(
+                "actions", payload, lambda: self._http_execute_actions(payload)
+            )
+            self._note_inventory_version(response)
+            chunk_results = response.get("results", [])
+            results.extend(chunk_results)
+
+            if stop_on_error and any(not r.get("success") for r in chunk_results):
+                skipped = len(actions) - len(results)
+                results.extend(
+                    {"success": False, "skipped": True, "message": "Skipped after earlier failure"}
+                    for _ in range(skipped)
+                )
+                break
+
+        return results
+    
+    async def _request(
+        self,
+        method: str,
+        params: Dict[str, Any],
+        http_fallback: Callable,
+        retry_over_http: bool = False
+    ) -> Dict[str, Any]:
+        """
+        发送请求，只读请求先经过合并层
+        
+        Args:
+            method: 请求方法（status / state / observation / action / actions）
+            params: 请求参数
+            http_fallback: 返回 HTTP 请求协程的函数
+            retry_over_http: 连接在请求途中断开时是否改走 HTTP 重试，
+                             只用于只读请求，避免动作被重复执行
+        """
+        if method == "action":
+            name = params.get("action")
+        else:
+            name = REQUEST_METADATA_NAMES.get(method, method)
+        meta = get_action_metadata(name)
+        
+        if not settings.bot_coalesce_reads or not meta["readOnly"]:
+            if method not in ("action", "actions"):
+                return await self._send(name, meta, method, params, http_fallback, retry_over_http)
+            # 可能修改了世界或背包：动作开始和结束时都作废已有的只读结果
+            self._mutation_changed(1)
+            try:
+                return await self._send(name, meta, method, params, http_fallback, retry_over_http)
+            finally:
+                self._mutation_changed(-1)
+                self._invalidate_world(method, params)
+        
+        self._coalesce_stats["requests"] += 1
+        key = f"{method}:{json.dumps(params, sort_keys=True)}"
+        
+        # freshness 时间内的结果直接复用
+        recent = self._recent_results.get(key)
+        if recent and time.monotonic() - recent[0] <= meta["freshness"]:
+            self._coalesce_stats["fresh_hits"] += 1
+            return copy.deepcopy(recent[1])
+        
+        # 相同请求正在进行：等待同一个结果
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self._coalesce_stats["shared"] += 1
+        else:
+            flight = asyncio.ensure_future(
+                self._send(name, meta, method, params, http_fallback, retry_over_http)
+            )
+            self._inflight[key] = flight
+            gen = self._mutation_gen
+            flight.add_done_callback(
+                lambda f: self._finish_flight(key, f, meta["freshness"], gen)
+            )
+        
+        # shield：某个调用方被取消时不影响其他共享者；结果深拷贝，避免调用方互相修改
+        return copy.deepcopy(await asyncio.shield(flight))
+    
+    def _mutation_changed(self, delta: int):
+        """
+        动作开始（delta=1）或结束（delta=-1）
+        
+        作废 freshness 内的结果，并让之后的相同读取发起新请求，不再共享之前进行中的请求
+        """
+        self._mutations += delta
+        self._mutation_gen += 1
+        self._recent_results.clear()
+        self._inflight.clear()
+    
+    def _invalidate_world(self, method: str, params: Dict[str, Any]):
+        """
+        会改变方块的动作（actions.json 中 mutatesWorld）返回后让方块缓存失效
+        
+        走 HTTP 或不用 WebSocket RPC 时，动作响应可能先于 blockUpdate 事件到达。
+        参数带 x/y/z 时只失效该位置；位置不确定（如 collectBlock 挖最近的方块）时清空缓存
+        """
+        calls = (params.get("actions") or []) if method == "actions" else [params]
+        for call in calls:
+            if not get_action_metadata(call.get("action"))["mutatesWorld"]:
+                continue
+            p = call.get("parameters") or {}
+            if all(isinstance(p.get(k), (int, float)) for k in ("x", "y", "z")):
+                self.world.invalidate(math.floor(p["x"]), math.floor(p["y"]), math.floor(p["z"]))
+            else:
+                self.world.clear()
+                return
+    
+    def _finish_flight(self, key: str, flight: asyncio.Future, freshness: float, gen: int):
+        """
+        合并请求完成：移除进行中记录，按需保留结果
+        
+        请求期间有动作开始或结束、或仍有动作在执行时，结果可能反映动作前/中途的状态，不保留
+        """
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        if flight.cancelled():
+            return
+        if flight.exception() is not None:
+            return
+        if gen != self._mutation_gen or self._mutations > 0:
+            return
+        if freshness > 0:
+            now = time.monotonic()
+            if len(self._recent_results) >= 256:
+                # 清理过期结果（复用窗口都很短，保留 60 秒足够）
+                self._recent_results = {
+                    k: v for k, v in self._recent_results.items() if now - v[0] <= 60
+                }
+            self._recent_results[key] = (now, flight.result())
+    
+    def get_timeout(self, name: str, meta: Optional[Dict[str, Any]] = None) -> float:
+        """
+        计算动作的超时时间
+
+        actions.json 中配置了 timeout 时直接使用；只读请求在样本足够时取
+        p99 延迟 x bot_timeout_multiplier，并限制在 [bot_timeout_min, bot_timeout_max]。
+        其余动作（耗时随情况变化，超时放弃后 Bot 仍在执行）使用 bot_timeout_max
+        """
+        meta = meta or get_action_metadata(name)
+        if meta.get("timeout"):
+            return meta["timeout"]
+        if not meta["readOnly"]:
+            return settings.bot_timeout_max
+        
+        histogram = self._latency.get(name)
+        if histogram is None or histogram.count < MIN_TIMEOUT_SAMPLES:
+            return settings.bot_timeout_max
+        
+        derived = histogram.percentile(99) * settings.bot_timeout_multiplier
+        return max(settings.bot_timeout_min, min(settings.bot_timeout_max, derived))
+    
+    async def _send(
+        self,
+        name: str,
+        meta: Dict[str, Any],
+        method: str,
+        params: Dict[str, Any],
+        http_fallback: Callable,
+        retry_over_http: bool = False
+    ) -> Dict[str, Any]:
+        """发送单个请求：经过熔断器检查，按动作超时，并记录延迟"""
+        if not self.breaker.allow():
+            raise BotServiceUnavailable(
+                f"Bot service unavailable, retry in {self.breaker.retry_after():.0f}s"
+            )
+        
+        timeout = self.get_timeout(name, meta)
+        histogram = self._latency.setdefault(name, LatencyHistogram())
+        start = time.monotonic()
+        try:
+            with tracer.span(f"bot.{name}", "bot", method=method):
+                result = await asyncio.wait_for(
+                    self._transmit(method, params, http_fallback, retry_over_http),
+                    timeout=timeout
+                )
+        except asyncio.TimeoutError:
+            histogram.timeouts += 1
+            if meta["readOnly"]:
+                self.breaker.record_failure()
+            else:
+                # 动作超时多半是动作本身耗时长（Bot 仍在执行），不说明服务不可用
+                self.breaker.release()
+            raise BotRequestError(f"{name} timed out after {timeout:.1f}s", status=504)
+        except (ConnectionError, OSError, httpx.TransportError):
+            # 连接层面的失败才计入熔断；动作本身返回的错误说明服务是健康的
+            self.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            histogram.record(time.monotonic() - start)
+            self.breaker.record_success()
+            raise
+        
+        histogram.record(time.monotonic() - start)
+        self.breaker.record_success()
+        return result
+    
+    async def _transmit(
+        self,
+        method: str,
+        params: Dict[str, Any],
+        http_fallback: Callable,
+        retry_over_http: bool = False
+    ) -> Dict[str, Any]:
+        """发送请求：WebSocket 可用时走 WebSocket，否则回退到 HTTP"""
+        if settings.bot_ws_rpc:
+            try:
+                return await self._ws_request(method, params)
+            except _SocketUnavailable:
+                pass
+            except ConnectionError:
+                if not retry_over_http:
+                    raise
+        return await http_fallback()
+    
+    async def _ws_request(
+        self,
+        method: str,
+        params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """通过 WebSocket 发送请求并等待对应 ID 的响应"""
+        ws = self.ws_connection
+        if ws is None or not ws.open:
+            raise _SocketUnavailable()
+        
+        request_id = str(next(self._request_ids))
+        future = asyncio.get_event_loop().create_future()
+        self._pending_requests[request_id] = future
+        
+        try:
+            try:
+                await ws.send(self._ws_codec.encode({
+                    "type": "request",
+                    "id": request_id,
+                    "method": method,
+                    "params": params
+                }))
+            except websockets.exceptions.ConnectionClosed:
+                # 尚未发出，可以安全地回退到 HTTP
+                raise _SocketUnavailable()
+            # 超时由 _send 统一控制
+            return await future
+        finally:
+            self._pending_requests.pop(request_id, None)
+    
+    def _resolve_request(self, message: Dict[str, Any]):
+        """处理 WebSocket 响应，唤醒对应的请求"""
+        future = self._pending_requests.get(str(message.get("id")))
+        if future is None or future.done():
+            return
+        if "error" in message:
+            future.set_exception(
+                BotRequestError(message["error"], message.get("status", 500))
+            )
+        else:
+            future.set_result(message.get("result"))
+    
+    def _fail_pending_requests(self):
+        """连接断开时，让所有等待中的请求失败"""
+        for future in self._pending_requests.values():
+            if not future.done():
+                future.set_exception(ConnectionError("WebSocket connection lost"))
+        self._pending_requests.clear()
+    
+    # ========== HTTP API Methods ==========
+    
+    async def _http_get_status(self) -> Dict[str, Any]:
+        response = await self.http_client.get("/status")
+        response.raise_for_status()
+        return self._decode_response(response)
+    
+    async def _http_get_state(self) -> Dict[str, Any]:
+        response = await self.http_client.get("/state")
+        response.raise_for_status()
+        return self._decode_response(response)
+    
+    async def _http_get_inventory(self) -> Dict[str, Any]:
+        response = await self.http_client.get("/inventory")
+        response.raise_for_status()
+        return self._decode_response(response)
+    
+    async def _http_get_observation(self) -> Dict[str, Any]:
+        response = await self.http_client.get("/observation")
+        response.raise_for_status()
+        return self._decode_response(response)
+    
+    async def _http_execute_action(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         response = await self.http_client.post("/action", json=payload)
         response.raise_for_status()
-        return response.json()
+        return self._decode_response(response)
+    
+    async def _http_execute_actions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self.http_client.post("/actions", json=payload)
+        response.raise_for_status()
+        return self._decode_response(response)
+    
+    def _decode_response(self, response: httpx.Response) -> Any:
+        """按响应的 Content-Type 解码（MessagePack 或 JSON）"""
+        codec = codec_for_content_type(response.headers.get("content-type"))
+        return codec.decode(response.content)
     
     async def connect(self) -> Dict[str, Any]:
         """Tell bot to connect to Minecraft server"""
         response = await self.http_client.post("/connect")
         response.raise_for_status()
-        return response.json()
+        return self._decode_response(response)
     
     async def disconnect(self) -> Dict[str, Any]:
         """Tell bot to disconnect from Minecraft server"""
         response = await self.http_client.post("/disconnect")
         response.raise_for_status()
-        return response.json()
+        return self._decode_response(response)
     
     # ========== WebSocket Methods ==========
     
@@ -94,56 +587,257 @@ class BotClient:
         if handler in self.event_handlers:
             self.event_handlers.remove(handler)
     
+    def add_state_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """
+        注册状态镜像监听器：每个 state 事件合并进镜像后同步调用（在读取循环中执行，不能阻塞）
+        """
+        self._state_listeners.append(listener)
+    
+    def remove_state_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """移除状态镜像监听器"""
+        if listener in self._state_listeners:
+            self._state_listeners.remove(listener)
+    
+    def _notify_state_listeners(self, event: Dict[str, Any]):
+        for listener in list(self._state_listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"[BotClient] State listener error: {e}")
+    
     async def start_ws_listener(self):
         """Start listening for WebSocket events"""
+        self._dispatch_task = asyncio.create_task(self._dispatch_loop())
         self._ws_task = asyncio.create_task(self._ws_loop())
     
     async def _ws_loop(self):
         """WebSocket event loop"""
+        attempt = 0
         while True:
             try:
-                async with websockets.connect(self.ws_url) as ws:
+                subprotocols = [codec.subprotocol for codec in self._codecs]
+                query = None
+                if self._event_epoch:
+                    query = {"epoch": self._event_epoch, "since": self._event_seq}
+                async with self.transport.connect_ws(subprotocols, query) as ws:
+                    # 服务端不支持子协议时（旧版本）按 JSON 处理
+                    self._ws_codec = codec_for_subprotocol(ws.subprotocol)
                     self.ws_connection = ws
-                    print(f"[BotClient] WebSocket connected to {self.ws_url}")
+                    attempt = 0
+                    print(f"[BotClient] WebSocket connected to {self.transport.describe()} ({self._ws_codec.name})")
                     
-                    async for message in ws:
-                        try:
-                            event = json.loads(message)
-                            await self._handle_event(event)
-                        except json.JSONDecodeError:
-                            print(f"[BotClient] Invalid JSON: {message}")
+                    try:
+                        async for message in ws:
+                            try:
+                                data = self._ws_codec.decode(message)
+                            except Exception:
+                                print(f"[BotClient] Invalid message: {message[:200]!r}")
+                                continue
                             
+                            message_type = data.get("type")
+                            if message_type == "response":
+                                self._resolve_request(data)
+                            elif message_type == "hello":
+                                self._handle_hello(data)
+                            elif self._accept_event_seq(data):
+                                self._handle_event(data)
+                    finally:
+                        # 连接已断开，等待中的请求不会再收到响应
+                        self.ws_connection = None
+                        self._fail_pending_requests()
+                        # 断线期间的增量要等重连后的快照，镜像先失效
+                        self.state.invalidate()
+                        self.inventory.invalidate()
+                        self.world.clear()
+                    
+                print("[BotClient] WebSocket connection closed, reconnecting...")
             except websockets.exceptions.ConnectionClosed:
                 print("[BotClient] WebSocket connection closed, reconnecting...")
-                await asyncio.sleep(2)
             except Exception as e:
                 print(f"[BotClient] WebSocket error: {e}, reconnecting...")
-                await asyncio.sleep(5)
+                attempt += 1
+            
+            await asyncio.sleep(self._reconnect_delay(attempt))
+    
+    def _reconnect_delay(self, attempt: int) -> float:
+        """
+        指数退避 + 全抖动：首次重连几乎立即进行，连续失败时上限翻倍直到 bot_reconnect_max
+        """
+        cap = min(settings.bot_reconnect_max, settings.bot_reconnect_min * (2 ** attempt))
+        return random.uniform(0, cap)
+    
+    def _handle_hello(self, hello: Dict[str, Any]):
+        """处理连接建立后服务端发送的 hello（是否成功续传）"""
+        self._reconnect_stats["connects"] += 1
+        epoch = hello.get("epoch")
+        
+        if hello.get("resumed"):
+            self._reconnect_stats["resumed"] += 1
+            self._reconnect_stats["replayed"] += hello.get("replayed", 0)
+            if hello.get("replayed"):
+                print(f"[BotClient] Resumed event stream, replaying {hello['replayed']} missed events")
+        else:
+            if self._event_epoch is not None:
+                # 服务重启或断线太久超出重放缓冲区，中间的事件无法补回
+                self._reconnect_stats["gaps"] += 1
+                print("[BotClient] Event stream could not be resumed, missed events are lost")
+            self._event_seq = hello.get("seq", 0)
+        
+        self._event_epoch = epoch
+    
+    def _accept_event_seq(self, event: Dict[str, Any]) -> bool:
+        """
+        按事件序号去重（快照等不带序号的消息总是接受）
+        
+        Returns:
+            是否应处理该事件
+        """
+        seq = event.get("seq")
+        if seq is None:
+            return True
+        if seq <= self._event_seq:
+            self._reconnect_stats["duplicates"] += 1
+            return False
+        self._event_seq = seq
+        return True
     
-    async def _handle_event(self, event: Dict[str, Any]):
+    def _handle_event(self, event: Dict[str, Any]):
         """Handle incoming WebSocket event"""
-        # 首先检查事件等待器
-        await self._check_event_waiters(event)
+        # 首先检查事件等待器（同步完成，不等待任何处理器）
+        self._check_event_waiters(event)
         
-        # 然后调用普通事件处理器
-        for handler in self.event_handlers:
+        # 状态增量只更新本地镜像，不进入分发队列（移动等事件非常频繁）
+        if event.get("type") == "state":
+            if self.state.apply(event):
+                self._schedule_resync()
+            elif self.state.synced:
+                self._notify_state_listeners(event)
+            return
+        
+        # 背包增量同样只更新本地镜像
+        if event.get("type") == "inventory":
+            if self.inventory.apply(event):
+                self._schedule_inventory_resync()
+            return
+        
+        # 方块变化只用于让方块缓存失效，同样不进入分发队列
+        if event.get("type") == "blockUpdate":
+            pos = event.get("position") or {}
+            self.world.invalidate(pos.get("x"), pos.get("y"), pos.get("z"))
+            return
+        if event.get("type") == "chunkUnload":
+            self.world.clear_chunk(event.get("chunkX"), event.get("chunkZ"))
+            return
+        
+        # 然后放入分发队列，由分发任务调用普通事件处理器
+        if not self.event_handlers:
+            return
+        
+        if self._event_queue.full():
+            # 队列已满：丢弃最旧的事件，保证读取循环不被阻塞
+            self._event_queue.get_nowait()
+            self._event_queue.task_done()
+            self._dispatch_stats["dropped"] += 1
+        
+        self._event_queue.put_nowait((time.monotonic(), event))
+        self._dispatch_stats["enqueued"] += 1
+        depth = self._event_queue.qsize()
+        if depth > self._dispatch_stats["max_queue_depth"]:
+            self._dispatch_stats["max_queue_depth"] = depth
+    
+    def _schedule_resync(self):
+        """安排一次状态快照拉取，同一时间只有一个"""
+        if self._resync_task and not self._resync_task.done():
+            return
+        self._resync_task = asyncio.create_task(self._resync_state())
+    
+    async def _resync_state(self):
+        """拉取完整快照，恢复状态镜像"""
+        try:
+            snapshot = await self.get_state_snapshot()
+            self.state.apply(snapshot)
+            print(f"[BotClient] State mirror resynced at seq {self.state.seq}")
+        except Exception as e:
+            print(f"[BotClient] State resync failed: {e}")
+    
+    def _schedule_inventory_resync(self):
+        """安排一次背包快照拉取，同一时间只有一个"""
+        if self._inventory_resync_task and not self._inventory_resync_task.done():
+            return
+        self._inventory_resync_task = asyncio.create_task(self._resync_inventory())
+    
+    async def _resync_inventory(self):
+        """拉取完整背包快照，恢复背包镜像"""
+        try:
+            snapshot = await self.get_inventory_snapshot()
+            self.inventory.apply(snapshot)
+            print(f"[BotClient] Inventory mirror resynced at version {self.inventory.version}")
+        except Exception as e:
+            print(f"[BotClient] Inventory resync failed: {e}")
+    
+    async def _dispatch_loop(self):
+        """事件分发循环：按顺序把事件交给普通事件处理器"""
+        while True:
+            enqueued_at, event = await self._event_queue.get()
             try:
-                if asyncio.iscoroutinefunction(handler):
-                    await handler(event)
-                else:
-                    handler(event)
-            except Exception as e:
-                print(f"[BotClient] Event handler error: {e}")
+                for handler in list(self.event_handlers):
+                    try:
+                        if asyncio.iscoroutinefunction(handler):
+                            await handler(event)
+                        else:
+                            handler(event)
+                    except Exception as e:
+                        self._dispatch_stats["handler_errors"] += 1
+                        print(f"[BotClient] Event handler error: {e}")
+            finally:
+                self._event_queue.task_done()
+            
+            # 记录从入队到处理完成的延迟
+            latency_ms = (time.monotonic() - enqueued_at) * 1000
+            self._dispatch_stats["dispatched"] += 1
+            if latency_ms > self._dispatch_stats["max_latency_ms"]:
+                self._dispatch_stats["max_latency_ms"] = round(latency_ms, 1)
+    
+    def get_dispatch_stats(self) -> Dict[str, Any]:
+        """获取事件分发队列的统计信息（用于观察背压情况）"""
+        return {
+            **self._dispatch_stats,
+            "queue_depth": self._event_queue.qsize(),
+            "queue_size": self._event_queue.maxsize,
+            "waiters": sum(len(w) for w in self._event_waiters.values())
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取客户端统计信息"""
+        return {
+            "transport": self.transport.describe(),
+            "ws_codec": self._ws_codec.name,
+            "ws_connected": self.ws_connection is not None,
+            "events": {"epoch": self._event_epoch, "seq": self._event_seq, **self._reconnect_stats},
+            "pending_requests": len(self._pending_requests),
+            "state": self.state.get_stats(),
+            "inventory": {**self.inventory.get_stats(), **self._inventory_stats},
+            "world_cache": self.world.get_stats(),
+            "coalescing": {**self._coalesce_stats, "inflight": len(self._inflight)},
+            "breaker": self.breaker.get_stats(),
+            "latency": {
+                name: {**h.to_dict(), "timeout_s": round(self.get_timeout(name), 1)}
+                for name, h in self._latency.items()
+            },
+            "dispatch": self.get_dispatch_stats()
+        }
     
-    async def _check_event_waiters(self, event: Dict[str, Any]):
+    def _check_event_waiters(self, event: Dict[str, Any]):
         """检查并触发匹配的事件等待器"""
-        event_type = event.get("type")
+        waiters = self._event_waiters.get(event.get("type"))
+        if not waiters:
+            return
         
-        # 遍历所有等待器
-        waiters_to_remove = []
-        for waiter in self._event_waiters:
-            # 检查事件类型是否匹配
-            if waiter["event_type"] != event_type:
+        # 只遍历该事件类型的等待器
+        for waiter_id, waiter in list(waiters.items()):
+            future = waiter["future"]
+            if future.done():
+                del waiters[waiter_id]
                 continue
             
             # 如果有过滤器，检查是否匹配
@@ -156,13 +850,21 @@ class BotClient:
                     print(f"[BotClient] Event filter error: {e}")
                     continue
             
-            # 匹配成功，设置结果
-            waiter["future"].set_result(event)
-            waiters_to_remove.append(waiter)
+            # 匹配成功，设置结果并移除等待器
+            future.set_result(event)
+            del waiters[waiter_id]
         
-        # 移除已触发的等待器
-        for waiter in waiters_to_remove:
-            self._event_waiters.remove(waiter)
+        if not waiters:
+            self._event_waiters.pop(event.get("type"), None)
+    
+    def _remove_waiter(self, event_type: str, waiter_id: int):
+        """按 ID 移除等待器（O(1)）"""
+        waiters = self._event_waiters.get(event_type)
+        if waiters is None:
+            return
+        waiters.pop(waiter_id, None)
+        if not waiters:
+            self._event_waiters.pop(event_type, None)
     
     async def wait_for_event(
         self,
@@ -190,29 +892,27 @@ class BotClient:
             )
         """
         future = asyncio.get_event_loop().create_future()
+        waiter_id = next(self._waiter_ids)
         
-        waiter = {
-            "event_type": event_type,
+        self._event_waiters.setdefault(event_type, {})[waiter_id] = {
             "filter": filter_func,
             "future": future
         }
         
-        self._event_waiters.append(waiter)
-        
         try:
-            result = await asyncio.wait_for(future, timeout=timeout)
-            return result
+            return await asyncio.wait_for(future, timeout=timeout)
         except asyncio.TimeoutError:
-            # 超时，移除等待器
-            if waiter in self._event_waiters:
-                self._event_waiters.remove(waiter)
             return None
+        finally:
+            # 超时或被取消时移除等待器
+            self._remove_waiter(event_type, waiter_id)
     
     def cancel_all_waiters(self):
         """取消所有事件等待器"""
-        for waiter in self._event_waiters:
-            if not waiter["future"].done():
-                waiter["future"].cancel()
+        for waiters in self._event_waiters.values():
+            for waiter in waiters.values():
+                if not waiter["future"].done():
+                    waiter["future"].cancel()
         self._event_waiters.clear()
 
 
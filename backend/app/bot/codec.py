@@ -0,0 +1,105 @@
+import json
+from typing import Any, List, Optional, Union
+
+# 可选依赖：未安装时回退到标准库 json
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+MSGPACK_TYPE = "application/msgpack"
+JSON_TYPE = "application/json"
+
+
+class Codec:
+    """Bot 服务消息编解码器"""
+
+    name: str = ""
+    subprotocol: str = ""
+    content_type: str = ""
+
+    def encode(self, obj: Any) -> Union[bytes, str]:
+        raise NotImplementedError
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """JSON（安装了 orjson 时使用 orjson，快数倍）"""
+
+    name = "json"
+    subprotocol = "llm-mc.json"
+    content_type = JSON_TYPE
+
+    def encode(self, obj: Any) -> str:
+        if orjson is not None:
+            return orjson.dumps(obj).decode("utf-8")
+        return json.dumps(obj)
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """MessagePack 二进制格式"""
+
+    name = "msgpack"
+    subprotocol = "llm-mc.msgpack"
+    content_type = MSGPACK_TYPE
+
+    def encode(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        if isinstance(data, str):
+            # 对端没有切换到二进制（例如回退为文本帧）
+            return JSON_CODEC.decode(data)
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+JSON_CODEC = JsonCodec()
+MSGPACK_CODEC = MsgpackCodec() if msgpack is not None else None
+
+
+def available_codecs(preference: str = "auto") -> List[Codec]:
+    """
+    按优先级返回可用的编解码器
+
+    Args:
+        preference: auto（有 msgpack 就用）/ msgpack / json
+    """
+    if preference == "json" or MSGPACK_CODEC is None:
+        return [JSON_CODEC]
+    return [MSGPACK_CODEC, JSON_CODEC]
+
+
+def codec_for_subprotocol(subprotocol: Optional[str]) -> Codec:
+    """根据 WebSocket 握手协商出的子协议选择编解码器（未协商时为 JSON）"""
+    if MSGPACK_CODEC is not None and subprotocol == MSGPACK_CODEC.subprotocol:
+        return MSGPACK_CODEC
+    return JSON_CODEC
+
+
+def codec_for_content_type(content_type: Optional[str]) -> Codec:
+    """根据 HTTP 响应的 Content-Type 选择编解码器"""
+    if MSGPACK_CODEC is not None and content_type and content_type.startswith(MSGPACK_TYPE):
+        return MSGPACK_CODEC
+    return JSON_CODEC
+
+
+def accept_header(codecs: List[Codec]) -> str:
+    """生成 HTTP Accept 头，靠前的格式优先"""
+    parts = []
+    for i, codec in enumerate(codecs):
+        q = round(1.0 - i * 0.1, 1)
+        parts.append(codec.content_type if q == 1.0 else f"{codec.content_type};q={q}")
+    return ", ".join(parts)
@@ -0,0 +1,141 @@
+import time
+from typing import Dict, Any, List, Optional
+
+
+# 延迟直方图的桶边界（秒）：5ms 起每档 x1.5，覆盖到约 10 分钟
+_BUCKET_BOUNDS: List[float] = []
+_bound = 0.005
+while _bound < 600:
+    _BUCKET_BOUNDS.append(round(_bound, 4))
+    _bound *= 1.5
+_BUCKET_BOUNDS.append(float("inf"))
+
+
+class LatencyHistogram:
+    """
+    单个动作的延迟直方图
+
+    使用固定的对数分桶，内存占用与样本数无关；分位数取所在桶的上界（偏保守）
+    """
+
+    def __init__(self):
+        self.counts = [0] * len(_BUCKET_BOUNDS)
+        self.count = 0
+        self.timeouts = 0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        """记录一次完成的调用"""
+        for i, bound in enumerate(_BUCKET_BOUNDS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        估算分位数
+
+        Args:
+            p: 0-100
+
+        Returns:
+            秒数；没有样本时返回 None
+        """
+        if self.count == 0:
+            return None
+        target = self.count * p / 100
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target and c:
+                # 最后一个桶没有上界，用观测到的最大值
+                return min(_BUCKET_BOUNDS[i], self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+        return {
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "max_ms": ms(self.max) if self.count else None
+        }
+
+
+class CircuitBreaker:
+    """
+    Bot 服务熔断器
+
+    - closed: 正常放行，连续失败达到阈值后打开
+    - open: 直接拒绝请求，冷却时间过后进入 half_open
+    - half_open: 只放行一个试探请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 10.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.open_count = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """当前是否允许发出请求"""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+            self._probe_in_flight = False
+        # half_open：同一时间只允许一个试探请求
+        if self._probe_in_flight:
+            self.rejected += 1
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != "closed":
+            print("[BotClient] Circuit breaker closed, bot service recovered")
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release(self):
+        """请求被取消、未得出结论时释放试探名额"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                self.open_count += 1
+                print(f"[BotClient] Circuit breaker opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def retry_after(self) -> float:
+        """距离允许试探还有多少秒"""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "open_count": self.open_count,
+            "rejected": self.rejected,
+            "retry_after_s": round(self.retry_after(), 1)
+        }
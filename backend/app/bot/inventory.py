@@ -0,0 +1,101 @@
+from typing import Dict, Any, Optional, List
+
+
+class InventoryMirror:
+    """
+    背包的本地镜像
+
+    由 Bot 服务推送的 inventory 事件维护：
+    - full=True 的快照直接替换全部槽位
+    - 增量事件只包含变化的槽位（值为 null 表示清空），version 必须连续，
+      发现缺号时标记为未同步，等待重新拉取快照
+    """
+
+    def __init__(self):
+        self.version: int = 0
+        self.synced: bool = False
+        self.slots: Dict[int, Dict[str, Any]] = {}
+        self.resyncs: int = 0
+
+    def apply(self, event: Dict[str, Any]) -> bool:
+        """
+        应用一个 inventory 事件
+
+        Returns:
+            是否需要重新同步
+        """
+        version = event.get("version", 0)
+        slots = event.get("slots") or {}
+
+        if event.get("full"):
+            self.slots = {int(slot): item for slot, item in slots.items() if item}
+            self.version = version
+            self.synced = True
+            return False
+
+        if not self.synced:
+            return True
+
+        if version <= self.version:
+            return False
+
+        if version != self.version + 1:
+            self.synced = False
+            self.resyncs += 1
+            return True
+
+        for slot, item in slots.items():
+            if item:
+                self.slots[int(slot)] = item
+            else:
+                self.slots.pop(int(slot), None)
+        self.version = version
+        return False
+
+    def invalidate(self):
+        """标记镜像失效（如 WebSocket 断开）"""
+        self.synced = False
+
+    def items(self) -> List[Dict[str, Any]]:
+        """按槽位顺序返回物品列表（结构同 viewInventory 的 inventory 字段）"""
+        return [
+            {
+                "name": item["name"],
+                "displayName": item.get("displayName", item["name"]),
+                "count": item["count"],
+                "slot": slot
+            }
+            for slot, item in sorted(self.slots.items())
+        ]
+
+    def count(self, name: str) -> int:
+        """统计某种物品的总数"""
+        return sum(item["count"] for item in self.slots.values() if item["name"] == name)
+
+    def best(self, priority: List[str]) -> Optional[str]:
+        """按优先级返回背包中第一个拥有的物品名，都没有时返回 None"""
+        owned = {item["name"] for item in self.slots.values()}
+        for name in priority:
+            if name in owned:
+                return name
+        return None
+
+    def to_view_result(self) -> Dict[str, Any]:
+        """构造与 viewInventory 动作相同结构的结果"""
+        items = self.items()
+        if not items:
+            return {"success": True, "message": "Inventory is empty", "inventory": []}
+        items_text = ", ".join(f"{i['name']} x{i['count']}" for i in items)
+        return {
+            "success": True,
+            "message": f"Inventory ({len(items)} items): {items_text}",
+            "inventory": items
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "synced": self.synced,
+            "version": self.version,
+            "resyncs": self.resyncs,
+            "slots": len(self.slots)
+        }
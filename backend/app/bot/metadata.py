@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+from typing import Dict, Any
+
+
+# 与 prompts 共用同一个动作配置文件
+ACTIONS_CONFIG_FILE = Path(__file__).parent.parent.parent / "actions.json"
+
+# 缓存元数据
+_metadata_cache: Dict[str, Dict[str, Any]] = {}
+_metadata_cache_mtime: float = 0
+
+
+def load_action_metadata() -> Dict[str, Dict[str, Any]]:
+    """
+    从 actions.json 加载动作调用元数据（文件更新时自动重新加载）
+
+    支持的字段：
+        readOnly: 只读动作，并发的相同请求会合并为一次调用
+        freshness: 只读结果的复用时间（秒），默认 0 表示只合并进行中的请求
+        timeout: 固定超时（秒），不配置时根据观测到的 p99 延迟自动计算
+        cacheable: 为 false 时包含该动作的 LLM 决策不进入决策缓存（依赖坐标或不可重复执行的动作）
+        mutatesWorld: 会改变方块的动作，返回后让本地方块缓存失效（参数带 x/y/z 时只失效该位置）
+
+    Returns:
+        {动作名: {"readOnly": bool, "freshness": float, "timeout": float | None, "cacheable": bool,
+                  "mutatesWorld": bool}}
+    """
+    global _metadata_cache, _metadata_cache_mtime
+
+    if not ACTIONS_CONFIG_FILE.exists():
+        return {}
+
+    current_mtime = ACTIONS_CONFIG_FILE.stat().st_mtime
+    if current_mtime == _metadata_cache_mtime:
+        return _metadata_cache
+
+    try:
+        with open(ACTIONS_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            actions_dict = json.load(f)
+    except Exception as e:
+        print(f"[metadata] 加载动作配置失败: {e}")
+        return _metadata_cache
+
+    _metadata_cache = {
+        name: {
+            "readOnly": bool(action.get("readOnly", False)),
+            "freshness": float(action.get("freshness", 0)),
+            "timeout": float(action["timeout"]) if action.get("timeout") is not None else None,
+            "cacheable": bool(action.get("cacheable", True)),
+            "mutatesWorld": bool(action.get("mutatesWorld", False))
+        }
+        for name, action in actions_dict.items()
+    }
+    _metadata_cache_mtime = current_mtime
+    return _metadata_cache
+
+
+def get_action_metadata(name: str) -> Dict[str, Any]:
+    """
+    获取单个动作的元数据
+
+    未配置的动作（startSkill、cancelTask 等由 Agent 特殊处理的动作，或不存在的动作）
+    视为非只读、不可缓存：重放缓存的 startSkill 可能重复启动后台任务
+    """
+    return load_action_metadata().get(
+        name, {"readOnly": False, "freshness": 0.0, "timeout": None, "cacheable": False, "mutatesWorld": False}
+    )
@@ -0,0 +1,102 @@
+import time
+from typing import Dict, Any, Optional, List
+
+
+class BotStateMirror:
+    """
+    Bot 状态的本地镜像
+
+    由 Bot 服务通过 WebSocket 推送的 state 事件维护：
+    - full=True 的快照事件直接替换整个状态
+    - 增量事件按 stateSeq 顺序合并，发现缺号时标记为未同步，等待重新拉取快照
+    """
+
+    def __init__(self):
+        self.seq: int = 0
+        self.synced: bool = False
+        self.state: Dict[str, Any] = {}
+        self.updated_at: float = 0.0
+        self.resyncs: int = 0
+
+    def apply(self, event: Dict[str, Any]) -> bool:
+        """
+        应用一个 state 事件
+
+        Args:
+            event: {"type": "state", "stateSeq": 序号, "full": 是否快照, "state": 数据}
+
+        Returns:
+            是否需要重新同步（收到的增量与本地序号不连续）
+        """
+        seq = event.get("stateSeq", 0)
+        data = event.get("state") or {}
+
+        if event.get("full"):
+            self.state = dict(data)
+            self.seq = seq
+            self.synced = True
+            self.updated_at = time.monotonic()
+            return False
+
+        if not self.synced:
+            # 尚未拿到快照，增量无法合并
+            return True
+
+        if seq <= self.seq:
+            # 重复或过期的增量（快照已包含），忽略
+            return False
+
+        if seq != self.seq + 1:
+            # 中间丢了增量，本地状态不可信
+            self.synced = False
+            self.resyncs += 1
+            return True
+
+        self.state.update(data)
+        self.seq = seq
+        self.updated_at = time.monotonic()
+        return False
+
+    def invalidate(self):
+        """标记镜像失效（如 WebSocket 断开），之后读取方应回退到主动请求"""
+        self.synced = False
+
+    @property
+    def connected(self) -> bool:
+        """Bot 是否已连接到 Minecraft 服务器"""
+        return bool(self.state.get("connected"))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.state.get(key, default)
+
+    def to_observation(self, inventory: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        转换为与 /observation 相同结构的观察数据
+
+        Args:
+            inventory: 背包物品列表（由背包镜像提供）
+
+        Returns:
+            观察字典，chatMessages / events 为空，由调用方补充
+        """
+        return {
+            "timestamp": int(time.time() * 1000),
+            "position": self.state.get("position"),
+            "health": self.state.get("health"),
+            "nearbyEntities": list(self.state.get("nearbyEntities") or []),
+            "inventory": list(inventory or []),
+            "chatMessages": [],
+            "events": [],
+            "time": self.state.get("time"),
+            "weather": self.state.get("weather"),
+            "fluids": self.state.get("fluids")
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取镜像统计信息"""
+        return {
+            "synced": self.synced,
+            "seq": self.seq,
+            "resyncs": self.resyncs,
+            "age_s": round(time.monotonic() - self.updated_at, 2) if self.updated_at else None
+        }
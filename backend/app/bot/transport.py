@@ -0,0 +1,137 @@
+from typing import Optional, List, Dict, Any
+from urllib.parse import urlparse, unquote, urlencode
+
+import httpx
+import websockets
+
+
+# Unix 套接字地址前缀，例如 unix:///run/llm-mc/bot.sock
+UNIX_SCHEME = "unix://"
+
+
+class Transport:
+    """
+    Bot 服务的传输层
+
+    BotClient 通过它创建 HTTP 客户端和 WebSocket 连接，不关心底层是 TCP、
+    Unix 套接字还是测试用的进程内替身
+    """
+
+    def create_http_client(self, timeout: httpx.Timeout) -> httpx.AsyncClient:
+        raise NotImplementedError
+
+    def connect_ws(
+        self,
+        subprotocols: Optional[List[str]] = None,
+        query: Optional[Dict[str, Any]] = None
+    ):
+        """
+        返回可用于 async with 的 WebSocket 连接
+
+        Args:
+            subprotocols: 按优先级排列的子协议
+            query: 附加到连接地址的查询参数（用于断线续传）
+        """
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        raise NotImplementedError
+
+
+class TcpTransport(Transport):
+    """通过 TCP 访问 Bot 服务（默认）"""
+
+    def __init__(self, base_url: str, ws_url: str):
+        self.base_url = base_url
+        self.ws_url = ws_url
+
+    def create_http_client(self, timeout: httpx.Timeout) -> httpx.AsyncClient:
+        return httpx.AsyncClient(base_url=self.base_url, timeout=timeout)
+
+    def connect_ws(
+        self,
+        subprotocols: Optional[List[str]] = None,
+        query: Optional[Dict[str, Any]] = None
+    ):
+        return websockets.connect(with_query(self.ws_url, query), subprotocols=subprotocols)
+
+    def describe(self) -> str:
+        return self.ws_url
+
+
+class UnixSocketTransport(Transport):
+    """
+    通过 Unix 域套接字访问同一台机器上的 Bot 服务
+
+    HTTP 和 WebSocket 共用同一个套接字文件，省去回环 TCP 的开销
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def create_http_client(self, timeout: httpx.Timeout) -> httpx.AsyncClient:
+        # 主机名只用于 Host 头，实际连接走套接字
+        return httpx.AsyncClient(
+            base_url="http://localhost",
+            transport=httpx.AsyncHTTPTransport(uds=self.path),
+            timeout=timeout
+        )
+
+    def connect_ws(
+        self,
+        subprotocols: Optional[List[str]] = None,
+        query: Optional[Dict[str, Any]] = None
+    ):
+        return websockets.unix_connect(
+            self.path, with_query("ws://localhost/ws", query), subprotocols=subprotocols
+        )
+
+    def describe(self) -> str:
+        return f"{UNIX_SCHEME}{self.path}"
+
+
+def with_query(url: str, query: Optional[Dict[str, Any]]) -> str:
+    """在地址后附加查询参数"""
+    if not query:
+        return url
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}{urlencode(query)}"
+
+
+def parse_unix_path(url: str) -> Optional[str]:
+    """
+    解析 unix:// 地址中的套接字路径
+
+    Example:
+        parse_unix_path("unix:///run/llm-mc/bot.sock")  # -> "/run/llm-mc/bot.sock"
+        parse_unix_path("http://localhost:3001")        # -> None
+    """
+    if not url.startswith(UNIX_SCHEME):
+        return None
+    parsed = urlparse(url)
+    return unquote(parsed.netloc + parsed.path)
+
+
+def default_ws_url(service_url: str) -> str:
+    """
+    由 HTTP 地址推出 WebSocket 地址
+
+    Example:
+        default_ws_url("http://localhost:3002")  # -> "ws://localhost:3002/ws"
+    """
+    parsed = urlparse(service_url)
+    scheme = "wss" if parsed.scheme == "https" else "ws"
+    return f"{scheme}://{parsed.netloc}/ws"
+
+
+def create_transport(service_url: str, ws_url: Optional[str] = None) -> Transport:
+    """
+    根据 bot_service_url 选择传输方式
+
+    - http(s)://host:port  -> TcpTransport（WebSocket 使用 ws_url，未指定时由地址推出）
+    - unix:///path/to.sock -> UnixSocketTransport（HTTP 与 WebSocket 都走该套接字）
+    """
+    path = parse_unix_path(service_url)
+    if path:
+        return UnixSocketTransport(path)
+    return TcpTransport(service_url, ws_url or default_ws_url(service_url))
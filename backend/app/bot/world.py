@@ -0,0 +1,322 @@
+import base64
+import sys
+import time
+from array import array
+from typing import Dict, Any, Optional, List, Tuple, Iterator
+
+
+# 区块段边长（与 Minecraft chunk section 一致）
+SECTION_SIZE = 16
+SECTION_VOLUME = SECTION_SIZE ** 3
+
+# 未知方块 / 未知亮度
+UNKNOWN = 0
+UNKNOWN_LIGHT = -1
+
+# getBlockAt 结果中随方块类型固定的字段
+BLOCK_INFO_FIELDS = ("displayName", "type", "hardness", "diggable", "transparent")
+
+
+class _Section:
+    """一个 16x16x16 区块段的缓存数据，按 (y, z, x) 顺序平铺在紧凑数组中"""
+
+    __slots__ = ("blocks", "light", "seen_at", "known")
+
+    def __init__(self):
+        self.blocks = array("H", bytes(2 * SECTION_VOLUME))   # 调色板索引，0 表示未知
+        self.light = array("b", [UNKNOWN_LIGHT]) * SECTION_VOLUME
+        self.seen_at = array("d", bytes(8 * SECTION_VOLUME))  # 记录时间（monotonic）
+        self.known = 0
+
+
+def _split(x: int, y: int, z: int) -> Tuple[Tuple[int, int, int], int]:
+    """世界坐标 -> (区块段坐标, 段内索引)"""
+    key = (x >> 4, y >> 4, z >> 4)
+    index = ((y & 15) << 8) | ((z & 15) << 4) | (x & 15)
+    return key, index
+
+
+class WorldCache:
+    """
+    本地方块缓存
+
+    记录通过 getBlockAt / findBlock / scanBlocks / getRegion 看到的方块，按区块段存储在紧凑数组中。
+    方块名通过调色板映射为 uint16 索引；同名方块的固定属性（硬度、是否可挖等）只存一份。
+    Bot 服务推送的 blockUpdate / chunkUnload 事件会使对应条目失效。
+    """
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._sections: Dict[Tuple[int, int, int], _Section] = {}
+        # 调色板：索引 0 保留为未知
+        self._palette: List[str] = [""]
+        self._palette_index: Dict[str, int] = {}
+        # 方块名 -> 固定属性（从 getBlockAt 结果中学习）
+        self._block_info: Dict[str, Dict[str, Any]] = {}
+        self._stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "invalidations": 0
+        }
+
+    # ========== 读取 ==========
+
+    def get(self, x: int, y: int, z: int) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的方块
+
+        Returns:
+            与 getBlockAt 结果中 block 字段结构相同的字典；未缓存、已过期或
+            该方块类型的属性尚未学习到时返回 None
+        """
+        key, index = _split(x, y, z)
+        section = self._sections.get(key)
+        if section is None or section.blocks[index] == UNKNOWN:
+            self._stats["misses"] += 1
+            return None
+
+        if time.monotonic() - section.seen_at[index] > self.ttl:
+            self._stats["misses"] += 1
+            return None
+
+        name = self._palette[section.blocks[index]]
+        info = self._block_info.get(name)
+        if info is None:
+            # 只知道名字（来自 findBlock / scanBlocks），无法构造完整结果
+            self._stats["misses"] += 1
+            return None
+
+        self._stats["hits"] += 1
+        light = section.light[index]
+        return {
+            "name": name,
+            **info,
+            "light": None if light == UNKNOWN_LIGHT else light,
+            "x": x,
+            "y": y,
+            "z": z
+        }
+
+    # ========== 写入 ==========
+
+    def put_block(self, block: Dict[str, Any]):
+        """记录一个 getBlockAt 结果中的 block 字段"""
+        name = block.get("name")
+        if not name:
+            return
+        self._block_info[name] = {k: block.get(k) for k in BLOCK_INFO_FIELDS}
+        light = block.get("light")
+        self._store(block["x"], block["y"], block["z"], name,
+                    light if isinstance(light, int) else UNKNOWN_LIGHT)
+
+    def put_name(self, x: int, y: int, z: int, name: str):
+        """只记录方块名（findBlock / scanBlocks 的结果不包含其他属性）"""
+        self._store(x, y, z, name, UNKNOWN_LIGHT)
+
+    def put_region(self, region: "BlockRegion"):
+        """
+        批量记录 getRegion 的结果
+
+        按区块段逐行整段写入数组，不再逐个方块构造字典（32x32x32 的区域约快十倍）。
+        区域中未加载的方块不覆盖已有缓存。
+        """
+        # 区域调色板 -> 缓存调色板索引，未加载的条目映射为 UNKNOWN
+        mapping = []
+        for entry in region.palette:
+            name = entry.get("name")
+            if name:
+                self._block_info[name] = {k: entry.get(k) for k in BLOCK_INFO_FIELDS}
+                mapping.append(self._palette_id(name))
+            else:
+                mapping.append(UNKNOWN)
+
+        ox, oy, oz = region.origin
+        sx, sy, sz = region.size
+        indices = region._indices
+        now = time.monotonic()
+        stores = 0
+        i = 0
+        for y in range(oy, oy + sy):
+            for z in range(oz, oz + sz):
+                row = [mapping[p] for p in indices[i:i + sx]]
+                i += sx
+                # 一行沿 x 方向可能跨越多个区块段
+                x = ox
+                while x < ox + sx:
+                    count = min(SECTION_SIZE - (x & 15), ox + sx - x)
+                    key, start = _split(x, y, z)
+                    values = row[x - ox:x - ox + count]
+                    if UNKNOWN in values:
+                        for offset, value in enumerate(values):
+                            if value != UNKNOWN:
+                                self._store(x + offset, y, z, self._palette[value], UNKNOWN_LIGHT)
+                        x += count
+                        continue
+                    x += count
+
+                    section = self._sections.get(key)
+                    if section is None:
+                        section = self._sections[key] = _Section()
+                    end = start + count
+                    section.known += section.blocks[start:end].count(UNKNOWN)
+                    section.blocks[start:end] = array("H", values)
+                    section.light[start:end] = array("b", [UNKNOWN_LIGHT]) * count
+                    section.seen_at[start:end] = array("d", [now]) * count
+                    stores += count
+        self._stats["stores"] += stores
+
+    def _palette_id(self, name: str) -> int:
+        palette_id = self._palette_index.get(name)
+        if palette_id is None:
+            palette_id = len(self._palette)
+            self._palette.append(name)
+            self._palette_index[name] = palette_id
+        return palette_id
+
+    def _store(self, x: int, y: int, z: int, name: str, light: int):
+        palette_id = self._palette_id(name)
+
+        key, index = _split(x, y, z)
+        section = self._sections.get(key)
+        if section is None:
+            section = self._sections[key] = _Section()
+        if section.blocks[index] == UNKNOWN:
+            section.known += 1
+        section.blocks[index] = palette_id
+        section.light[index] = max(-1, min(127, light))
+        section.seen_at[index] = time.monotonic()
+        self._stats["stores"] += 1
+
+    # ========== 失效 ==========
+
+    def invalidate(self, x: int, y: int, z: int):
+        """使单个方块失效"""
+        key, index = _split(x, y, z)
+        section = self._sections.get(key)
+        if section is None or section.blocks[index] == UNKNOWN:
+            return
+        section.blocks[index] = UNKNOWN
+        section.known -= 1
+        self._stats["invalidations"] += 1
+        if section.known == 0:
+            del self._sections[key]
+
+    def clear_chunk(self, chunk_x: int, chunk_z: int):
+        """区块卸载时清除整列区块段"""
+        for key in [k for k in self._sections if k[0] == chunk_x and k[2] == chunk_z]:
+            del self._sections[key]
+
+    def clear(self):
+        """清空缓存（WebSocket 断开期间可能错过更新）"""
+        self._sections.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else None,
+            "sections": len(self._sections),
+            "palette_size": len(self._palette) - 1
+        }
+
+
+class BlockRegion:
+    """
+    getRegion 返回的方块区域
+
+    数据为调色板 + 索引数组（x 变化最快，其次 z，最后 y），按需解码为方块名，
+    供技能在本地判断，不必逐个方块请求 Bot 服务。
+
+    Example:
+        region = (await bot.getRegion(x - 4, y - 4, z - 4, x + 3, y + 3, z + 3))["region"]
+        if region.nameAt(x, y - 1, z) == "air":
+            ...
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        origin = data["origin"]
+        size = data["size"]
+        self.origin: Tuple[int, int, int] = (origin["x"], origin["y"], origin["z"])
+        self.size: Tuple[int, int, int] = (size["x"], size["y"], size["z"])
+        self.palette: List[Dict[str, Any]] = data["palette"]
+
+        raw = base64.b64decode(data["data"])
+        if data.get("encoding") == "uint16le":
+            self._indices = array("H")
+            self._indices.frombytes(raw)
+            if sys.byteorder == "big":
+                self._indices.byteswap()
+        else:
+            self._indices = array("B", raw)
+
+    def contains(self, x: int, y: int, z: int) -> bool:
+        """坐标是否在区域内"""
+        ox, oy, oz = self.origin
+        sx, sy, sz = self.size
+        return 0 <= x - ox < sx and 0 <= y - oy < sy and 0 <= z - oz < sz
+
+    def _entry(self, x: int, y: int, z: int) -> Optional[Dict[str, Any]]:
+        if not self.contains(x, y, z):
+            return None
+        ox, oy, oz = self.origin
+        sx, _, sz = self.size
+        index = ((y - oy) * sz + (z - oz)) * sx + (x - ox)
+        return self.palette[self._indices[index]]
+
+    def nameAt(self, x: int, y: int, z: int) -> Optional[str]:
+        """
+        获取方块名
+
+        Returns:
+            方块名；区域外或方块未加载时返回 None
+        """
+        entry = self._entry(x, y, z)
+        return entry.get("name") if entry else None
+
+    def blockAt(self, x: int, y: int, z: int) -> Optional[Dict[str, Any]]:
+        """
+        获取方块信息（结构同 getBlockAt 的 block 字段，不含 light / distance）
+
+        Returns:
+            方块信息；区域外或方块未加载时返回 None
+        """
+        entry = self._entry(x, y, z)
+        if not entry or entry.get("name") is None:
+            return None
+        return {**entry, "x": x, "y": y, "z": z}
+
+    def blocks(self) -> Iterator[Tuple[int, int, int, str]]:
+        """按存储顺序遍历已加载的方块，产生 (x, y, z, name)"""
+        ox, oy, oz = self.origin
+        sx, sy, sz = self.size
+        names = [entry.get("name") for entry in self.palette]
+        i = 0
+        for y in range(oy, oy + sy):
+            for z in range(oz, oz + sz):
+                for x in range(ox, ox + sx):
+                    name = names[self._indices[i]]
+                    i += 1
+                    if name is not None:
+                        yield x, y, z, name
+
+    def find(self, names: List[str]) -> List[Dict[str, int]]:
+        """
+        查找区域内指定类型的方块
+
+        Args:
+            names: 方块名列表
+
+        Returns:
+            坐标列表 [{"x":..,"y":..,"z":..}, ...]
+        """
+        wanted = set(names)
+        return [{"x": x, "y": y, "z": z} for x, y, z, name in self.blocks() if name in wanted]
+
+    def count(self) -> Dict[str, int]:
+        """统计区域内每种方块的数量"""
+        counts: Dict[str, int] = {}
+        for _, _, _, name in self.blocks():
+            counts[name] = counts.get(name, 0) + 1
+        return counts
@@ -17,22 +17,76 @@ class Settings(BaseSettings):
     llm_model: str = "gpt-4"
     llm_max_tokens: int = 1024  # LLM响应最大token数
     llm_temperature: float = 0.7  # 创造性参数 (0-1)
+    llm_stream: bool = False  # 流式接收 Agent 决策，action / parameters 完整后立即执行，不等 thought（需要接口支持 stream）
+    llm_cost_input: float = 0.0  # llm_model 每百万输入 token 的价格，用于费用统计
+    llm_cost_output: float = 0.0  # llm_model 每百万输出 token 的价格
+    
+    # Model Router：日常 tick 和简短聊天用小模型，脚本编写、上次失败、复杂聊天或小模型输出不可靠时升级到 llm_model
+    llm_fast_model: str = ""  # 小模型名称，为空时不启用路由
+    llm_fast_base_url: str = ""  # 小模型接口地址，为空时与 llm_base_url 相同
+    llm_fast_api_key: str = ""  # 为空时与 llm_api_key 相同
+    llm_fast_cost_input: float = 0.0  # 小模型每百万输入 token 的价格
+    llm_fast_cost_output: float = 0.0  # 小模型每百万输出 token 的价格
+    llm_router_chat_chars: int = 60  # 任一聊天消息超过该长度视为复杂聊天
+    llm_router_chat_messages: int = 3  # 待回复的聊天消息超过该条数视为复杂聊天
+    llm_router_min_confidence: float = 0.6  # 小模型决策的 confidence 低于该值时升级
     
     # Context/Memory Configuration
-    max_history_length: int = 20  # 保留的对话历史条数
+    max_history_length: int = 20  # 保留的对话历史条数（同时受 history_token_budget 限制）
+    history_token_budget: int = 4000  # 对话历史（含摘要）的 token 上限，超出的旧轮次压缩进摘要
+    history_summary_enabled: bool = True  # 是否在后台把旧轮次压缩成滚动摘要（关闭时直接丢弃）
+    history_summary_tokens: int = 300  # 滚动摘要的 token 上限
     max_chat_messages: int = 10  # 保留的游戏聊天消息数
     max_events: int = 10  # 保留的游戏事件数
     use_conversation_history: bool = False  # 是否在决策时使用对话历史
     
     # Bot Service Configuration (Node.js mineflayer service)
-    bot_service_url: str = "http://localhost:3001"
-    bot_ws_url: str = "ws://localhost:3001/ws"
+    bot_service_url: str = "http://localhost:3001"  # 同机部署可用 unix:///path/to/bot.sock 走 Unix 套接字
+    bot_ws_url: str = "ws://localhost:3001/ws"  # 仅 TCP 方式使用；Unix 套接字方式下 WebSocket 共用同一套接字
+    # 同一后端驱动的其他 Bot，格式 "id=地址,id2=地址2"（每个 Bot 对应一个 Bot 服务），
+    # 例如 "miner=http://localhost:3002,farmer=unix:///run/llm-mc/farmer.sock"
+    bot_sessions: str = ""
+    bot_ws_rpc: bool = True  # 动作/观察请求优先通过 WebSocket 发送（断开时回退到 HTTP）
+    bot_event_queue_size: int = 1000  # 事件分发队列容量，满时丢弃最旧的事件
+    bot_reconnect_min: float = 0.05  # WebSocket 重连退避的初始上限（秒），实际等待在 [0, 上限] 内随机
+    bot_reconnect_max: float = 5.0  # 连续失败时退避上限的最大值（秒）
+    bot_timeout_multiplier: float = 3.0  # 只读请求的自适应超时 = p99 延迟 x 该倍数
+    bot_timeout_min: float = 5.0  # 自适应超时下限（秒）
+    bot_timeout_max: float = 300.0  # 自适应超时上限（秒），样本不足时以及未在 actions.json 配置 timeout 的非只读动作也使用该值
+    bot_breaker_threshold: int = 5  # 连续多少次连接失败/只读请求超时后熔断
+    bot_breaker_cooldown: float = 10.0  # 熔断后多久允许试探请求（秒）
+    bot_codec: str = "auto"  # 与 Bot 服务通信的格式：auto（已安装 msgpack 时使用）/ msgpack / json
+    bot_coalesce_reads: bool = True  # 合并并发的相同只读请求（按 actions.json 的 readOnly / freshness）
+    inventory_mirror_enabled: bool = True  # viewInventory 优先读取由推送增量维护的本地背包
+    world_cache_enabled: bool = True  # 是否在本地缓存 getBlockAt / findBlock / scanBlocks 看到的方块
+    world_cache_ttl: float = 30.0  # 方块缓存有效期（秒），超时后重新向 Bot 服务查询
     
     # Agent Configuration
-    agent_tick_rate: float = 2.0  # 空闲时的决策间隔（秒）
+    agent_tick_rate: float = 2.0  # 执行完动作后继续决策的间隔（秒）
     agent_task_tick_rate: float = 15.0  # 有后台任务时的决策间隔（秒），0 表示完全事件驱动
+    agent_max_idle: float = 60.0  # 空闲（上次动作为 wait）且无事件时最长多久主动决策一次（秒），0 表示只由事件唤醒
+    agent_skip_unchanged: bool = True  # 上次决策为 wait 且观察无明显变化时跳过 LLM 调用
+    agent_change_position: float = 2.0  # 位置变化容差：按多少格分桶（0 表示精确比较）
+    agent_change_health: float = 2.0  # 生命值变化容差：按多少点分档
+    agent_change_food: float = 2.0  # 饥饿值变化容差：按多少点分档
+    agent_change_time_phases: int = 4  # 一天划分为几个时段，时段变化才算变化（0 表示忽略时间）
+    agent_reflexes: bool = True  # 按 reflexes.json 的规则在本地立即处理紧急情况（吃东西、躲苦力怕、岩浆中停下）
+    agent_pipeline: bool = False  # 耗时动作（如 goTo）执行期间预先请求下一次决策，动作结果与预测一致时直接使用
+    decision_cache_enabled: bool = False  # 相同聊天/观察特征时复用缓存的 LLM 决策（键含提示词版本，跨重启保存）
+    decision_cache_size: int = 500  # 决策缓存最多保留的条目数（按最近使用淘汰）
+    decision_cache_ttl: float = 3600.0  # 缓存决策有效期（秒），0 表示不过期
+    decision_cache_file: str = "data/decision_cache.json"  # 缓存文件，相对路径基于 backend 目录
+    decision_cache_save_interval: float = 5.0  # 写入磁盘的最短间隔（秒），停止 Agent 时也会保存
+    decision_cache_skip_actions: str = "cancelTask"  # 不缓存的动作（逗号分隔），补充 actions.json 中的 cacheable: false
+    agent_result_token_budget: int = 300  # 上次动作结果在提示词中的 token 预算，超出时只保留成功标志、消息、关键数值和失败调用
+    agent_result_failed_calls: int = 3  # 脚本结果中保留最后几个失败的调用（最近一次脚本的完整结果见 /api/tasks/{id}）
+    agent_wake_debounce: float = 0.1  # 被事件唤醒后等待多久再决策，合并同时到达的多个事件（秒）
     auto_start_agent: bool = True  # 是否自动启动 Agent
     
+    # Tracing
+    trace_enabled: bool = True  # 记录 tick 各阶段、LLM 调用、Bot 请求和脚本执行的耗时（/api/debug/traces 导出）
+    trace_buffer_size: int = 10000  # 环形缓冲区保留的 span 数
+    
     # Server Configuration
     host: str = "0.0.0.0"
     port: int = 8000
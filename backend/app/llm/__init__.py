@@ -1,4 +1,4 @@
 from .client import LLMClient, llm_client
-from .prompts import get_agent_system_prompt, format_observation
+from .prompts import get_agent_system_prompt, format_observation, format_tick_context
 
-__all__ = ["LLMClient", "llm_client", "get_agent_system_prompt", "format_observation"]
\ No newline at end of file
+__all__ = ["LLMClient", "llm_client", "get_agent_system_prompt", "format_observation", "format_tick_context"]
\ No newline at end of file
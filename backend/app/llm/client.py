@@ -1,9 +1,15 @@
 from openai import AsyncOpenAI
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+import asyncio
 import json
 import re
+import time
 
 from app.config import settings
+from app.llm.history import ConversationHistory
+from app.llm.router import ModelRouter, FAST, LARGE
+from app.llm.stream import JsonStream
+from app.tracing import tracer
 
 
 class LLMClient:
@@ -15,62 +21,415 @@ class LLMClient:
             base_url=settings.llm_base_url
         )
         self.model = settings.llm_model
-        self.conversation_history: List[Dict[str, str]] = []
+        # 多模型路由（配置 llm_fast_model 后启用），fast 档位默认与 large 共用同一个接口
+        self.router = ModelRouter()
+        self.fast_client: Optional[AsyncOpenAI] = None
+        if self.router.enabled and (settings.llm_fast_base_url or settings.llm_fast_api_key):
+            self.fast_client = AsyncOpenAI(
+                api_key=settings.llm_fast_api_key or settings.llm_api_key,
+                base_url=settings.llm_fast_base_url or settings.llm_base_url
+            )
+        # 对话历史按会话分开保存（多个 Bot 共用同一个客户端）
+        self.conversation_histories: Dict[str, ConversationHistory] = {}
+        # 各会话进行中的流式请求（结束后才写入对话历史）
+        self._streams: Dict[str, asyncio.Task] = {}
+        # 各会话进行中的历史摘要请求
+        self._summaries: Dict[str, asyncio.Task] = {}
+        # token 用量，cached_tokens 为服务端前缀缓存命中的提示词 token
+        self._usage: Dict[str, int] = {
+            "requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0
+        }
+    
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """默认会话的对话历史（含摘要消息）"""
+        return self._history("default").messages()
+    
+    def _history(self, conversation_id: str) -> ConversationHistory:
+        if conversation_id not in self.conversation_histories:
+            self.conversation_histories[conversation_id] = ConversationHistory()
+        return self.conversation_histories[conversation_id]
     
     async def chat(
         self, 
         system_prompt: str, 
         user_message: str, 
-        use_history: bool = True
+        use_history: bool = True,
+        conversation_id: str = "default",
+        tier: str = LARGE
     ) -> str:
         """Send a message to the LLM and get a response"""
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        if use_history:
-            messages.extend(self.conversation_history)
-        
-        messages.append({"role": "user", "content": user_message})
+        messages = await self._build_messages(system_prompt, user_message, use_history, conversation_id)
         
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=settings.llm_temperature,
-                max_tokens=settings.llm_max_tokens
-            )
+            assistant_message = await self._complete(messages, tier)
             
-            assistant_message = response.choices[0].message.content
-            
-            # Update history
             if use_history:
-                self.conversation_history.append(
-                    {"role": "user", "content": user_message}
-                )
-                self.conversation_history.append(
-                    {"role": "assistant", "content": assistant_message}
-                )
-                
-                # Keep history manageable
-                if len(self.conversation_history) > settings.max_history_length:
-                    self.conversation_history = self.conversation_history[-settings.max_history_length:]
+                self._remember(conversation_id, user_message, assistant_message)
             
             return assistant_message
             
         except Exception as e:
             raise Exception(f"LLM Error: {str(e)}")
     
+    async def _build_messages(
+        self,
+        system_prompt: str,
+        user_message: str,
+        use_history: bool,
+        conversation_id: str,
+        wait_stream: bool = True
+    ) -> List[Dict[str, str]]:
+        """
+        组装请求消息（使用历史时先等同一会话进行中的流式请求写完历史）
+        
+        流式请求自身也登记在 _streams 中，由它传入 wait_stream=False 并自行等待上一个请求，
+        否则会等待自己（或后登记的请求）而永远挂起
+        """
+        messages = [{"role": "system", "content": system_prompt}]
+        
+        if use_history:
+            pending = self._streams.get(conversation_id)
+            if wait_stream and pending and not pending.done():
+                await asyncio.wait({pending})
+            messages.extend(self._history(conversation_id).messages())
+        
+        messages.append({"role": "user", "content": user_message})
+        return messages
+    
+    def _tier_client(self, tier: str) -> AsyncOpenAI:
+        if tier == FAST and self.fast_client is not None:
+            return self.fast_client
+        return self.client
+    
+    async def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        tier: str = LARGE,
+        span_name: str = "llm.chat",
+        **options
+    ) -> str:
+        """向指定档位的模型发送一次请求，记录用量、耗时和费用"""
+        model_tier = self.router.tiers[tier]
+        options = {"temperature": settings.llm_temperature, "max_tokens": settings.llm_max_tokens, **options}
+        start = time.perf_counter()
+        with tracer.span(span_name, "llm", model=model_tier.model, tier=tier, messages=len(messages)) as span:
+            try:
+                response = await self._tier_client(tier).chat.completions.create(
+                    model=model_tier.model,
+                    messages=messages,
+                    **options
+                )
+            except Exception:
+                model_tier.record(time.perf_counter() - start, error=True)
+                raise
+            usage = None
+            if raw_usage := getattr(response, "usage", None):
+                usage = self._record_usage(raw_usage)
+                span.update(usage)
+            model_tier.record(time.perf_counter() - start, usage)
+        return response.choices[0].message.content
+    
+    def _record_usage(self, usage: Any) -> Dict[str, int]:
+        """
+        累计一次请求的 token 用量
+        
+        命中前缀缓存的 token 数：OpenAI 为 usage.prompt_tokens_details.cached_tokens，
+        DeepSeek 为 usage.prompt_cache_hit_tokens
+        """
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or getattr(usage, "prompt_cache_hit_tokens", None) or 0
+        record = {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "cached_tokens": cached,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0
+        }
+        self._usage["requests"] += 1
+        for key, value in record.items():
+            self._usage[key] += value
+        return record
+    
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """token 用量及服务端前缀缓存命中率"""
+        prompt_tokens = self._usage["prompt_tokens"]
+        return {
+            **self._usage,
+            "cached_ratio": round(self._usage["cached_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0
+        }
+    
+    def remember(self, conversation_id: str, user_message: str, assistant_message: str):
+        """
+        补记一轮对话（用于请求时未写入历史、之后才确定采用的结果，如预测决策）
+        
+        未启用 use_conversation_history 时忽略
+        """
+        if settings.use_conversation_history:
+            self._remember(conversation_id, user_message, assistant_message)
+    
+    def _remember(self, conversation_id: str, user_message: str, assistant_message: str):
+        """Update history（超出 token 预算的旧轮次在后台压缩进摘要）"""
+        history = self._history(conversation_id)
+        history.append(user_message, assistant_message)
+        
+        if not history.pending:
+            return
+        if not settings.history_summary_enabled:
+            history.drop_pending(history.take_pending())
+            return
+        running = self._summaries.get(conversation_id)
+        if running and not running.done():
+            # 正在压缩的请求结束后会继续处理新挤出的轮次
+            return
+        task = asyncio.create_task(
+            self._summarize_history(conversation_id, history),
+            name=f"llm:{conversation_id}:summary"
+        )
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._summaries[conversation_id] = task
+    
+    async def _summarize_history(self, conversation_id: str, history: ConversationHistory):
+        """
+        把挤出预算的旧轮次压缩进滚动摘要
+        
+        不阻塞决策：摘要写回前的请求只是少了这部分上下文。请求失败时保留原摘要。
+        启用多模型路由时使用 fast 档位
+        """
+        tier = FAST if self.router.enabled else LARGE
+        try:
+            while history.pending:
+                turns = history.take_pending()
+                try:
+                    summary = await self._complete(
+                        history.summary_request(turns),
+                        tier,
+                        span_name="llm.summarize",
+                        temperature=0.2,
+                        max_tokens=settings.history_summary_tokens
+                    ) or ""
+                except Exception as e:
+                    print(f"[LLM] 历史摘要失败，保留原摘要: {e}")
+                    history.drop_pending(turns)
+                    continue
+                # 会话历史已被清空时丢弃结果
+                if self.conversation_histories.get(conversation_id) is history and summary.strip():
+                    history.set_summary(summary)
+        finally:
+            if self._summaries.get(conversation_id) is asyncio.current_task():
+                del self._summaries[conversation_id]
+    
     async def chat_json(
         self, 
         system_prompt: str, 
-        user_message: str
+        user_message: str,
+        conversation_id: str = "default",
+        route: Optional[Dict[str, Any]] = None,
+        use_history: Optional[bool] = None
     ) -> Dict[str, Any]:
-        """Send a message expecting a JSON response"""
-        response = await self.chat(
-            system_prompt,
-            user_message,
-            use_history=settings.use_conversation_history
+        """
+        Send a message expecting a JSON response
+        
+        给出 route（路由提示，见 ModelRouter.select）时可能先用 fast 档位；
+        其输出无法解析或需要升级（见 ModelRouter.check）时改用 large 档位重新请求。
+        use_history 默认为 use_conversation_history；为 False 时既不带历史也不写入历史
+        """
+        if use_history is None:
+            use_history = settings.use_conversation_history
+        messages = await self._build_messages(system_prompt, user_message, use_history, conversation_id)
+        
+        if self.router.select(route) == FAST:
+            reason = None
+            try:
+                response = await self._complete(messages, FAST)
+            except Exception as e:
+                print(f"[LLM] fast 档位请求失败: {e}")
+                reason = "error"
+            if reason is None:
+                try:
+                    result = self._parse_traced(response)
+                except Exception:
+                    reason = "invalid_json"
+                else:
+                    reason = self.router.check(result)
+            if reason is None:
+                if use_history:
+                    self._remember(conversation_id, user_message, response)
+                return result
+            self.router.escalate(reason)
+        
+        try:
+            response = await self._complete(messages, LARGE)
+        except Exception as e:
+            raise Exception(f"LLM Error: {str(e)}")
+        
+        if use_history:
+            self._remember(conversation_id, user_message, response)
+        
+        return self._parse_traced(response)
+    
+    def _parse_traced(self, response: str) -> Dict[str, Any]:
+        with tracer.span("llm.parse_json", "llm", chars=len(response or "")):
+            return self._parse_json(response)
+    
+    def chat_json_stream(
+        self,
+        system_prompt: str,
+        user_message: str,
+        conversation_id: str = "default",
+        route: Optional[Dict[str, Any]] = None
+    ) -> JsonStream:
+        """
+        流式请求 JSON 决策
+        
+        边接收边解析：action 和 parameters（或 plan）完整后 early_decision() 立即返回，
+        thought 等剩余内容继续在后台接收，stream.task 返回完整结果。
+        路由到 fast 档位时，决策提前执行之前发现需要升级会改用 large 档位重新接收
+        
+        Example:
+            stream = llm_client.chat_json_stream(system_prompt, user_message)
+            decision = await stream.early_decision()   # 可以立即执行
+            full = await stream.task                    # 包含 thought 的完整结果
+        """
+        stream = JsonStream()
+        # 同一会话上一个还没结束的流式请求：它写完历史后才组装本次的消息
+        previous = self._streams.get(conversation_id)
+        stream.task = asyncio.create_task(
+            self._run_json_stream(stream, system_prompt, user_message, conversation_id, route, previous),
+            name=f"llm:{conversation_id}:stream"
         )
+        # 没人等待完整结果时取走异常，避免 asyncio 警告
+        stream.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._streams[conversation_id] = stream.task
+        return stream
+    
+    async def _run_json_stream(
+        self,
+        stream: JsonStream,
+        system_prompt: str,
+        user_message: str,
+        conversation_id: str,
+        route: Optional[Dict[str, Any]] = None,
+        previous: Optional[asyncio.Task] = None
+    ) -> Dict[str, Any]:
+        """按路由选择档位接收流式响应"""
+        use_history = settings.use_conversation_history
+        try:
+            if use_history and previous and not previous.done():
+                await asyncio.wait({previous})
+            messages = await self._build_messages(
+                system_prompt, user_message, use_history, conversation_id, wait_stream=False
+            )
+            
+            text, result = None, None
+            if self.router.select(route) == FAST:
+                text, result = await self._run_fast_stream(stream, messages)
+            if text is None:
+                text = await self._stream_completion(stream, messages, LARGE)
+            
+            if use_history:
+                self._remember(conversation_id, user_message, text)
+            
+            if result is None:
+                result = self._stream_result(stream, text)
+            stream.finish(result)
+            return result
+        except BaseException as e:
+            stream.fail(e)
+            raise
+        finally:
+            if self._streams.get(conversation_id) is stream.task:
+                del self._streams[conversation_id]
+    
+    async def _run_fast_stream(
+        self,
+        stream: JsonStream,
+        messages: List[Dict[str, str]]
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        先用 fast 档位接收
         
+        决策提前执行之前发现需要升级时停止接收并重置解析器，返回 (None, None)
+        由调用方改用 large 档位；已经提前执行的决策不再升级
+        """
+        stream.check = self.router.check
+        try:
+            text = await self._stream_completion(stream, messages, FAST)
+        except Exception as e:
+            if stream.early.done():
+                raise
+            print(f"[LLM] fast 档位请求失败: {e}")
+            text, reason = None, "error"
+        else:
+            reason = stream.rejected
+        
+        result = None
+        if reason is None:
+            try:
+                result = self._stream_result(stream, text)
+            except Exception:
+                if stream.early.done():
+                    raise
+                reason = "invalid_json"
+            else:
+                if not stream.early.done():
+                    reason = self.router.check(result)
+        
+        if reason is None:
+            return text, result
+        self.router.escalate(reason)
+        stream.restart()
+        return None, None
+    
+    async def _stream_completion(self, stream: JsonStream, messages: List[Dict[str, str]], tier: str) -> str:
+        """接收一个档位的流式响应并逐块喂给解析器（决策被 stream.check 拒绝时提前停止）"""
+        model_tier = self.router.tiers[tier]
+        parts: List[str] = []
+        start = time.perf_counter()
+        
+        with tracer.span("llm.stream", "llm", model=model_tier.model, tier=tier, messages=len(messages)) as span:
+            usage = None
+            try:
+                response = await self._tier_client(tier).chat.completions.create(
+                    model=model_tier.model,
+                    messages=messages,
+                    temperature=settings.llm_temperature,
+                    max_tokens=settings.llm_max_tokens,
+                    stream=True
+                )
+                async for chunk in response:
+                    # 接口返回用量时（通常在最后一个块）一并统计
+                    if raw_usage := getattr(chunk, "usage", None):
+                        usage = self._record_usage(raw_usage)
+                        span.update(usage)
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if not parts:
+                        span["first_token_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    parts.append(delta)
+                    if stream.feed(delta):
+                        span["decision_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    if stream.rejected:
+                        # 要升级了，不再接收剩余内容
+                        span["rejected"] = stream.rejected
+                        if hasattr(response, "close"):
+                            await response.close()
+                        break
+            except Exception as e:
+                model_tier.record(time.perf_counter() - start, error=True)
+                raise Exception(f"LLM Error: {str(e)}")
+            model_tier.record(time.perf_counter() - start, usage)
+            span["chars"] = len(stream.parser.text)
+        
+        return "".join(parts)
+    
+    def _stream_result(self, stream: JsonStream, text: str) -> Dict[str, Any]:
+        """增量解析失败（如对象不完整）时回退到完整解析"""
+        if stream.parser.closed and stream.parser.fields:
+            return dict(stream.parser.fields)
+        return self._parse_json(text)
+    
+    def _parse_json(self, response: str) -> Dict[str, Any]:
+        """解析 LLM 返回的 JSON（允许包在代码块中或夹杂其他文字）"""
         try:
             # Try direct parse
             return json.loads(response)
@@ -93,13 +452,21 @@ class LLMClient:
             
             raise Exception("Failed to parse JSON from LLM response")
     
-    def clear_history(self):
-        """Clear conversation history"""
-        self.conversation_history = []
+    def clear_history(self, conversation_id: Optional[str] = None):
+        """Clear conversation history (all conversations when no id is given)"""
+        if conversation_id is None:
+            self.conversation_histories.clear()
+        else:
+            self.conversation_histories.pop(conversation_id, None)
     
-    def get_history_length(self) -> int:
+    def get_history_length(self, conversation_id: str = "default") -> int:
         """Get current history length"""
-        return len(self.conversation_history)
+        return len(self.conversation_histories.get(conversation_id) or ())
+    
+    def get_history_stats(self, conversation_id: str = "default") -> Dict[str, Any]:
+        """对话历史的 token 占用与摘要统计"""
+        history = self.conversation_histories.get(conversation_id)
+        return history.get_stats() if history else {"messages": 0, "tokens": 0}
 
 
 # Singleton instance
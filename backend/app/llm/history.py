@@ -0,0 +1,119 @@
+"""
+Token-budgeted conversation history
+Recent turns are kept verbatim within a hard token budget; older turns are
+handed off to be compacted into a rolling summary
+"""
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from app.config import settings
+from app.llm.tokens import estimate_tokens, truncate_to_tokens, MESSAGE_OVERHEAD
+
+
+# 历史摘要的提示词
+SUMMARY_PROMPT = """你负责压缩一个 Minecraft 机器人与环境/玩家的对话历史。
+根据“已有摘要”和“新的对话轮次”，写出一份新的摘要（中文，不超过 {max_tokens} 个 token）：
+- 保留：玩家的请求与承诺、正在进行的目标、重要的位置/物品/结果、失败过的尝试
+- 去掉：逐条的观察数值、重复的等待
+只输出摘要正文。"""
+
+
+class ConversationHistory:
+    """
+    单个会话的对话历史
+
+    - turns: 最近的 (用户消息, 回复, token 数)，总 token 数不超过 history_token_budget，
+      轮数不超过 max_history_length / 2
+    - 超出预算的旧轮次移入 pending，由调用方在后台压缩进 summary（见 LLMClient）
+    - 单轮本身就超过预算一半时，用户消息会被截断
+    """
+
+    def __init__(self, budget: Optional[int] = None, max_messages: Optional[int] = None):
+        self.budget = budget or settings.history_token_budget
+        self.max_messages = max_messages or settings.max_history_length
+        self.turns: deque = deque()
+        self.tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        # 等待压缩进摘要的旧轮次
+        self.pending: List[Dict[str, str]] = []
+        self.stats: Dict[str, int] = {"turns": 0, "compacted": 0, "summaries": 0, "dropped": 0, "truncated": 0}
+
+    def append(self, user_message: str, assistant_message: str):
+        """记录一轮对话，超出预算时把最旧的轮次移入 pending"""
+        limit = self.budget // 2
+        if estimate_tokens(user_message) + estimate_tokens(assistant_message) > limit:
+            user_message = truncate_to_tokens(user_message, max(limit - estimate_tokens(assistant_message), limit // 4))
+            self.stats["truncated"] += 1
+
+        tokens = estimate_tokens(user_message) + estimate_tokens(assistant_message) + 2 * MESSAGE_OVERHEAD
+        self.turns.append((user_message, assistant_message, tokens))
+        self.tokens += tokens
+        self.stats["turns"] += 1
+
+        while self.turns and (
+            self.tokens + self.summary_tokens > self.budget or
+            len(self.turns) * 2 > self.max_messages
+        ):
+            old_user, old_assistant, old_tokens = self.turns.popleft()
+            self.tokens -= old_tokens
+            self.pending.append({"user": old_user, "assistant": old_assistant})
+            self.stats["compacted"] += 1
+
+    def messages(self) -> List[Dict[str, str]]:
+        """请求时插入的历史消息（摘要在最前）"""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"之前对话的摘要：\n{self.summary}"})
+        for user_message, assistant_message, _ in self.turns:
+            messages.append({"role": "user", "content": user_message})
+            messages.append({"role": "assistant", "content": assistant_message})
+        return messages
+
+    def take_pending(self) -> List[Dict[str, str]]:
+        """取出待压缩的轮次"""
+        pending, self.pending = self.pending, []
+        return pending
+
+    def summary_request(self, turns: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """构造压缩摘要的请求消息"""
+        max_tokens = settings.history_summary_tokens
+        # 送去压缩的内容本身也限制在预算内，单轮的观察只取开头
+        per_turn = max(self.budget // max(len(turns), 1), 64)
+        lines = [f"已有摘要：\n{self.summary or '（无）'}", "", "新的对话轮次："]
+        for turn in turns:
+            lines.append(f"[输入] {truncate_to_tokens(turn['user'], per_turn // 2)}")
+            lines.append(f"[回复] {truncate_to_tokens(turn['assistant'], per_turn // 2)}")
+        return [
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_tokens=max_tokens)},
+            {"role": "user", "content": "\n".join(lines)}
+        ]
+
+    def set_summary(self, summary: str):
+        """更新滚动摘要（限制在 history_summary_tokens 内），必要时继续挤出旧轮次"""
+        self.summary = truncate_to_tokens(summary.strip(), settings.history_summary_tokens)
+        self.summary_tokens = estimate_tokens(self.summary) + MESSAGE_OVERHEAD
+        self.stats["summaries"] += 1
+        while self.turns and self.tokens + self.summary_tokens > self.budget:
+            old_user, old_assistant, old_tokens = self.turns.popleft()
+            self.tokens -= old_tokens
+            self.pending.append({"user": old_user, "assistant": old_assistant})
+            self.stats["compacted"] += 1
+
+    def drop_pending(self, turns: List[Dict[str, str]]):
+        """摘要失败或未启用：这些轮次直接丢弃"""
+        self.stats["dropped"] += len(turns)
+
+    def __len__(self) -> int:
+        """消息条数（与原先的列表历史一致）"""
+        return len(self.turns) * 2
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "messages": len(self),
+            "tokens": self.tokens,
+            "summary_tokens": self.summary_tokens,
+            "budget": self.budget,
+            "pending": len(self.pending),
+            **self.stats
+        }
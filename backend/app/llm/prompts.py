@@ -1,7 +1,10 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
+import hashlib
 import json
+from ..config import settings
 from ..skills.manager import skill_manager
+from .tokens import estimate_tokens
 
 
 # ============================================================
@@ -61,8 +64,8 @@ def load_actions() -> List[dict]:
         with open(ACTIONS_CONFIG_FILE, 'r', encoding='utf-8') as f:
             actions_dict = json.load(f)
         
-        # 转换为列表格式
-        _actions_cache = list(actions_dict.values())
+        # 转换为列表格式（internal 条目只提供调用元数据，不展示给 LLM）
+        _actions_cache = [a for a in actions_dict.values() if not a.get("internal")]
         _actions_cache_mtime = current_mtime
         
         print(f"[prompts] 已加载 {len(_actions_cache)} 个动作")
@@ -216,36 +219,100 @@ def get_action_descriptions() -> str:
     return "\n".join(lines)
 
 
-def get_agent_system_prompt(bot_state: Optional[Dict[str, Any]] = None) -> str:
-    """Generate the system prompt for the Minecraft agent"""
+# 系统提示词缓存：(actions.json 修改时间, 技能索引版本) -> 提示词
+_system_prompt_key: Optional[Tuple[float, int]] = None
+_system_prompt_cache: str = ""
+_system_prompt_version: str = ""
+_prompt_stats: Dict[str, int] = {"builds": 0, "hits": 0}
+
+
+def get_agent_system_prompt() -> str:
+    """
+    Generate the system prompt for the Minecraft agent
     
-    action_descriptions = get_action_descriptions()
-    task_actions = get_task_actions_description()
+    只包含人格、动作列表、技能库和规则，逐字节稳定（便于服务端前缀缓存命中）；
+    位置、生命值、时间、后台任务等每次决策都变化的内容见 format_tick_context，放在用户消息中。
+    结果按 actions.json 修改时间、技能索引版本和是否启用模型路由缓存，变化时重建
+    """
+    global _system_prompt_key, _system_prompt_cache, _system_prompt_version
     
-    state_json = ""
-    has_active_tasks = False
-    if bot_state:
-        import json
-        has_active_tasks = bot_state.get("has_active_tasks", False)
-        state_json = json.dumps(bot_state, indent=2, ensure_ascii=False)
+    mtime = ACTIONS_CONFIG_FILE.stat().st_mtime if ACTIONS_CONFIG_FILE.exists() else 0
+    key = (mtime, skill_manager.version, bool(settings.llm_fast_model))
+    if key == _system_prompt_key:
+        _prompt_stats["hits"] += 1
+        return _system_prompt_cache
     
-    # 获取人格设定
-    persona_name = BOT_PERSONA.get("name", "Bot")
-    persona_desc = BOT_PERSONA.get("personality", "")
+    _system_prompt_cache = _build_system_prompt()
+    _system_prompt_version = hashlib.sha256(_system_prompt_cache.encode("utf-8")).hexdigest()[:16]
+    _system_prompt_key = key
+    _prompt_stats["builds"] += 1
+    return _system_prompt_cache
+
+
+def get_prompt_version() -> str:
+    """系统提示词内容的摘要（动作、技能或人格变化时改变）"""
+    get_agent_system_prompt()
+    return _system_prompt_version
+
+
+def get_prompt_stats() -> Dict[str, Any]:
+    """系统提示词缓存统计"""
+    lookups = _prompt_stats["builds"] + _prompt_stats["hits"]
+    return {
+        "version": _system_prompt_version,
+        "prefix_chars": len(_system_prompt_cache),
+        "prefix_tokens": estimate_tokens(_system_prompt_cache),
+        "hit_rate": round(_prompt_stats["hits"] / lookups, 3) if lookups else 0.0,
+        **_prompt_stats
+    }
+
+
+def format_tick_context(bot_state: Dict[str, Any]) -> str:
+    """
+    本次决策的动态上下文（追加在用户消息中，不放进系统提示词）
+    
+    Args:
+        bot_state: {"position", "health", "time", "has_active_tasks"}
+    """
+    state_json = json.dumps(bot_state, indent=2, ensure_ascii=False)
     
     # 任务状态提示
     task_status_hint = ""
-    if has_active_tasks:
+    if bot_state.get("has_active_tasks"):
         task_status_hint = """
+
 ## ⚡ 后台任务运行中
 
 你当前有后台任务正在执行（详见观察信息中的"当前后台任务"）。
 - 任务在后台运行，你仍然可以响应玩家聊天和处理其他事务
 - 如果玩家要求停止任务，使用 `cancelTask` 动作
 - 如果需要查看任务详情，使用 `getTaskStatus` 动作
-- 你可以继续与玩家互动，无需等待任务完成
+- 你可以继续与玩家互动，无需等待任务完成"""
+    
+    return f"""# 📊 当前状态
+{state_json}{task_status_hint}"""
 
-"""
+
+def _build_system_prompt() -> str:
+    """组装系统提示词的静态部分"""
+    
+    action_descriptions = get_action_descriptions()
+    task_actions = get_task_actions_description()
+    
+    # 获取人格设定
+    persona_name = BOT_PERSONA.get("name", "Bot")
+    persona_desc = BOT_PERSONA.get("personality", "")
+    
+    # 启用模型路由时要求给出 confidence（在 parameters 之前，流式提前执行前就能据此升级）
+    if settings.llm_fast_model:
+        response_fields = """  "action": "动作名称",
+  "confidence": 0.9,
+  "parameters": { "参数名": "参数值" },"""
+        confidence_note = "- `confidence`：你对这个决策的把握（0-1），拿不准时如实给出较低的值；返回 plan 时放在 plan 之前\n"
+    else:
+        response_fields = """  "action": "动作名称",
+  "parameters": { "参数名": "参数值" },"""
+        confidence_note = ""
     
     return f"""# 🎭 角色设定
 
@@ -263,17 +330,33 @@ def get_agent_system_prompt(bot_state: Optional[Dict[str, Any]] = None) -> str:
 {task_actions}
 
 ---
-{task_status_hint}
+
 # 📝 响应格式
 
-你必须以JSON格式响应，格式如下：
+你必须以JSON格式响应，格式如下（按此顺序输出字段，action 和 parameters 在前，thought 放在最后）：
 ```json
 {{
-  "thought": "你对当前情况的思考（用中文，符合你的人格）",
-  "action": "动作名称",
-  "parameters": {{ "参数名": "参数值" }}
+{response_fields}
+  "thought": "你对当前情况的思考（用中文，符合你的人格）"
 }}
 ```
+{confidence_note}
+需要连续执行几个简单动作时（例如“走过去、看向玩家、打招呼”），可以返回多步计划代替单个 action，
+各步骤会在本地依次执行，不需要每一步都询问你：
+```json
+{{
+  "plan": [
+    {{ "action": "goTo", "parameters": {{ "x": 10, "y": 64, "z": 20 }} }},
+    {{ "action": "lookAt", "parameters": {{ "x": 12, "y": 65, "z": 20 }} }},
+    {{ "action": "chat", "parameters": {{ "message": "你好喵~" }}, "guard": {{ "entityWithin": {{ "name": "Steve", "distance": 8 }} }} }}
+  ],
+  "thought": "你的思考"
+}}
+```
+- `guard`（可选）：执行该步前检查的条件，不满足时计划中止。可用条件：`healthBelow`、`foodBelow`、
+  `entityWithin`（name / type / distance）、`inLava`、`inWater`、`hasItem`、`nearPosition`（x / y / z / distance），
+  以及组合 `all`、`any`、`not`
+- 任一步失败、出现新的聊天或新的紧急情况、或计划全部完成时，你会收到结果并重新决策
 
 ---
 
@@ -287,11 +370,7 @@ def get_agent_system_prompt(bot_state: Optional[Dict[str, Any]] = None) -> str:
 6. **启动长时间任务**：对于复杂/耗时任务（挖矿、采集等），优先使用 startSkill 启动后台任务
 7. **无事可做时**：可以用wait等待，或主动打招呼
 8. **只输出JSON**：不要输出任何JSON之外的内容
-
----
-
-# 📊 当前状态
-{state_json if state_json else "暂无状态信息"}
+9. **当前状态**：你的位置、生命值、时间和后台任务状态在每次的用户消息中给出
 """
 
 
@@ -0,0 +1,131 @@
+"""
+Multi-model router
+Routine decisions go to a fast, cheap model; script authoring, failures,
+complex chat and unreliable fast-model output escalate to the main model
+"""
+from typing import Dict, Any, Optional
+
+from app.bot.health import LatencyHistogram
+from app.config import settings
+
+
+# 档位名称
+FAST = "fast"
+LARGE = "large"
+
+
+class ModelTier:
+    """一个模型档位及其调用统计"""
+
+    def __init__(self, name: str, model: str, cost_input: float, cost_output: float):
+        self.name = name
+        self.model = model
+        # 每百万 token 的价格
+        self.cost_input = cost_input
+        self.cost_output = cost_output
+        self.latency = LatencyHistogram()
+        self.stats: Dict[str, float] = {
+            "requests": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0
+        }
+
+    def record(self, seconds: float, usage: Optional[Dict[str, int]] = None, error: bool = False):
+        """记录一次请求的耗时、用量和费用"""
+        self.stats["requests"] += 1
+        if error:
+            self.stats["errors"] += 1
+            return
+        self.latency.record(seconds)
+        if usage:
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            self.stats["cost"] += (prompt_tokens * self.cost_input + completion_tokens * self.cost_output) / 1e6
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            **self.stats,
+            "cost": round(self.stats["cost"], 6),
+            "latency": self.latency.to_dict()
+        }
+
+
+class ModelRouter:
+    """
+    模型路由
+
+    select() 根据调用方给出的路由提示选择档位：
+    - 上次动作失败、聊天较长或较多 -> large
+    - 其余（日常 tick、简短聊天）-> fast
+    check() 检查 fast 档位的决策，需要升级时返回原因：
+    - 要编写脚本（executeScript）、缺少 action / plan、confidence 低于阈值
+    未配置 llm_fast_model 时始终使用 large
+    """
+
+    def __init__(self):
+        self.tiers: Dict[str, ModelTier] = {
+            LARGE: ModelTier(LARGE, settings.llm_model, settings.llm_cost_input, settings.llm_cost_output)
+        }
+        if settings.llm_fast_model:
+            self.tiers[FAST] = ModelTier(
+                FAST, settings.llm_fast_model, settings.llm_fast_cost_input, settings.llm_fast_cost_output
+            )
+        self.routes: Dict[str, int] = {}
+        self.escalations: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return FAST in self.tiers
+
+    def select(self, route: Optional[Dict[str, Any]] = None) -> str:
+        """
+        选择档位
+
+        Args:
+            route: 路由提示，如 {"chat": ["消息", ...], "failed": True}；为 None 时使用 large
+        """
+        if not self.enabled or route is None:
+            return LARGE
+        chat = [str(m) for m in route.get("chat") or []]
+        if route.get("failed"):
+            reason = "failed"
+        elif len(chat) > settings.llm_router_chat_messages or any(
+            len(m) > settings.llm_router_chat_chars for m in chat
+        ):
+            reason = "complex_chat"
+        else:
+            reason = "routine"
+        self.routes[reason] = self.routes.get(reason, 0) + 1
+        return FAST if reason == "routine" else LARGE
+
+    def check(self, decision: Dict[str, Any]) -> Optional[str]:
+        """
+        fast 档位的决策是否需要升级
+
+        Returns:
+            升级原因；可以直接使用时返回 None
+        """
+        steps = decision.get("plan") if isinstance(decision.get("plan"), list) else [decision]
+        actions = [s.get("action") for s in steps if isinstance(s, dict)]
+        if not actions or not all(isinstance(a, str) and a for a in actions):
+            return "no_action"
+        if "executeScript" in actions:
+            return "script"
+        confidence = decision.get("confidence")
+        if isinstance(confidence, (int, float)) and confidence < settings.llm_router_min_confidence:
+            return "low_confidence"
+        return None
+
+    def escalate(self, reason: str):
+        """记录一次升级"""
+        self.escalations[reason] = self.escalations.get(reason, 0) + 1
+        print(f"[Router] 升级到 {self.tiers[LARGE].model}: {reason}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "routes": dict(self.routes),
+            "escalations": dict(self.escalations),
+            "tiers": {name: tier.get_stats() for name, tier in self.tiers.items()}
+        }
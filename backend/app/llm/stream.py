@@ -0,0 +1,202 @@
+"""
+Streaming JSON decisions
+Incrementally parses a streamed LLM response so the action can be dispatched
+as soon as its fields are complete, before the thought text finishes
+"""
+import asyncio
+import json
+from typing import Dict, Any, Optional, Callable
+
+
+class IncrementalJsonParser:
+    """
+    顶层 JSON 对象的增量解析器
+
+    逐块喂入文本，每当一个顶层字段的值完整时解析并放入 fields；
+    对象之前的内容（如 ```json 代码块标记）会被跳过
+
+    Example:
+        parser = IncrementalJsonParser()
+        parser.feed('{"action": "goTo", "parameters": {"x": 1')
+        parser.fields   # -> {"action": "goTo"}
+        parser.feed('}, "thought": "...')
+        parser.fields   # -> {"action": "goTo", "parameters": {"x": 1}}
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self.closed = False
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # 顶层状态：key / colon / value / value_in / comma
+        self._expect = "key"
+        self._kind = ""
+        self._key: Optional[str] = None
+        self._token_start = 0
+
+    def feed(self, chunk: str):
+        """喂入一段文本"""
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self.closed:
+                break
+            self._step(text, i, text[i])
+        self._pos = len(text)
+
+    def _step(self, text: str, i: int, ch: str):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 1:
+                    self._string_closed(text, i)
+            return
+
+        if not self._started:
+            if ch == "{":
+                self._started = True
+                self._depth = 1
+            return
+
+        if ch == '"':
+            self._in_string = True
+            if self._depth == 1:
+                if self._expect == "key":
+                    self._token_start = i
+                elif self._expect == "value":
+                    self._begin_value(i, "string")
+        elif ch in "{[":
+            if self._depth == 1 and self._expect == "value":
+                self._begin_value(i, "container")
+            self._depth += 1
+        elif ch in "}]":
+            if self._depth == 1:
+                # 顶层对象结束
+                if self._expect == "value_in" and self._kind == "scalar":
+                    self._complete(text[self._token_start:i])
+                self._depth = 0
+                self.closed = True
+                return
+            self._depth -= 1
+            if self._depth == 1 and self._expect == "value_in" and self._kind == "container":
+                self._complete(text[self._token_start:i + 1])
+        elif self._depth == 1:
+            if ch == ":" and self._expect == "colon":
+                self._expect = "value"
+            elif ch == ",":
+                if self._expect == "value_in" and self._kind == "scalar":
+                    self._complete(text[self._token_start:i])
+                self._expect = "key"
+            elif not ch.isspace() and self._expect == "value":
+                self._begin_value(i, "scalar")
+
+    def _begin_value(self, i: int, kind: str):
+        self._token_start = i
+        self._kind = kind
+        self._expect = "value_in"
+
+    def _string_closed(self, text: str, i: int):
+        if self._expect == "key":
+            try:
+                self._key = json.loads(text[self._token_start:i + 1])
+            except json.JSONDecodeError:
+                self._key = None
+            self._expect = "colon"
+        elif self._expect == "value_in" and self._kind == "string":
+            self._complete(text[self._token_start:i + 1])
+
+    def _complete(self, raw: str):
+        """一个顶层字段的值已完整"""
+        self._expect = "comma"
+        if self._key is None:
+            return
+        try:
+            self.fields[self._key] = json.loads(raw.strip())
+        except json.JSONDecodeError:
+            pass
+
+    @property
+    def decision_ready(self) -> bool:
+        """
+        是否已经可以执行
+
+        plan 完整，或 action 与 parameters 都已完整（对象已结束时不要求 parameters）
+        """
+        if isinstance(self.fields.get("plan"), list):
+            return True
+        return "action" in self.fields and ("parameters" in self.fields or self.closed)
+
+
+class JsonStream:
+    """
+    一次流式 JSON 决策
+
+    early 在决策字段完整时（或响应结束、出错时）完成；task 在整个响应结束后
+    返回完整的解析结果（包含 thought），并由 LLMClient 更新对话历史。
+    设置了 check 时，决策字段完整后先检查，返回原因则不提前给出决策，记录到 rejected
+    （用于 fast 档位的决策升级到 large，见 ModelRouter.check）
+    """
+
+    def __init__(self):
+        self.parser = IncrementalJsonParser()
+        self.early: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.task: Optional[asyncio.Task] = None
+        self.check: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None
+        self.rejected: Optional[str] = None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        喂入一段响应文本
+
+        Returns:
+            本次是否刚好让决策可以提前执行
+        """
+        self.parser.feed(chunk)
+        if self.rejected or self.early.done() or not self.parser.decision_ready:
+            return False
+        if self.check and (reason := self.check(self.parser.fields)):
+            self.rejected = reason
+            return False
+        self.early.set_result(dict(self.parser.fields))
+        return True
+
+    def restart(self):
+        """改用另一个请求重新接收（early 尚未完成时）"""
+        self.parser = IncrementalJsonParser()
+        self.check = None
+        self.rejected = None
+
+    def finish(self, result: Dict[str, Any]):
+        """响应结束：还没有提前给出决策时用完整结果"""
+        if not self.early.done():
+            self.early.set_result(result)
+
+    def fail(self, error: BaseException):
+        """请求出错或被取消：等待 early 的调用方收到同样的结果"""
+        if self.early.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            self.early.cancel()
+        else:
+            self.early.set_exception(error)
+
+    async def early_decision(self) -> Dict[str, Any]:
+        """
+        等待可以执行的决策（不等 thought 等剩余内容）
+
+        调用方被取消时同时取消流式请求
+        """
+        try:
+            return await asyncio.shield(self.early)
+        except asyncio.CancelledError:
+            if self.task:
+                self.task.cancel()
+            raise
@@ -0,0 +1,85 @@
+"""
+Token counting
+Uses tiktoken when installed, otherwise a cheap character-based estimate
+"""
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+# 可选依赖：未安装（或编码文件无法下载）时使用字符估算
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# 每条消息的格式开销（role、分隔符）
+MESSAGE_OVERHEAD = 4
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    """按 llm_model 取 tiktoken 编码，未知模型使用 cl100k_base"""
+    global _encoding, _encoding_failed
+    if _encoding is not None or _encoding_failed or tiktoken is None:
+        return _encoding
+    try:
+        try:
+            _encoding = tiktoken.encoding_for_model(settings.llm_model)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"[tokens] tiktoken 不可用，改用字符估算: {e}")
+        _encoding_failed = True
+    return _encoding
+
+
+def tokenizer_name() -> str:
+    """当前使用的计数方式"""
+    encoding = _get_encoding()
+    return f"tiktoken:{encoding.name}" if encoding is not None else "heuristic"
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    计算文本的 token 数
+
+    安装了 tiktoken 时精确计数；否则估算：ASCII 字符约 4 个一个 token，
+    中文等非 ASCII 字符按每个字符一个 token 计
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """计算消息列表的 token 数（含每条消息的格式开销）"""
+    return sum(estimate_tokens(m.get("content", "")) + MESSAGE_OVERHEAD for m in messages)
+
+
+def truncate_to_tokens(text: str, budget: int, suffix: str = "…") -> str:
+    """
+    截断文本使其不超过 budget 个 token（超出时末尾加 suffix）
+
+    Example:
+        truncate_to_tokens(long_text, 10)  # -> 不超过 10 个 token、以 "…" 结尾的前缀
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    if budget <= 0:
+        return ""
+    # 二分查找能放下的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid] + suffix) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + suffix
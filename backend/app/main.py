@@ -4,8 +4,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.routes import router
-from app.bot.client import bot_client
-from app.agent.agent import agent
+from app.session.manager import session_manager
 from app.config import settings
 
 
@@ -14,27 +13,24 @@ async def lifespan(app: FastAPI):
     """Application lifespan management"""
     # Startup
     print("🚀 Starting LLM-MC Backend...")
-    await bot_client.init()
     
-    # Start WebSocket listener for bot events
-    await bot_client.start_ws_listener()
-    print("✅ Backend ready!")
+    # Connect every bot session and start its WebSocket listener
+    await session_manager.start()
+    print(f"✅ Backend ready! ({len(session_manager.list_sessions())} bot session(s))")
     
     # Auto-start agent if enabled
     if settings.auto_start_agent:
         # Wait a bit for bot service to be ready
         await asyncio.sleep(2)
         print("🤖 Auto-starting Agent...")
-        await agent.start()
+        await session_manager.start_agents()
         print("✅ Agent started!")
     
     yield
     
     # Shutdown
     print("👋 Shutting down...")
-    if agent.is_running:
-        await agent.stop()
-    await bot_client.close()
+    await session_manager.close()
 
 
 app = FastAPI(
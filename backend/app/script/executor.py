@@ -8,17 +8,23 @@ from typing import Dict, Any, Optional, List
 from io import StringIO
 import sys
 
-from app.bot.client import bot_client
+from app.bot.client import BotClient, bot_client
+from app.bot.world import BlockRegion
+from app.config import settings
 from app.skills.manager import skill_manager
+from app.tracing import tracer
 
 
 class BotAPI:
     """
     Safe Bot API wrapper for script execution
     Provides async methods that scripts can call
+    
+    多 Bot 时每个会话传入自己的 BotClient，默认使用全局 bot_client
     """
     
-    def __init__(self):
+    def __init__(self, client: Optional[BotClient] = None):
+        self.client = client or bot_client
         self.results = []  # 存储执行过程中的结果
         self.logs = []     # 存储日志
         self._loaded_skills = {}  # 已加载的技能函数
@@ -30,73 +36,101 @@ class BotAPI:
     
     async def chat(self, message: str) -> Dict[str, Any]:
         """发送聊天消息"""
-        result = await bot_client.execute_action("chat", {"message": message})
+        result = await self.client.execute_action("chat", {"message": message})
         self.results.append({"action": "chat", "result": result})
         return result
     
     async def goTo(self, x: int, y: int, z: int) -> Dict[str, Any]:
         """移动到指定坐标"""
-        result = await bot_client.execute_action("goTo", {"x": x, "y": y, "z": z})
+        result = await self.client.execute_action("goTo", {"x": x, "y": y, "z": z})
         self.results.append({"action": "goTo", "result": result})
         return result
     
     async def followPlayer(self, playerName: str) -> Dict[str, Any]:
         """跟随玩家"""
-        result = await bot_client.execute_action("followPlayer", {"playerName": playerName})
+        result = await self.client.execute_action("followPlayer", {"playerName": playerName})
         self.results.append({"action": "followPlayer", "result": result})
         return result
     
     async def stopMoving(self) -> Dict[str, Any]:
         """停止移动"""
-        result = await bot_client.execute_action("stopMoving", {})
+        result = await self.client.execute_action("stopMoving", {})
         self.results.append({"action": "stopMoving", "result": result})
         return result
     
     async def jump(self) -> Dict[str, Any]:
         """跳跃"""
-        result = await bot_client.execute_action("jump", {})
+        result = await self.client.execute_action("jump", {})
         self.results.append({"action": "jump", "result": result})
         return result
     
     async def lookAt(self, x: int, y: int, z: int) -> Dict[str, Any]:
         """看向坐标"""
-        result = await bot_client.execute_action("lookAt", {"x": x, "y": y, "z": z})
+        result = await self.client.execute_action("lookAt", {"x": x, "y": y, "z": z})
         self.results.append({"action": "lookAt", "result": result})
         return result
     
     async def attack(self, entityType: str) -> Dict[str, Any]:
         """攻击实体"""
-        result = await bot_client.execute_action("attack", {"entityType": entityType})
+        result = await self.client.execute_action("attack", {"entityType": entityType})
         self.results.append({"action": "attack", "result": result})
         return result
     
     async def collectBlock(self, blockType: str) -> Dict[str, Any]:
         """挖掘方块"""
-        result = await bot_client.execute_action("collectBlock", {"blockType": blockType})
+        result = await self.client.execute_action("collectBlock", {"blockType": blockType})
         self.results.append({"action": "collectBlock", "result": result})
         return result
     
     async def wait(self, seconds: float) -> Dict[str, Any]:
         """等待"""
-        result = await bot_client.execute_action("wait", {"seconds": seconds})
+        result = await self.client.execute_action("wait", {"seconds": seconds})
         self.results.append({"action": "wait", "result": result})
         return result
     
     async def viewInventory(self) -> Dict[str, Any]:
-        """查看背包"""
-        result = await bot_client.execute_action("viewInventory", {})
+        """查看背包（背包镜像已同步时直接读取本地数据，无需往返）"""
+        result = await self.client.get_inventory()
         self.results.append({"action": "viewInventory", "result": result})
         return result
     
+    async def countItem(self, itemName: str) -> int:
+        """
+        统计背包中某种物品的总数
+        
+        Example:
+            logs = await bot.countItem("oak_log")
+        """
+        result = await self.client.get_inventory()
+        return sum(
+            item.get("count", 0)
+            for item in result.get("inventory", [])
+            if item.get("name") == itemName
+        )
+    
+    async def getBestItem(self, priority: list) -> Optional[str]:
+        """
+        按优先级返回背包中第一个拥有的物品名，都没有时返回 None
+        
+        Example:
+            pickaxe = await bot.getBestItem(["diamond_pickaxe", "iron_pickaxe", "stone_pickaxe"])
+        """
+        result = await self.client.get_inventory()
+        owned = {item.get("name") for item in result.get("inventory", [])}
+        for name in priority:
+            if name in owned:
+                return name
+        return None
+    
     async def equipItem(self, itemName: str) -> Dict[str, Any]:
         """装备物品"""
-        result = await bot_client.execute_action("equipItem", {"itemName": itemName})
+        result = await self.client.execute_action("equipItem", {"itemName": itemName})
         self.results.append({"action": "equipItem", "result": result})
         return result
     
     async def placeBlock(self, blockName: str, x: int, y: int, z: int) -> Dict[str, Any]:
         """放置方块"""
-        result = await bot_client.execute_action("placeBlock", {
+        result = await self.client.execute_action("placeBlock", {
             "blockName": blockName, "x": x, "y": y, "z": z
         })
         self.results.append({"action": "placeBlock", "result": result})
@@ -107,7 +141,7 @@ class BotAPI:
         params = {"itemName": itemName}
         if count is not None:
             params["count"] = count
-        result = await bot_client.execute_action("dropItem", params)
+        result = await self.client.execute_action("dropItem", params)
         self.results.append({"action": "dropItem", "result": result})
         return result
     
@@ -116,13 +150,13 @@ class BotAPI:
         params = {}
         if foodName:
             params["foodName"] = foodName
-        result = await bot_client.execute_action("eat", params)
+        result = await self.client.execute_action("eat", params)
         self.results.append({"action": "eat", "result": result})
         return result
     
     async def useItem(self) -> Dict[str, Any]:
         """使用当前手持物品（如使用弓箭、喝药水、使用末影珍珠等）"""
-        result = await bot_client.execute_action("useItem", {})
+        result = await self.client.execute_action("useItem", {})
         self.results.append({"action": "useItem", "result": result})
         return result
     
@@ -136,38 +170,181 @@ class BotAPI:
         Returns:
             交互结果
         """
-        result = await bot_client.execute_action("activateBlock", {"x": x, "y": y, "z": z})
+        result = await self.client.execute_action("activateBlock", {"x": x, "y": y, "z": z})
         self.results.append({"action": "activateBlock", "result": result})
         return result
     
     async def scanBlocks(self, blockTypes: list, range: int = 16) -> Dict[str, Any]:
         """扫描方块"""
-        result = await bot_client.execute_action("scanBlocks", {
+        result = await self.client.execute_action("scanBlocks", {
             "blockTypes": blockTypes, "range": range
         })
         self.results.append({"action": "scanBlocks", "result": result})
+        if settings.world_cache_enabled and result.get("success"):
+            for block_type, info in (result.get("results") or {}).items():
+                for pos in info.get("positions", []):
+                    self.client.world.put_name(pos["x"], pos["y"], pos["z"], block_type)
         return result
     
     async def findBlock(self, blockType: str, maxDistance: int = 32) -> Dict[str, Any]:
         """寻找方块"""
-        result = await bot_client.execute_action("findBlock", {
+        result = await self.client.execute_action("findBlock", {
             "blockType": blockType, "maxDistance": maxDistance
         })
         self.results.append({"action": "findBlock", "result": result})
+        if settings.world_cache_enabled and result.get("found"):
+            pos = result["position"]
+            self.client.world.put_name(pos["x"], pos["y"], pos["z"], result.get("blockName"))
         return result
     
     async def getBlockAt(self, x: int, y: int, z: int) -> Dict[str, Any]:
-        """获取方块信息"""
-        result = await bot_client.execute_action("getBlockAt", {"x": x, "y": y, "z": z})
+        """获取方块信息（本地方块缓存命中时不访问 Bot 服务）"""
+        result = self._get_cached_block(x, y, z)
+        if result is None:
+            result = await self.client.execute_action("getBlockAt", {"x": x, "y": y, "z": z})
+            self._remember_block(result)
         self.results.append({"action": "getBlockAt", "result": result})
         return result
-    
+
+    async def getBlocksAt(self, positions: list) -> List[Dict[str, Any]]:
+        """
+        批量获取多个位置的方块信息（一次往返）
+
+        Args:
+            positions: 坐标列表，每项为 (x, y, z) 或 {"x":..,"y":..,"z":..}
+
+        Returns:
+            与 positions 一一对应的 getBlockAt 结果列表
+
+        Example:
+            results = await bot.getBlocksAt([(10, 64, 5), (10, 65, 5)])
+            for r in results:
+                print(r.get("block", {}).get("name"))
+        """
+        coords = []
+        for pos in positions:
+            if isinstance(pos, dict):
+                coords.append((pos["x"], pos["y"], pos["z"]))
+            else:
+                x, y, z = pos
+                coords.append((x, y, z))
+
+        # 先查本地缓存，只把未命中的位置发给 Bot 服务
+        results = [self._get_cached_block(x, y, z) for x, y, z in coords]
+        misses = [i for i, r in enumerate(results) if r is None]
+        if misses:
+            fetched = await self.client.execute_actions([
+                {"action": "getBlockAt", "parameters": {"x": coords[i][0], "y": coords[i][1], "z": coords[i][2]}}
+                for i in misses
+            ])
+            for i, result in zip(misses, fetched):
+                self._remember_block(result)
+                results[i] = result
+
+        for result in results:
+            self.results.append({"action": "getBlockAt", "result": result})
+        return results
+
+    async def getRegion(self, x1: int, y1: int, z1: int, x2: int, y2: int, z2: int) -> Dict[str, Any]:
+        """
+        一次获取整个长方体区域内的方块（最多 32768 个），在本地按坐标查询
+
+        Args:
+            x1, y1, z1: 区域一角
+            x2, y2, z2: 区域对角（包含）
+
+        Returns:
+            {"success": True, "message": ..., "region": BlockRegion}
+            region 支持 nameAt(x, y, z) / blockAt(x, y, z) / contains / find(names) / count()
+
+        Example:
+            result = await bot.getRegion(x - 4, y - 4, z - 4, x + 3, y + 3, z + 3)
+            if result["success"]:
+                region = result["region"]
+                ores = region.find(["iron_ore", "deepslate_iron_ore"])
+        """
+        result = await self.client.execute_action("getRegion", {
+            "x1": x1, "y1": y1, "z1": z1, "x2": x2, "y2": y2, "z2": z2
+        })
+        # 结果记录中只保留摘要，原始数据较大且不适合序列化给 LLM
+        self.results.append({
+            "action": "getRegion",
+            "result": {"success": result.get("success"), "message": result.get("message")}
+        })
+        if not result.get("success"):
+            return result
+
+        region = BlockRegion(result["region"])
+        if settings.world_cache_enabled:
+            self.client.world.put_region(region)
+        return {"success": True, "message": result.get("message"), "region": region}
+
+    def _get_cached_block(self, x: int, y: int, z: int) -> Optional[Dict[str, Any]]:
+        """从方块缓存构造 getBlockAt 结果，未命中返回 None"""
+        if not settings.world_cache_enabled:
+            return None
+        block = self.client.world.get(x, y, z)
+        if block is None:
+            return None
+
+        # 距离按镜像中的 bot 位置估算
+        pos = self.client.state.get("position")
+        if pos:
+            dist = ((pos["x"] - x) ** 2 + (pos["y"] - y) ** 2 + (pos["z"] - z) ** 2) ** 0.5
+            block["distance"] = round(dist, 1)
+        return {
+            "success": True,
+            "message": f"Block at ({x}, {y}, {z}): {block['name']}",
+            "block": block,
+            "cached": True
+        }
+
+    def _remember_block(self, result: Dict[str, Any]):
+        """把 getBlockAt 结果写入方块缓存"""
+        if settings.world_cache_enabled and result.get("success") and result.get("block"):
+            self.client.world.put_block(result["block"])
+
+    async def batch(self, calls: list, stopOnError: bool = False) -> List[Dict[str, Any]]:
+        """
+        批量执行多个动作，按顺序执行并一次性返回全部结果
+
+        Args:
+            calls: 动作列表，每项为 {"action": 名称, "parameters": {...}} 或 (名称, 参数) 元组
+            stopOnError: 某个动作失败后跳过后续动作（默认 False）
+
+        Returns:
+            与 calls 一一对应的结果列表
+
+        Example:
+            results = await bot.batch([
+                ("lookAt", {"x": 0, "y": 64, "z": 0}),
+                ("chat", {"message": "hi"}),
+            ])
+        """
+        actions = []
+        for call in calls:
+            if isinstance(call, dict):
+                actions.append({"action": call["action"], "parameters": call.get("parameters") or {}})
+            else:
+                name, params = call
+                actions.append({"action": name, "parameters": params or {}})
+
+        if not actions:
+            return []
+
+        results = await self.client.execute_actions(actions, stop_on_error=stopOnError)
+        for action, result in zip(actions, results):
+            self.results.append({"action": action["action"], "result": result})
+            if action["action"] == "getBlockAt":
+                self._remember_block(result)
+        return results
+
     async def scanEntities(self, range: int = 16, entityType: str = None) -> Dict[str, Any]:
         """扫描实体"""
         params = {"range": range}
         if entityType:
             params["entityType"] = entityType
-        result = await bot_client.execute_action("scanEntities", params)
+        result = await self.client.execute_action("scanEntities", params)
         self.results.append({"action": "scanEntities", "result": result})
         return result
     
@@ -187,19 +364,19 @@ class BotAPI:
             for p in players['players']:
                 print(f"玩家 {p['name']} 在 {p.get('distance', '未知')} 格外")
         """
-        result = await bot_client.execute_action("listPlayers", {})
+        result = await self.client.execute_action("listPlayers", {})
         self.results.append({"action": "listPlayers", "result": result})
         return result
     
     async def canReach(self, x: int, y: int, z: int) -> Dict[str, Any]:
         """检查坐标是否可达（不实际移动）"""
-        result = await bot_client.execute_action("canReach", {"x": x, "y": y, "z": z})
+        result = await self.client.execute_action("canReach", {"x": x, "y": y, "z": z})
         self.results.append({"action": "canReach", "result": result})
         return result
     
     async def getPathTo(self, x: int, y: int, z: int) -> Dict[str, Any]:
         """获取到坐标的路径（不实际移动）"""
-        result = await bot_client.execute_action("getPathTo", {"x": x, "y": y, "z": z})
+        result = await self.client.execute_action("getPathTo", {"x": x, "y": y, "z": z})
         self.results.append({"action": "getPathTo", "result": result})
         return result
     
@@ -216,7 +393,7 @@ class BotAPI:
         Returns:
             合成结果
         """
-        result = await bot_client.execute_action("craft", {
+        result = await self.client.execute_action("craft", {
             "itemName": itemName, "count": count
         })
         self.results.append({"action": "craft", "result": result})
@@ -232,7 +409,7 @@ class BotAPI:
         Returns:
             配方列表
         """
-        result = await bot_client.execute_action("listRecipes", {"itemName": itemName})
+        result = await self.client.execute_action("listRecipes", {"itemName": itemName})
         self.results.append({"action": "listRecipes", "result": result})
         return result
     
@@ -251,7 +428,7 @@ class BotAPI:
         params = {"itemName": itemName, "count": count}
         if fuelName:
             params["fuelName"] = fuelName
-        result = await bot_client.execute_action("smelt", params)
+        result = await self.client.execute_action("smelt", params)
         self.results.append({"action": "smelt", "result": result})
         return result
     
@@ -265,13 +442,13 @@ class BotAPI:
         Returns:
             容器内容
         """
-        result = await bot_client.execute_action("openContainer", {"x": x, "y": y, "z": z})
+        result = await self.client.execute_action("openContainer", {"x": x, "y": y, "z": z})
         self.results.append({"action": "openContainer", "result": result})
         return result
     
     async def closeContainer(self) -> Dict[str, Any]:
         """关闭当前打开的容器"""
-        result = await bot_client.execute_action("closeContainer", {})
+        result = await self.client.execute_action("closeContainer", {})
         self.results.append({"action": "closeContainer", "result": result})
         return result
     
@@ -289,7 +466,7 @@ class BotAPI:
         params = {"itemName": itemName}
         if count is not None:
             params["count"] = count
-        result = await bot_client.execute_action("depositItem", params)
+        result = await self.client.execute_action("depositItem", params)
         self.results.append({"action": "depositItem", "result": result})
         return result
     
@@ -307,7 +484,7 @@ class BotAPI:
         params = {"itemName": itemName}
         if count is not None:
             params["count"] = count
-        result = await bot_client.execute_action("withdrawItem", params)
+        result = await self.client.execute_action("withdrawItem", params)
         self.results.append({"action": "withdrawItem", "result": result})
         return result
     
@@ -321,7 +498,7 @@ class BotAPI:
         Returns:
             工作台位置信息
         """
-        result = await bot_client.execute_action("findCraftingTable", {"maxDistance": maxDistance})
+        result = await self.client.execute_action("findCraftingTable", {"maxDistance": maxDistance})
         self.results.append({"action": "findCraftingTable", "result": result})
         return result
     
@@ -335,7 +512,7 @@ class BotAPI:
         Returns:
             熔炉位置信息
         """
-        result = await bot_client.execute_action("findFurnace", {"maxDistance": maxDistance})
+        result = await self.client.execute_action("findFurnace", {"maxDistance": maxDistance})
         self.results.append({"action": "findFurnace", "result": result})
         return result
     
@@ -349,7 +526,7 @@ class BotAPI:
         Returns:
             容器位置信息
         """
-        result = await bot_client.execute_action("findChest", {"maxDistance": maxDistance})
+        result = await self.client.execute_action("findChest", {"maxDistance": maxDistance})
         self.results.append({"action": "findChest", "result": result})
         return result
     
@@ -374,7 +551,7 @@ class BotAPI:
         params = {}
         if entityType:
             params["entityType"] = entityType
-        result = await bot_client.execute_action("mountEntity", params)
+        result = await self.client.execute_action("mountEntity", params)
         self.results.append({"action": "mountEntity", "result": result})
         return result
     
@@ -388,7 +565,7 @@ class BotAPI:
         Example:
             await bot.dismount()  # 下马/下船
         """
-        result = await bot_client.execute_action("dismount", {})
+        result = await self.client.execute_action("dismount", {})
         self.results.append({"action": "dismount", "result": result})
         return result
     
@@ -409,7 +586,7 @@ class BotAPI:
             
             await bot.useOnEntity("villager")  # 与村民交易
         """
-        result = await bot_client.execute_action("useOnEntity", {
+        result = await self.client.execute_action("useOnEntity", {
             "entityType": entityType, "hand": hand
         })
         self.results.append({"action": "useOnEntity", "result": result})
@@ -433,7 +610,7 @@ class BotAPI:
                 for r in recipe["recipes"]:
                     print(f"材料: {r['ingredients']}, 需要工作台: {r['needsCraftingTable']}")
         """
-        result = await bot_client.execute_action("getRecipeData", {"itemName": itemName})
+        result = await self.client.execute_action("getRecipeData", {"itemName": itemName})
         self.results.append({"action": "getRecipeData", "result": result})
         return result
     
@@ -450,26 +627,26 @@ class BotAPI:
             if "diamond_pickaxe" in all_recipes["recipes"]:
                 print("钻石镐可以合成")
         """
-        result = await bot_client.execute_action("getAllRecipes", {})
+        result = await self.client.execute_action("getAllRecipes", {})
         self.results.append({"action": "getAllRecipes", "result": result})
         return result
     
     async def getObservation(self) -> Dict[str, Any]:
         """获取当前观察状态"""
-        return await bot_client.get_observation()
+        return await self.client.get_observation()
     
     async def getStatus(self) -> Dict[str, Any]:
         """获取Bot状态"""
-        return await bot_client.get_status()
+        return await self.client.get_status()
     
     async def getPosition(self) -> Dict[str, Any]:
         """获取当前位置"""
-        observation = await bot_client.get_observation()
+        observation = await self.client.get_observation()
         return observation.get("position", {"x": 0, "y": 0, "z": 0})
     
     async def getHealth(self) -> Dict[str, Any]:
         """获取生命值和饥饿值"""
-        observation = await bot_client.get_observation()
+        observation = await self.client.get_observation()
         return observation.get("health", {"health": 20, "food": 20})
     
     # ===== 事件等待方法 =====
@@ -518,7 +695,7 @@ class BotAPI:
             )
         """
         self.log(f"等待事件: {event_type} (超时: {timeout}秒)")
-        result = await bot_client.wait_for_event(event_type, filter_func, timeout)
+        result = await self.client.wait_for_event(event_type, filter_func, timeout)
         
         if result:
             self.log(f"收到事件: {event_type}")
@@ -764,7 +941,12 @@ class ScriptExecutor:
             'asyncio', 'math', 'random', 'json', 'time', 're'
         }
     
-    async def execute(self, script: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+    async def execute(
+        self,
+        script: str,
+        timeout: Optional[float] = None,
+        client: Optional[BotClient] = None
+    ) -> Dict[str, Any]:
         """
         Execute Python script code
         
@@ -779,8 +961,9 @@ class ScriptExecutor:
         Args:
             script: The Python code to execute
             timeout: Execution timeout in seconds (uses default if not provided)
+            client: BotClient of the bot to control (defaults to the global bot_client)
         """
-        bot_api = BotAPI()
+        bot_api = BotAPI(client)
         effective_timeout = timeout if timeout is not None else self.timeout
         
         # 捕获stdout
@@ -824,7 +1007,8 @@ class ScriptExecutor:
             safe_locals = {}
             
             # 编译并执行代码
-            exec(compile(script, '<script>', 'exec'), safe_globals, safe_locals)
+            with tracer.span("script.compile", "script", chars=len(script)):
+                exec(compile(script, '<script>', 'exec'), safe_globals, safe_locals)
             
             # 检查是否定义了main函数
             if 'main' not in safe_locals:
@@ -840,10 +1024,12 @@ class ScriptExecutor:
             import time
             start_time = time.time()
             try:
-                result = await asyncio.wait_for(
-                    main_func(bot_api),
-                    timeout=effective_timeout
-                )
+                with tracer.span("script.run", "script") as span:
+                    result = await asyncio.wait_for(
+                        main_func(bot_api),
+                        timeout=effective_timeout
+                    )
+                    span["actions"] = len(bot_api.results)
             except asyncio.TimeoutError:
                 return {
                     "success": False,
@@ -0,0 +1,3 @@
+from .manager import BotSession, SessionManager, session_manager, DEFAULT_BOT_ID
+
+__all__ = ["BotSession", "SessionManager", "session_manager", "DEFAULT_BOT_ID"]
@@ -0,0 +1,179 @@
+"""
+Bot Session Manager for LLM-MC
+One backend process drives several bots, each with its own BotClient, Agent and TaskManager
+"""
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List
+
+from app.agent.agent import Agent, agent
+from app.bot.client import BotClient, bot_client
+from app.bot.transport import create_transport
+from app.config import settings
+from app.task.manager import TaskManager, task_manager
+
+
+DEFAULT_BOT_ID = "default"
+
+# Bot ID 出现在 URL 和日志中，只允许字母、数字、下划线和连字符
+BOT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+
+@dataclass
+class BotSession:
+    """一个 Bot 的运行时：连接、决策循环和后台任务"""
+    bot_id: str
+    service_url: str
+    client: BotClient
+    agent: Agent
+    tasks: TaskManager
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "bot_id": self.bot_id,
+            "service_url": self.service_url,
+            "ws_connected": self.client.ws_connection is not None,
+            "agent_running": self.agent.is_running,
+            "active_tasks": len(self.tasks.running_tasks)
+        }
+
+
+def parse_bot_sessions(value: str) -> Dict[str, str]:
+    """
+    解析 bot_sessions 配置
+    
+    Example:
+        parse_bot_sessions("miner=http://localhost:3002, farmer=unix:///run/farmer.sock")
+        # -> {"miner": "http://localhost:3002", "farmer": "unix:///run/farmer.sock"}
+    """
+    sessions = {}
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        bot_id, sep, url = entry.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid bot session entry: {entry!r} (expected id=url)")
+        sessions[bot_id.strip()] = url.strip()
+    return sessions
+
+
+class SessionManager:
+    """
+    Bot 会话注册表
+    
+    - 默认会话使用原有的全局 bot_client / agent / task_manager，单 Bot 部署不受影响
+    - 其他会话按 ID 注册，各自连接自己的 Bot 服务
+    - LLM 客户端和技能库由所有会话共享
+    """
+    
+    def __init__(self):
+        self._sessions: Dict[str, BotSession] = {
+            DEFAULT_BOT_ID: BotSession(
+                bot_id=DEFAULT_BOT_ID,
+                service_url=settings.bot_service_url,
+                client=bot_client,
+                agent=agent,
+                tasks=task_manager
+            )
+        }
+        self._started = False
+    
+    def get(self, bot_id: str) -> Optional[BotSession]:
+        """获取会话"""
+        return self._sessions.get(bot_id)
+    
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """列出所有会话"""
+        return [session.to_dict() for session in self._sessions.values()]
+    
+    async def create(self, bot_id: str, service_url: str, start_agent: bool = False) -> BotSession:
+        """
+        注册一个新的 Bot 会话
+        
+        Args:
+            bot_id: 会话 ID
+            service_url: 该 Bot 的 Bot 服务地址（http:// 或 unix://）
+            start_agent: 是否立即启动 Agent
+            
+        Raises:
+            ValueError: ID 不合法或已存在
+        """
+        if not BOT_ID_PATTERN.match(bot_id):
+            raise ValueError(f"Invalid bot id '{bot_id}'")
+        if bot_id in self._sessions:
+            raise ValueError(f"Bot '{bot_id}' already exists")
+        
+        client = BotClient(transport=create_transport(service_url))
+        tasks = TaskManager()
+        session = BotSession(
+            bot_id=bot_id,
+            service_url=service_url,
+            client=client,
+            agent=Agent(bot_id=bot_id, client=client, tasks=tasks),
+            tasks=tasks
+        )
+        self._sessions[bot_id] = session
+        
+        # 后端已启动后注册的会话立即连接
+        if self._started:
+            await self._connect(session)
+            if start_agent:
+                await session.agent.start()
+        
+        print(f"[Sessions] Registered bot '{bot_id}' at {service_url}")
+        return session
+    
+    async def remove(self, bot_id: str) -> bool:
+        """
+        停止并移除会话（默认会话不能移除）
+        
+        Returns:
+            是否成功移除
+        """
+        if bot_id == DEFAULT_BOT_ID:
+            return False
+        session = self._sessions.pop(bot_id, None)
+        if not session:
+            return False
+        
+        await self._shutdown(session)
+        print(f"[Sessions] Removed bot '{bot_id}'")
+        return True
+    
+    async def start(self):
+        """连接所有会话（包括 bot_sessions 中配置的会话），按配置自动启动 Agent"""
+        for bot_id, service_url in parse_bot_sessions(settings.bot_sessions).items():
+            await self.create(bot_id, service_url)
+        
+        await asyncio.gather(*(self._connect(s) for s in self._sessions.values()))
+        self._started = True
+    
+    async def start_agents(self):
+        """启动所有会话的 Agent"""
+        for session in self._sessions.values():
+            await session.agent.start()
+    
+    async def close(self):
+        """停止所有会话"""
+        await asyncio.gather(
+            *(self._shutdown(s) for s in self._sessions.values()),
+            return_exceptions=True
+        )
+        self._started = False
+    
+    async def _connect(self, session: BotSession):
+        await session.client.init()
+        await session.client.start_ws_listener()
+    
+    async def _shutdown(self, session: BotSession):
+        if session.agent.is_running:
+            await session.agent.stop()
+        await session.tasks.cancel_all_tasks()
+        await session.client.close()
+
+
+# 全局会话管理器实例
+session_manager = SessionManager()
@@ -40,6 +40,8 @@ class SkillManager:
         
         # 内存中的技能索引
         self._index: Dict[str, dict] = {}
+        # 索引每次保存时递增（用于判断技能提示词是否需要重建）
+        self.version = 0
         
         # 加载索引
         self._load_index()
@@ -58,6 +60,7 @@ class SkillManager:
     
     def _save_index(self):
         """保存技能索引到文件"""
+        self.version += 1
         try:
             with open(self.index_file, 'w', encoding='utf-8') as f:
                 json.dump(self._index, f, ensure_ascii=False, indent=2)
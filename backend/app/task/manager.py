@@ -79,6 +79,8 @@ class TaskManager:
         self._tasks: Dict[str, Task] = {}
         self._task_history: List[Task] = []  # 已完成的任务历史
         self._max_history = 20  # 最多保留20条历史
+        self._last_result: Optional[Task] = None  # 最近一次同步执行的操作（如 executeScript），不占用任务历史
+        self._done_callbacks: List[Callable[[Task], None]] = []  # 任务结束（完成/失败/取消）时的回调
     
     @property
     def current_task(self) -> Optional[Task]:
@@ -158,12 +160,61 @@ class TaskManager:
             finally:
                 # 移动到历史
                 self._move_to_history(task_id)
+                self._notify_done(task)
         
         # 启动异步任务
-        task._async_task = asyncio.create_task(wrapped_coroutine())
+        task._async_task = asyncio.create_task(wrapped_coroutine(), name=f"task:{task.name}")
         
         return task
     
+    def record_result(
+        self,
+        name: str,
+        description: str,
+        result: Dict[str, Any],
+        started_at: Optional[float] = None
+    ) -> Task:
+        """
+        记录已经同步执行完的操作（如 executeScript）的完整结果
+        
+        只保留最近一次，单独存放而不进入任务历史（避免频繁的脚本调用挤掉后台任务的历史）。
+        完整结果（logs、每个调用的结果）供 /api/tasks/{id} 查看，
+        不需要放进 LLM 提示词；不触发任务结束回调
+        
+        Returns:
+            记录的任务对象
+        """
+        success = bool(result.get("success", False))
+        task = Task(
+            id=str(uuid.uuid4())[:8],
+            name=name,
+            description=description,
+            status=TaskStatus.COMPLETED if success else TaskStatus.FAILED,
+            progress="执行完成" if success else "执行失败",
+            result=result,
+            error=None if success else str(result.get("error") or result.get("message", "")),
+            started_at=started_at,
+            completed_at=time.time()
+        )
+        self._last_result = task
+        return task
+    
+    def add_done_callback(self, callback: Callable[[Task], None]):
+        """注册任务结束回调（同步调用，不应阻塞）"""
+        self._done_callbacks.append(callback)
+    
+    def remove_done_callback(self, callback: Callable[[Task], None]):
+        """移除任务结束回调"""
+        if callback in self._done_callbacks:
+            self._done_callbacks.remove(callback)
+    
+    def _notify_done(self, task: Task):
+        for callback in list(self._done_callbacks):
+            try:
+                callback(task)
+            except Exception as e:
+                print(f"[TaskManager] Done callback error: {e}")
+    
     def _move_to_history(self, task_id: str):
         """将任务移动到历史记录"""
         if task_id in self._tasks:
@@ -182,6 +233,8 @@ class TaskManager:
         for task in self._task_history:
             if task.id == task_id:
                 return task
+        if self._last_result and self._last_result.id == task_id:
+            return self._last_result
         return None
     
     def update_progress(self, task_id: str, progress: str):
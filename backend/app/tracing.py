@@ -0,0 +1,175 @@
+"""
+Lightweight span tracing
+Records timed spans (tick phases, LLM calls, bot requests, scripts) into an
+in-memory ring buffer, exportable as Chrome trace events (chrome://tracing / Perfetto)
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List
+
+from app.config import settings
+
+
+# 轨道数上限，超出后新的任务都记到 "other"
+MAX_LANES = 64
+
+
+class Tracer:
+    """
+    Span 记录器
+
+    每个 span 记录名称、分类、开始时间、耗时和参数；同一个命名 asyncio 任务中的
+    span 放在同一条轨道（Chrome trace 的 tid）上，嵌套关系由时间范围体现。
+    未命名的任务（Task-N，如 HTTP 请求处理）共用 "other" 轨道
+
+    Example:
+        with tracer.span("llm.chat", "llm", model="gpt-4") as args:
+            response = await ...
+            args["tokens"] = 123
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.spans: deque = deque(maxlen=capacity)
+        self._origin = time.perf_counter()
+        self._origin_wall = time.time()
+        self._lanes: Dict[str, int] = {}
+        self.dropped = 0
+
+    @contextmanager
+    def span(self, name: str, cat: str = "app", **args):
+        """
+        记录一个 span，产出的 args 字典可以在 span 内补充参数
+
+        异常会记录到 args["error"] 后继续抛出
+        """
+        if not settings.trace_enabled:
+            yield args
+            return
+        lane = self._lane()
+        start = time.perf_counter()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            self._record(name, cat, lane, start, time.perf_counter() - start, args)
+
+    def _lane(self) -> int:
+        """当前 asyncio 任务对应的轨道编号"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        name = task.get_name() if task else "main"
+        if name.startswith("Task-"):
+            name = "other"
+        if name not in self._lanes:
+            if len(self._lanes) >= MAX_LANES:
+                name = "other"
+            self._lanes.setdefault(name, len(self._lanes) + 1)
+        return self._lanes[name]
+
+    def _record(self, name: str, cat: str, lane: int, start: float, duration: float, args: Dict[str, Any]):
+        if len(self.spans) == self.spans.maxlen:
+            self.dropped += 1
+        self.spans.append((name, cat, lane, start - self._origin, duration, args))
+
+    def clear(self):
+        self.spans.clear()
+        self.dropped = 0
+
+    def _select(self, limit: Optional[int], name: Optional[str]) -> List[tuple]:
+        spans = [s for s in self.spans if not name or s[0].startswith(name)]
+        return spans[-limit:] if limit else spans
+
+    def to_chrome_trace(self, limit: Optional[int] = None, name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        导出 Chrome trace-event 格式（可直接在 chrome://tracing 或 ui.perfetto.dev 中打开）
+
+        Args:
+            limit: 只导出最近的 N 个 span
+            name: 只导出名称以此开头的 span（如 "llm."）
+        """
+        events: List[Dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": "LLM-MC Backend"}}
+        ]
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": lane}}
+            for lane, tid in self._lanes.items()
+        )
+        events.extend(
+            {
+                "name": span_name,
+                "cat": cat,
+                "ph": "X",
+                "pid": 1,
+                "tid": lane,
+                "ts": round(start * 1e6, 1),
+                "dur": round(duration * 1e6, 1),
+                "args": _jsonable(args)
+            }
+            for span_name, cat, lane, start, duration, args in self._select(limit, name)
+        )
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"origin": self._origin_wall, "dropped": self.dropped}
+        }
+
+    def to_json(self, limit: Optional[int] = None, name: Optional[str] = None) -> Dict[str, Any]:
+        """导出 span 列表（毫秒、墙上时间）以及按名称汇总的耗时统计"""
+        spans = self._select(limit, name)
+        lanes = {tid: lane for lane, tid in self._lanes.items()}
+
+        durations: Dict[str, List[float]] = {}
+        for span_name, _, _, _, duration, _ in spans:
+            durations.setdefault(span_name, []).append(duration * 1000)
+
+        summary = {}
+        for span_name, values in sorted(durations.items()):
+            values.sort()
+            summary[span_name] = {
+                "count": len(values),
+                "avg_ms": round(sum(values) / len(values), 2),
+                "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+                "max_ms": round(values[-1], 2)
+            }
+
+        return {
+            "spans": [
+                {
+                    "name": span_name,
+                    "cat": cat,
+                    "lane": lanes.get(lane),
+                    "start": round(self._origin_wall + start, 6),
+                    "duration_ms": round(duration * 1000, 3),
+                    "args": _jsonable(args)
+                }
+                for span_name, cat, lane, start, duration, args in spans
+            ],
+            "summary": summary,
+            "dropped": self.dropped
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.trace_enabled,
+            "spans": len(self.spans),
+            "capacity": self.spans.maxlen,
+            "dropped": self.dropped
+        }
+
+
+def _jsonable(args: Dict[str, Any]) -> Dict[str, Any]:
+    """span 参数中非基本类型的值转为字符串"""
+    return {
+        k: v if isinstance(v, (str, int, float, bool)) or v is None else str(v)
+        for k, v in args.items()
+    }
+
+
+# 全局 Tracer
+tracer = Tracer(capacity=settings.trace_buffer_size)
@@ -288,26 +288,27 @@ async def find_valid_placement_position(bot):
         (2, 0, 0), (-2, 0, 0), (0, 0, 2), (0, 0, -2),
     ]
     
+    # 一次取回覆盖所有候选位置（及其下方一格）的区域，在本地判断
+    region_result = await bot.getRegion(bot_x - 2, bot_y - 2, bot_z - 2, bot_x + 2, bot_y + 1, bot_z + 2)
+    if not region_result.get("success"):
+        bot.log(f"获取周围方块失败: {region_result.get('message')}")
+        return None
+    region = region_result["region"]
+    
     for dx, dy, dz in offsets:
         target_x = bot_x + dx
         target_y = bot_y + dy
         target_z = bot_z + dz
         
-        # 检查目标位置
-        target_block = await bot.getBlockAt(target_x, target_y, target_z)
-        if not target_block.get("success"):
-            continue
-        
-        # 目标位置必须是空气
-        if target_block.get("block", {}).get("name") != "air":
+        # 目标位置必须是空气（未加载的方块为 None）
+        if region.nameAt(target_x, target_y, target_z) != "air":
             continue
         
         # 检查下方是否有支撑
-        below_block = await bot.getBlockAt(target_x, target_y - 1, target_z)
-        if not below_block.get("success"):
+        below_name = region.nameAt(target_x, target_y - 1, target_z)
+        if below_name is None:
             continue
         
-        below_name = below_block.get("block", {}).get("name", "air")
         # 下方必须是实体方块（不是空气、水、岩浆等）
         invalid_supports = {"air", "water", "lava", "cave_air", "void_air"}
         if below_name in invalid_supports:
@@ -42,16 +42,12 @@ async def 挖矿(bot, oreType="iron_ore", count=5):
             "wooden_pickaxe",
         ]
         
-        inventory = await bot.viewInventory()
-        items = inventory.get("inventory", [])
-        
-        for pickaxe in pickaxe_priority:
-            for item in items:
-                if item.get("name") == pickaxe:
-                    result = await bot.equipItem(pickaxe)
-                    if result.get("success"):
-                        bot.log(f"装备了 {pickaxe}")
-                        return pickaxe
+        pickaxe = await bot.getBestItem(pickaxe_priority)
+        if pickaxe:
+            result = await bot.equipItem(pickaxe)
+            if result.get("success"):
+                bot.log(f"装备了 {pickaxe}")
+                return pickaxe
         
         bot.log("没有找到镐子，使用空手")
         return None
@@ -110,6 +106,8 @@ async def 挖矿(bot, oreType="iron_ore", count=5):
                         "wall_torch", "redstone_torch", "soul_torch", "lantern",
                         "soul_lantern", "chain", "iron_bars", "glass", "glass_pane"]
         
+        # 先收集视线上所有需要检查的位置，再一次性批量查询
+        check_positions = []
         for i in range(1, steps):
             t = i / steps
             check_x = int(cur_x + dx * t)
@@ -122,7 +120,13 @@ async def 挖矿(bot, oreType="iron_ore", count=5):
                 check_z == int(target_pos.get("z"))):
                 continue
             
-            block_result = await bot.getBlockAt(check_x, check_y, check_z)
+            # 相邻采样点可能落在同一方块内，去重
+            if check_positions and check_positions[-1] == (check_x, check_y, check_z):
+                continue
+            check_positions.append((check_x, check_y, check_z))
+        
+        block_results = await bot.getBlocksAt(check_positions)
+        for (check_x, check_y, check_z), block_result in zip(check_positions, block_results):
             if block_result.get("success"):
                 block = block_result.get("block", {})
                 block_name = block.get("name", "air")
@@ -180,6 +184,7 @@ async def 挖矿(bot, oreType="iron_ore", count=5):
             
             # 检查前方需要挖掘的方块
             blocks_to_dig = []
+            check_positions = []
             
             # 检查前方1-2格的方块（水平方向）
             for step in [1, 2]:
@@ -188,46 +193,26 @@ async def 挖矿(bot, oreType="iron_ore", count=5):
                 
                 # 检查脚下和头部高度
                 for y_offset in [0, 1]:
-                    check_y = int(cur_y) + y_offset
-                    block_result = await bot.getBlockAt(check_x, check_y, check_z)
-                    if block_result.get("success"):
-                        block = block_result.get("block", {})
-                        block_name = block.get("name", "air")
-                        if block_name not in unbreakable:
-                            blocks_to_dig.append({
-                                "x": check_x,
-                                "y": check_y,
-                                "z": check_z,
-                                "name": block_name
-                            })
+                    check_positions.append((check_x, int(cur_y) + y_offset, check_z))
             
             # 如果目标在上方，需要挖掘上方的方块
             if dy > 0.3:
-                check_x = int(cur_x)
-                check_y = int(cur_y) + 2
-                check_z = int(cur_z)
-                block_result = await bot.getBlockAt(check_x, check_y, check_z)
-                if block_result.get("success"):
-                    block = block_result.get("block", {})
-                    block_name = block.get("name", "air")
-                    if block_name not in unbreakable:
-                        blocks_to_dig.append({
-                            "x": check_x,
-                            "y": check_y,
-                            "z": check_z,
-                            "name": block_name
-                        })
+                check_positions.append((int(cur_x), int(cur_y) + 2, int(cur_z)))
             
             # 如果目标在下方，需要挖掘脚下的方块
             if dy < -0.3:
-                check_x = int(cur_x)
-                check_y = int(cur_y) - 1
-                check_z = int(cur_z)
-                block_result = await bot.getBlockAt(check_x, check_y, check_z)
-                if block_result.get("success"):
-                    block = block_result.get("block", {})
-                    block_name = block.get("name", "air")
-                    if block_name not in unbreakable:
+                check_positions.append((int(cur_x), int(cur_y) - 1, int(cur_z)))
+            
+            # 一次取回覆盖所有候选位置的区域，在本地判断
+            xs = [p[0] for p in check_positions]
+            ys = [p[1] for p in check_positions]
+            zs = [p[2] for p in check_positions]
+            region_result = await bot.getRegion(min(xs), min(ys), min(zs), max(xs), max(ys), max(zs))
+            if region_result.get("success"):
+                region = region_result["region"]
+                for check_x, check_y, check_z in check_positions:
+                    block_name = region.nameAt(check_x, check_y, check_z)
+                    if block_name and block_name not in unbreakable:
                         blocks_to_dig.append({
                             "x": check_x,
                             "y": check_y,
@@ -0,0 +1,105 @@
+"""
+Streaming decisions: conversation history and fast-model escalation
+
+Run from backend/: python -m pytest tests  (or python -m unittest discover tests)
+"""
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from app.config import settings
+from app.llm.client import LLMClient
+
+
+class FakeStream:
+    """模拟 openai 的 AsyncStream：按块返回文本"""
+
+    def __init__(self, text: str, size: int = 8):
+        self.chunks = [text[i:i + size] for i in range(0, len(text), size)]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))], usage=None)
+
+    async def close(self):
+        pass
+
+
+class StreamWithHistoryTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._saved = (settings.use_conversation_history, settings.llm_fast_model)
+        settings.use_conversation_history = True
+        settings.llm_fast_model = ""
+        self.requests = []
+
+        async def create(**kwargs):
+            self.requests.append(kwargs["messages"])
+            return FakeStream('{"action": "wait", "parameters": {}, "thought": "等一下"}')
+
+        self.client = LLMClient()
+        self.client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    async def asyncTearDown(self):
+        settings.use_conversation_history, settings.llm_fast_model = self._saved
+
+    async def test_early_decision_resolves(self):
+        stream = self.client.chat_json_stream("system", "observation 1", conversation_id="bot")
+        decision = await asyncio.wait_for(stream.early_decision(), timeout=2)
+        self.assertEqual(decision["action"], "wait")
+        full = await asyncio.wait_for(stream.task, timeout=2)
+        self.assertEqual(full["thought"], "等一下")
+        self.assertEqual(self.client.get_history_length("bot"), 2)
+
+    async def test_next_stream_sees_previous_turn(self):
+        first = self.client.chat_json_stream("system", "observation 1", conversation_id="bot")
+        # 上一个流式请求还没写完历史时就开始下一个
+        second = self.client.chat_json_stream("system", "observation 2", conversation_id="bot")
+        await asyncio.wait_for(asyncio.gather(first.task, second.task), timeout=2)
+
+        contents = [m["content"] for m in self.requests[1]]
+        self.assertIn("observation 1", contents)
+        self.assertEqual(contents[-1], "observation 2")
+
+
+
+class FastStreamEscalationTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._saved = (settings.use_conversation_history, settings.llm_fast_model)
+        settings.use_conversation_history = False
+        settings.llm_fast_model = "fast-model"
+        self.replies = {
+            "fast-model": '{"action": "wait", "confidence": 0.2, "parameters": {}, "thought": "不确定"}',
+            settings.llm_model: '{"action": "chat", "confidence": 0.9, "parameters": {"message": "hi"}}'
+        }
+
+        async def create(**kwargs):
+            return FakeStream(self.replies[kwargs["model"]])
+
+        self.client = LLMClient()
+        self.client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    async def asyncTearDown(self):
+        settings.use_conversation_history, settings.llm_fast_model = self._saved
+
+    async def test_low_confidence_escalates_before_dispatch(self):
+        stream = self.client.chat_json_stream("system", "observation", route={"chat": []})
+        decision = await asyncio.wait_for(stream.early_decision(), timeout=2)
+        self.assertEqual(decision["action"], "chat")
+        self.assertEqual(self.client.router.escalations, {"low_confidence": 1})
+
+    async def test_confident_fast_decision_is_used(self):
+        self.replies["fast-model"] = '{"action": "wait", "confidence": 0.95, "parameters": {}}'
+        stream = self.client.chat_json_stream("system", "observation", route={"chat": []})
+        decision = await asyncio.wait_for(stream.early_decision(), timeout=2)
+        self.assertEqual(decision["action"], "wait")
+        self.assertEqual(self.client.router.escalations, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
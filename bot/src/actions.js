@@ -3,6 +3,9 @@ const { goals } = pathfinderPkg;
 import Vec3 from 'vec3';
 import minecraftData from 'minecraft-data';
 
+// getRegion 单次允许读取的最大方块数（32x32x32）
+const MAX_REGION_VOLUME = 32768;
+
 /**
  * Action system for the bot
  * Provides high-level actions that can be invoked via API
@@ -109,6 +112,14 @@ export class Actions {
           z: 'number - Z coordinate'
         }
       },
+      {
+        name: 'getRegion',
+        description: 'Get all blocks in a box as a palette plus a base64 index array (x fastest, then z, then y)',
+        parameters: {
+          x1: 'number - Corner 1 X', y1: 'number - Corner 1 Y', z1: 'number - Corner 1 Z',
+          x2: 'number - Corner 2 X', y2: 'number - Corner 2 Y', z2: 'number - Corner 2 Z'
+        }
+      },
       {
         name: 'scanEntities',
         description: 'Scan all entities within range and return detailed information',
@@ -321,6 +332,8 @@ export class Actions {
           return await this.findBlock(params.blockType, params.maxDistance);
         case 'getBlockAt':
           return await this.getBlockAt(params.x, params.y, params.z);
+        case 'getRegion':
+          return await this.getRegion(params.x1, params.y1, params.z1, params.x2, params.y2, params.z2);
         case 'scanEntities':
           return await this.scanEntities(params.range, params.entityType);
         case 'listPlayers':
@@ -378,6 +391,42 @@ export class Actions {
     }
   }
 
+  /**
+   * Execute an ordered list of actions in one request
+   * 按顺序逐个执行，每个动作的结果按相同位置返回
+   * @param {Array<{action: string, parameters: object}>} calls
+   * @param {boolean} stopOnError - 某个动作失败后跳过剩余动作
+   * @returns {Promise<{success: boolean, message: string, results: Array}>}
+   */
+  async executeBatch(calls, stopOnError = false) {
+    const results = [];
+    let failed = 0;
+    let stopped = false;
+
+    for (const call of calls) {
+      if (stopped) {
+        results.push({ success: false, skipped: true, message: 'Skipped after earlier failure' });
+        continue;
+      }
+
+      const result = call?.action
+        ? await this.execute(call.action, call.parameters || {})
+        : { success: false, message: 'Action required' };
+      results.push(result);
+
+      if (!result.success) {
+        failed++;
+        if (stopOnError) stopped = true;
+      }
+    }
+
+    return {
+      success: failed === 0,
+      message: `Executed ${calls.length} actions, ${failed} failed`,
+      results
+    };
+  }
+
   /**
    * Send chat message
    */
@@ -1019,6 +1068,73 @@ export class Actions {
     };
   }
 
+  /**
+   * Get every block in a box in one response
+   * 返回调色板 + 索引数组：indices[i] 指向 palette 中的条目，
+   * 索引顺序为 x 变化最快，其次 z，最后 y；未加载的方块对应 name 为 null 的条目
+   */
+  async getRegion(x1, y1, z1, x2, y2, z2) {
+    const minX = Math.floor(Math.min(x1, x2)), maxX = Math.floor(Math.max(x1, x2));
+    const minY = Math.floor(Math.min(y1, y2)), maxY = Math.floor(Math.max(y1, y2));
+    const minZ = Math.floor(Math.min(z1, z2)), maxZ = Math.floor(Math.max(z1, z2));
+    const sizeX = maxX - minX + 1, sizeY = maxY - minY + 1, sizeZ = maxZ - minZ + 1;
+    const volume = sizeX * sizeY * sizeZ;
+
+    if (!Number.isFinite(volume)) {
+      return { success: false, message: 'Invalid region coordinates' };
+    }
+    if (volume > MAX_REGION_VOLUME) {
+      return { success: false, message: `Region too large: ${volume} blocks (max ${MAX_REGION_VOLUME})` };
+    }
+
+    const palette = [];
+    const paletteIndex = new Map();
+    const indices = new Uint16Array(volume);
+    const pos = new Vec3(0, 0, 0);
+    let i = 0;
+
+    for (let y = minY; y <= maxY; y++) {
+      for (let z = minZ; z <= maxZ; z++) {
+        for (let x = minX; x <= maxX; x++) {
+          pos.set(x, y, z);
+          const block = this.mcBot.blockAt(pos);
+          const key = block ? block.name : null;
+
+          let index = paletteIndex.get(key);
+          if (index === undefined) {
+            index = palette.length;
+            paletteIndex.set(key, index);
+            palette.push(block ? {
+              name: block.name,
+              displayName: block.displayName,
+              type: block.type,
+              hardness: block.hardness,
+              diggable: block.diggable,
+              transparent: block.transparent
+            } : { name: null });
+          }
+          indices[i++] = index;
+        }
+      }
+    }
+
+    // 调色板不超过 256 项时用单字节索引
+    const small = palette.length <= 256;
+    const data = small ? Uint8Array.from(indices) : indices;
+
+    return {
+      success: true,
+      message: `Region (${minX}, ${minY}, ${minZ}) to (${maxX}, ${maxY}, ${maxZ}): ${volume} blocks, ${palette.length} types`,
+      region: {
+        origin: { x: minX, y: minY, z: minZ },
+        size: { x: sizeX, y: sizeY, z: sizeZ },
+        palette,
+        encoding: small ? 'uint8' : 'uint16le',
+        data: Buffer.from(data.buffer, data.byteOffset, data.byteLength).toString('base64')
+      }
+    };
+  }
+
   /**
    * Drop items from inventory
    * Returns ALL dropped item entity IDs for tracking (handles stacks that split into multiple entities)
@@ -0,0 +1,75 @@
+/**
+ * Message Codec
+ * Negotiates MessagePack (when @msgpack/msgpack is installed) or JSON
+ * for HTTP responses and WebSocket messages
+ */
+
+let msgpack = null;
+try {
+  msgpack = await import('@msgpack/msgpack');
+} catch (error) {
+  // 可选依赖，未安装时只使用 JSON
+}
+
+export const MSGPACK_TYPE = 'application/msgpack';
+export const JSON_TYPE = 'application/json';
+
+// WebSocket 子协议名称，按优先级排列
+export const SUBPROTOCOLS = {
+  msgpack: 'llm-mc.msgpack',
+  json: 'llm-mc.json'
+};
+
+export const msgpackAvailable = msgpack !== null;
+
+/**
+ * Pick the WebSocket subprotocol for a connection (ws handleProtocols)
+ * @param {Set<string>} protocols - 客户端提供的子协议
+ * @returns {string|false}
+ */
+export function selectSubprotocol(protocols) {
+  if (msgpackAvailable && protocols.has(SUBPROTOCOLS.msgpack)) return SUBPROTOCOLS.msgpack;
+  if (protocols.has(SUBPROTOCOLS.json)) return SUBPROTOCOLS.json;
+  return false;
+}
+
+/**
+ * Encode a message for a WebSocket client
+ * @param {object} data
+ * @param {string} protocol - 连接协商出的子协议
+ * @returns {Buffer|string}
+ */
+export function encodeMessage(data, protocol) {
+  if (protocol === SUBPROTOCOLS.msgpack) {
+    const bytes = msgpack.encode(data, { ignoreUndefined: true });
+    return Buffer.from(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  }
+  return JSON.stringify(data);
+}
+
+/**
+ * Decode a message received from a WebSocket client
+ * @param {Buffer} data
+ * @param {boolean} isBinary - 二进制帧为 MessagePack，文本帧为 JSON
+ * @returns {object}
+ */
+export function decodeMessage(data, isBinary) {
+  if (isBinary && msgpackAvailable) {
+    return msgpack.decode(data);
+  }
+  return JSON.parse(data.toString());
+}
+
+/**
+ * Express middleware: answer with MessagePack when the client prefers it
+ * 替换 res.json，路由代码无需修改
+ */
+export function negotiateResponse(req, res, next) {
+  if (msgpackAvailable && req.accepts([JSON_TYPE, MSGPACK_TYPE]) === MSGPACK_TYPE) {
+    res.json = (body) => {
+      const bytes = msgpack.encode(body, { ignoreUndefined: true });
+      return res.type(MSGPACK_TYPE).send(Buffer.from(bytes.buffer, bytes.byteOffset, bytes.byteLength));
+    };
+  }
+  next();
+}
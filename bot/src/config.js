@@ -18,6 +18,10 @@ export const config = {
   // Bot Service Configuration
   service: {
     port: parseInt(process.env.BOT_SERVICE_PORT) || 3001,
+    // 可选：同时监听 Unix 域套接字（后端同机部署时使用 unix:// 地址连接）
+    socketPath: process.env.BOT_SERVICE_SOCKET || null,
+    // 断线重连时可补发的最近事件条数
+    replayBufferSize: parseInt(process.env.BOT_REPLAY_BUFFER) || 1000,
   },
 
   // Viewer Configuration (prismarine-viewer)
@@ -25,6 +25,7 @@ async function main() {
   console.log('💡 Bot service is ready. Use the API to control the bot.');
   console.log('   POST /connect    - Connect to Minecraft server');
   console.log('   POST /action     - Execute an action');
+  console.log('   POST /actions    - Execute a batch of actions');
   console.log('   GET  /observation - Get current game state');
   console.log('');
 }
@@ -86,6 +86,10 @@ export class Observer {
       } : null,
       weather: mcBot ? {
         isRaining: mcBot.isRaining
+      } : null,
+      fluids: mcBot?.entity ? {
+        inLava: Boolean(mcBot.entity.isInLava),
+        inWater: Boolean(mcBot.entity.isInWater)
       } : null
     };
   }
@@ -0,0 +1,44 @@
+/**
+ * Event Replay Buffer
+ * Keeps the most recent broadcast events so a reconnecting client can
+ * resume from the last sequence number it saw instead of losing events
+ */
+
+export class ReplayBuffer {
+  /**
+   * @param {number} capacity - 保留的事件条数
+   */
+  constructor(capacity = 1000) {
+    this.capacity = capacity;
+    this.events = new Array(capacity);
+    this.lastSeq = 0;
+  }
+
+  /**
+   * Store an event that has already been assigned `seq`
+   * @param {object} event
+   */
+  push(event) {
+    this.events[event.seq % this.capacity] = event;
+    this.lastSeq = event.seq;
+  }
+
+  /**
+   * Events after `since`, oldest first
+   * @param {number} since - 客户端最后收到的序号
+   * @returns {object[]|null} 缓冲区已覆盖所需事件时返回 null（无法续传）
+   */
+  since(since) {
+    if (since >= this.lastSeq) return [];
+    const oldest = Math.max(1, this.lastSeq - this.capacity + 1);
+    if (since + 1 < oldest) return null;
+
+    const events = [];
+    for (let seq = since + 1; seq <= this.lastSeq; seq++) {
+      events.push(this.events[seq % this.capacity]);
+    }
+    return events;
+  }
+}
+
+export default ReplayBuffer;
@@ -1,10 +1,26 @@
 import express from 'express';
 import { WebSocketServer } from 'ws';
 import http from 'http';
+import fs from 'fs';
 import { Bot } from './bot.js';
 import { Actions } from './actions.js';
 import { Observer } from './observer.js';
+import { StatePublisher } from './state.js';
+import { ReplayBuffer } from './replay.js';
 import { config } from './config.js';
+import {
+  selectSubprotocol,
+  encodeMessage,
+  decodeMessage,
+  negotiateResponse,
+  msgpackAvailable
+} from './codec.js';
+
+// 单次批量请求允许的最大动作数
+const MAX_BATCH_SIZE = 256;
+
+// 只推送该半径内的方块变化（后端方块缓存只关心 bot 附近）
+const BLOCK_UPDATE_RADIUS = 64;
 
 /**
  * HTTP/WebSocket Server for the Mineflayer Bot
@@ -14,12 +30,24 @@ class BotServer {
   constructor() {
     this.app = express();
     this.server = http.createServer(this.app);
-    this.wss = new WebSocketServer({ server: this.server });
+    this.wss = new WebSocketServer({
+      server: this.server,
+      handleProtocols: (protocols) => selectSubprotocol(protocols)
+    });
+    this.socketServer = null;
     
     this.bot = null;
     this.actions = null;
     this.observer = null;
     this.wsClients = new Set();
+    // 状态/背包增量自带 stateSeq / version 用于检测缺口，不进入重放缓冲区：
+    // 移动时每格一条，会挤掉聊天等需要续传的事件；重连时总会先收到完整快照
+    this.statePublisher = new StatePublisher((event) => this._broadcastLive(event));
+
+    // 事件序号在服务进程内全局递增；epoch 标识本次进程，重启后旧序号失效
+    this.epoch = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 8)}`;
+    this.eventSeq = 0;
+    this.replayBuffer = new ReplayBuffer(config.service.replayBufferSize);
     
     this._setupMiddleware();
     this._setupRoutes();
@@ -28,6 +56,9 @@ class BotServer {
 
   _setupMiddleware() {
     this.app.use(express.json());
+
+    // 客户端 Accept 偏好 MessagePack 时以二进制返回
+    this.app.use(negotiateResponse);
     
     // CORS
     this.app.use((req, res, next) => {
@@ -80,6 +111,7 @@ class BotServer {
     // Disconnect from Minecraft
     this.app.post('/disconnect', (req, res) => {
       if (this.bot) {
+        this.statePublisher.detach();
         this.bot.disconnect();
         this.bot = null;
         this.actions = null;
@@ -88,6 +120,16 @@ class BotServer {
       res.json({ success: true, message: 'Disconnected' });
     });
 
+    // Get full state snapshot (same data the state mirror receives over WebSocket)
+    this.app.get('/state', (req, res) => {
+      res.json(this.statePublisher.getSnapshot());
+    });
+
+    // Get inventory snapshot (same data the inventory mirror receives over WebSocket)
+    this.app.get('/inventory', (req, res) => {
+      res.json(this.statePublisher.getInventorySnapshot());
+    });
+
     // Get observation
     this.app.get('/observation', (req, res) => {
       if (!this.observer) {
@@ -109,7 +151,33 @@ class BotServer {
       }
       
       try {
-        const result = await this.actions.execute(action, parameters || {});
+        const result = await this._executeAction(action, parameters || {});
+        res.json(result);
+      } catch (error) {
+        res.status(500).json({ success: false, message: error.message });
+      }
+    });
+
+    // Execute a batch of actions in order (one round trip for many calls)
+    this.app.post('/actions', async (req, res) => {
+      if (!this.actions) {
+        return res.status(400).json({ success: false, message: 'Bot not connected' });
+      }
+
+      const { actions, stopOnError } = req.body;
+
+      if (!Array.isArray(actions)) {
+        return res.status(400).json({ success: false, message: 'Actions array required' });
+      }
+      if (actions.length > MAX_BATCH_SIZE) {
+        return res.status(400).json({
+          success: false,
+          message: `Too many actions in one batch (max ${MAX_BATCH_SIZE})`
+        });
+      }
+
+      try {
+        const result = await this._executeBatch(actions, Boolean(stopOnError));
         res.json(result);
       } catch (error) {
         res.status(500).json({ success: false, message: error.message });
@@ -118,10 +186,58 @@ class BotServer {
   }
 
   _setupWebSocket() {
-    this.wss.on('connection', (ws) => {
-      console.log('[Server] WebSocket client connected');
+    this.wss.on('connection', (ws, request) => {
       this.wsClients.add(ws);
-      
+
+      // 客户端通过 ?epoch=...&since=... 续传断线期间的事件
+      const url = new URL(request?.url || '/', 'http://localhost');
+      const since = parseInt(url.searchParams.get('since'));
+      const missed = url.searchParams.get('epoch') === this.epoch && since >= 0
+        ? this.replayBuffer.since(since)
+        : null;
+
+      console.log(
+        `[Server] WebSocket client connected (${ws.protocol || 'json'}` +
+        `${missed ? `, resumed with ${missed.length} events` : ''})`
+      );
+      ws.send(encodeMessage({
+        type: 'hello',
+        epoch: this.epoch,
+        seq: this.eventSeq,
+        resumed: missed !== null,
+        replayed: missed ? missed.length : 0
+      }, ws.protocol));
+
+      // 先发完整快照，再补发错过的事件（状态/背包增量不在重放缓冲区中，快照已包含其结果）
+      ws.send(encodeMessage(this.statePublisher.getSnapshot(), ws.protocol));
+      ws.send(encodeMessage(this.statePublisher.getInventorySnapshot(), ws.protocol));
+      for (const event of missed || []) {
+        ws.send(encodeMessage(event, ws.protocol));
+      }
+
+      // 请求/响应通道：按 id 关联，多个请求可同时进行、乱序完成
+      ws.on('message', async (data, isBinary) => {
+        let request;
+        try {
+          request = decodeMessage(data, isBinary);
+        } catch (error) {
+          return;
+        }
+        if (request?.type !== 'request' || request.id === undefined) return;
+
+        const response = { type: 'response', id: request.id };
+        try {
+          response.result = await this._handleRequest(request.method, request.params || {});
+        } catch (error) {
+          response.error = error.message;
+          response.status = error.status || 500;
+        }
+
+        if (ws.readyState === 1) { // OPEN
+          ws.send(encodeMessage(response, ws.protocol));
+        }
+      });
+
       ws.on('close', () => {
         console.log('[Server] WebSocket client disconnected');
         this.wsClients.delete(ws);
@@ -134,6 +250,65 @@ class BotServer {
     });
   }
 
+  /**
+   * Handle a request received over WebSocket
+   * 与对应的 HTTP 路由语义一致
+   * @param {string} method - status | state | inventory | observation | action | actions
+   * @param {object} params
+   * @returns {Promise<object>}
+   */
+  async _handleRequest(method, params) {
+    const fail = (status, message) => {
+      const error = new Error(message);
+      error.status = status;
+      throw error;
+    };
+
+    switch (method) {
+      case 'status':
+        return {
+          connected: this.bot?.isConnected || false,
+          username: config.minecraft.username
+        };
+      case 'state':
+        return this.statePublisher.getSnapshot();
+      case 'inventory':
+        return this.statePublisher.getInventorySnapshot();
+      case 'observation':
+        if (!this.observer) fail(400, 'Bot not connected');
+        return this.observer.getObservation();
+      case 'action':
+        if (!this.actions) fail(400, 'Bot not connected');
+        if (!params.action) fail(400, 'Action required');
+        return await this._executeAction(params.action, params.parameters || {});
+      case 'actions':
+        if (!this.actions) fail(400, 'Bot not connected');
+        if (!Array.isArray(params.actions)) fail(400, 'Actions array required');
+        if (params.actions.length > MAX_BATCH_SIZE) {
+          fail(400, `Too many actions in one batch (max ${MAX_BATCH_SIZE})`);
+        }
+        return await this._executeBatch(params.actions, Boolean(params.stopOnError));
+      default:
+        fail(404, `Unknown method: ${method}`);
+    }
+  }
+
+  /**
+   * Run an action and tag the result with the inventory version
+   * 先推送动作造成的背包变化，后端拿到结果时本地背包已是最新
+   */
+  async _executeAction(action, parameters) {
+    const result = await this.actions.execute(action, parameters);
+    this.statePublisher.flushInventory();
+    return { ...result, inventoryVersion: this.statePublisher.inventoryVersion };
+  }
+
+  async _executeBatch(actions, stopOnError) {
+    const result = await this.actions.executeBatch(actions, stopOnError);
+    this.statePublisher.flushInventory();
+    return { ...result, inventoryVersion: this.statePublisher.inventoryVersion };
+  }
+
   _setupEventForwarding() {
     if (!this.bot) return;
     
@@ -160,6 +335,16 @@ class BotServer {
       });
     });
 
+    // Forward damage taken by the bot itself
+    mcBot.on('entityHurt', (entity) => {
+      if (entity !== mcBot.entity) return;
+      this._broadcast({
+        type: 'hurt',
+        health: mcBot.health,
+        timestamp: Date.now()
+      });
+    });
+
     // Forward death
     mcBot.on('death', () => {
       this._broadcast({
@@ -264,14 +449,66 @@ class BotServer {
         });
       }
     });
+
+    // Forward block changes near the bot (invalidates the backend's block cache).
+    // 方块/区块事件不分配序号、不进入重放缓冲区：挖矿或爆炸时数量很多，会挤掉聊天等需要续传的事件；
+    // 后端断线时清空方块缓存，重连后按需重新查询
+    mcBot.on('blockUpdate', (oldBlock, newBlock) => {
+      if (!newBlock || !mcBot.entity) return;
+      if (oldBlock && oldBlock.name === newBlock.name) return;
+      if (mcBot.entity.position.distanceTo(newBlock.position) > BLOCK_UPDATE_RADIUS) return;
+      this._broadcastLive({
+        type: 'blockUpdate',
+        position: {
+          x: newBlock.position.x,
+          y: newBlock.position.y,
+          z: newBlock.position.z
+        },
+        name: newBlock.name,
+        timestamp: Date.now()
+      });
+    });
+
+    // Forward chunk unloads (cached blocks in that column are no longer tracked)
+    mcBot.on('chunkColumnUnload', (point) => {
+      this._broadcastLive({
+        type: 'chunkUnload',
+        chunkX: Math.floor(point.x / 16),
+        chunkZ: Math.floor(point.z / 16),
+        timestamp: Date.now()
+      });
+    });
+
+    // Push state deltas for the backend's state mirror
+    this.statePublisher.attach(this.bot);
+  }
+
+  _broadcast(event) {
+    // 分配序号并保留在重放缓冲区中，供断线的客户端续传
+    const data = { ...event, seq: ++this.eventSeq };
+    this.replayBuffer.push(data);
+    this._sendToClients(data);
+  }
+
+  /**
+   * Broadcast without a sequence number or replay (only meaningful while connected)
+   * @param {object} event
+   */
+  _broadcastLive(event) {
+    this._sendToClients(event);
   }
 
-  _broadcast(data) {
-    const message = JSON.stringify(data);
+  _sendToClients(data) {
+    // 每种子协议只编码一次
+    const encoded = new Map();
     for (const client of this.wsClients) {
-      if (client.readyState === 1) { // OPEN
-        client.send(message);
+      if (client.readyState !== 1) continue; // OPEN
+      let message = encoded.get(client.protocol);
+      if (message === undefined) {
+        message = encodeMessage(data, client.protocol);
+        encoded.set(client.protocol, message);
       }
+      client.send(message);
     }
   }
 
@@ -281,6 +518,11 @@ class BotServer {
         console.log(`[Server] Bot service running on port ${port}`);
         console.log(`[Server] HTTP API: http://localhost:${port}`);
         console.log(`[Server] WebSocket: ws://localhost:${port}`);
+        console.log(`[Server] Codecs: ${msgpackAvailable ? 'msgpack, json' : 'json'}`);
+
+        if (config.service.socketPath) {
+          this._listenOnSocket(config.service.socketPath);
+        }
         
         // Auto-connect if enabled
         if (config.autoConnect) {
@@ -302,11 +544,40 @@ class BotServer {
     });
   }
 
+  /**
+   * Also serve HTTP and WebSocket on a Unix domain socket
+   * 与 TCP 端口共用同一套路由和 WebSocket 客户端集合
+   * @param {string} socketPath
+   */
+  _listenOnSocket(socketPath) {
+    // 清理上次异常退出留下的套接字文件
+    if (fs.existsSync(socketPath)) {
+      fs.unlinkSync(socketPath);
+    }
+
+    this.socketServer = http.createServer(this.app);
+    this.socketServer.on('upgrade', (request, socket, head) => {
+      this.wss.handleUpgrade(request, socket, head, (ws) => {
+        this.wss.emit('connection', ws, request);
+      });
+    });
+    this.socketServer.on('error', (error) => {
+      console.error('[Server] Unix socket error:', error.message);
+    });
+    this.socketServer.listen(socketPath, () => {
+      console.log(`[Server] Unix socket: ${socketPath}`);
+    });
+  }
+
   stop() {
     if (this.bot) {
+      this.statePublisher.detach();
       this.bot.disconnect();
     }
     this.server.close();
+    if (this.socketServer) {
+      this.socketServer.close();
+    }
   }
 }
 
@@ -0,0 +1,255 @@
+/**
+ * State Publisher
+ * Pushes bot state deltas over WebSocket so the backend can keep a local mirror
+ * instead of polling /status and /observation
+ *
+ * 背包单独以 inventory 事件推送槽位增量（带版本号），后端据此维护本地背包
+ */
+
+// 附近实体的推送间隔（毫秒）
+const ENTITY_PUSH_INTERVAL = 1000;
+// 背包变化合并推送的等待时间（毫秒）
+const INVENTORY_DEBOUNCE = 50;
+// 游戏时间变化超过该值（tick）才推送
+const TIME_PUSH_THRESHOLD = 1000;
+
+export class StatePublisher {
+  /**
+   * @param {function(object): void} emit - 发送 state 事件的回调
+   */
+  constructor(emit) {
+    this.emit = emit;
+    this.bot = null;
+    this.stateSeq = 0;
+    this.state = { connected: false };
+    this.inventoryVersion = 0;
+
+    this._listeners = [];
+    this._entityTimer = null;
+    this._inventoryTimer = null;
+    this._lastEntitiesKey = '';
+    this._pendingSlots = {};
+  }
+
+  /**
+   * Start publishing state for a bot
+   * @param {import('./bot.js').Bot} bot
+   */
+  attach(bot) {
+    this.detach();
+    this.bot = bot;
+
+    const mcBot = bot.getMineflayerBot();
+    if (!mcBot) return;
+
+    this._on(mcBot, 'move', () => {
+      const delta = {};
+
+      // 进出岩浆/水立即推送（后端反射规则依赖）
+      const fluids = this._getFluids(mcBot);
+      const lastFluids = this.state.fluids;
+      if (!lastFluids || lastFluids.inLava !== fluids.inLava || lastFluids.inWater !== fluids.inWater) {
+        delta.fluids = fluids;
+      }
+
+      const position = bot.getPosition();
+      const last = this.state.position;
+      if (position && !(last && last.x === position.x && last.y === position.y && last.z === position.z)) {
+        delta.position = position;
+      }
+
+      if (Object.keys(delta).length > 0) this.update(delta);
+    });
+
+    this._on(mcBot, 'health', () => {
+      this.update({ health: bot.getHealth() });
+    });
+
+    this._on(mcBot, 'time', () => {
+      const time = this._getTime(mcBot);
+      const last = this.state.time;
+      if (last && last.isDay === time.isDay &&
+          Math.abs(time.timeOfDay - last.timeOfDay) < TIME_PUSH_THRESHOLD) return;
+      this.update({ time });
+    });
+
+    this._on(mcBot, 'rain', () => {
+      this.update({ weather: { isRaining: mcBot.isRaining } });
+    });
+
+    this._on(mcBot, 'spawn', () => {
+      this.update({ ...this._getFullState(), connected: true });
+    });
+
+    this._on(mcBot, 'end', () => {
+      this.update({ connected: false });
+    });
+
+    if (mcBot.inventory) {
+      this._on(mcBot.inventory, 'updateSlot', (slot, oldItem, newItem) => {
+        if (!this._isInventorySlot(slot)) return;
+        this._pendingSlots[slot] = this._slotItem(newItem);
+        if (this._inventoryTimer) return;
+        this._inventoryTimer = setTimeout(() => this.flushInventory(), INVENTORY_DEBOUNCE);
+      });
+    }
+
+    this._entityTimer = setInterval(() => {
+      if (!this.bot?.isConnected) return;
+      const entities = bot.getNearbyEntities(16);
+      const key = JSON.stringify(entities);
+      if (key === this._lastEntitiesKey) return;
+      this._lastEntitiesKey = key;
+      this.update({ nearbyEntities: entities });
+    }, ENTITY_PUSH_INTERVAL);
+
+    this.update(this._getFullState());
+    this._pendingSlots = {};
+    this.inventoryVersion++;
+    this.emit(this.getInventorySnapshot());
+  }
+
+  /**
+   * Stop publishing and mark the bot as disconnected
+   */
+  detach() {
+    for (const [emitter, event, listener] of this._listeners) {
+      emitter.removeListener(event, listener);
+    }
+    this._listeners = [];
+
+    if (this._entityTimer) {
+      clearInterval(this._entityTimer);
+      this._entityTimer = null;
+    }
+    if (this._inventoryTimer) {
+      clearTimeout(this._inventoryTimer);
+      this._inventoryTimer = null;
+    }
+
+    if (this.bot) {
+      this.bot = null;
+      this.update({ connected: false });
+    }
+  }
+
+  /**
+   * Merge a partial state and push it as a numbered delta
+   * @param {object} delta
+   */
+  update(delta) {
+    Object.assign(this.state, delta);
+    this.stateSeq++;
+    this.emit({
+      type: 'state',
+      stateSeq: this.stateSeq,
+      full: false,
+      state: delta,
+      timestamp: Date.now()
+    });
+  }
+
+  /**
+   * Push accumulated inventory slot changes now
+   * 动作完成时调用，保证背包增量先于动作结果到达后端
+   */
+  flushInventory() {
+    if (this._inventoryTimer) {
+      clearTimeout(this._inventoryTimer);
+      this._inventoryTimer = null;
+    }
+    if (Object.keys(this._pendingSlots).length === 0) return;
+
+    const slots = this._pendingSlots;
+    this._pendingSlots = {};
+    this.inventoryVersion++;
+    this.emit({
+      type: 'inventory',
+      version: this.inventoryVersion,
+      full: false,
+      slots,
+      timestamp: Date.now()
+    });
+  }
+
+  /**
+   * Get the whole inventory as one event (sent on connect and for resync)
+   * @returns {object}
+   */
+  getInventorySnapshot() {
+    const slots = {};
+    const mcBot = this.bot?.getMineflayerBot();
+    if (mcBot?.inventory) {
+      for (const item of mcBot.inventory.items()) {
+        slots[item.slot] = this._slotItem(item);
+      }
+    }
+    return {
+      type: 'inventory',
+      version: this.inventoryVersion,
+      full: true,
+      slots,
+      timestamp: Date.now()
+    };
+  }
+
+  /**
+   * Get a full snapshot event (sent on connect and for resync)
+   * @returns {object}
+   */
+  getSnapshot() {
+    return {
+      type: 'state',
+      stateSeq: this.stateSeq,
+      full: true,
+      state: { ...this.state },
+      timestamp: Date.now()
+    };
+  }
+
+  _on(emitter, event, listener) {
+    emitter.on(event, listener);
+    this._listeners.push([emitter, event, listener]);
+  }
+
+  _isInventorySlot(slot) {
+    const inventory = this.bot?.getMineflayerBot()?.inventory;
+    if (!inventory) return false;
+    return slot >= inventory.inventoryStart && slot < inventory.inventoryEnd;
+  }
+
+  _slotItem(item) {
+    if (!item) return null;
+    return { name: item.name, displayName: item.displayName, count: item.count };
+  }
+
+  _getTime(mcBot) {
+    return {
+      timeOfDay: mcBot.time.timeOfDay,
+      isDay: mcBot.time.timeOfDay < 13000 || mcBot.time.timeOfDay > 23000
+    };
+  }
+
+  _getFluids(mcBot) {
+    return {
+      inLava: Boolean(mcBot.entity?.isInLava),
+      inWater: Boolean(mcBot.entity?.isInWater)
+    };
+  }
+
+  _getFullState() {
+    const mcBot = this.bot?.getMineflayerBot();
+    const hasEntity = Boolean(mcBot?.entity);
+    return {
+      connected: this.bot?.isConnected || false,
+      position: hasEntity ? this.bot.getPosition() : null,
+      health: this.bot ? this.bot.getHealth() : null,
+      nearbyEntities: hasEntity ? this.bot.getNearbyEntities(16) : [],
+      time: mcBot?.time ? this._getTime(mcBot) : null,
+      weather: mcBot ? { isRaining: mcBot.isRaining } : null,
+      fluids: hasEntity ? this._getFluids(mcBot) : null
+    };
+  }
+}
+
+export default StatePublisher;